@@ -6,6 +6,6 @@ setup(
     author="Julien Kauffmann",
     author_email="julien.kauffmann@freelan.org",
     description="A Python library used to interact with Microsoft Visual SourceSafe repositories.",
-    packages=['vss'],
+    packages=['vss', 'vss.benchmarks'],
     classifiers=[],
 )
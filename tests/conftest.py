@@ -0,0 +1,31 @@
+"""
+Fixtures shared by the tests: they run VSSPython against the simulated ss.exe of vss.benchmarks.fake_ss.
+"""
+
+from vss.benchmarks import fake_ss
+
+import pytest
+
+@pytest.fixture
+def install_fake_ss(tmpdir):
+    """
+    Get a function that installs a simulated ss.exe configured with the specified settings (see fake_ss.DEFAULT_CONFIG),
+    and returns its path.
+    """
+
+    def install(**settings):
+        settings.setdefault('latency', {'default': 0})
+        config_path = str(tmpdir.join('fake_ss.json'))
+        fake_ss.write_config(config_path, **settings)
+
+        return fake_ss.install(str(tmpdir.join('bin')), config_path)
+
+    return install
+
+@pytest.fixture
+def fake_ss_path(install_fake_ss):
+    """
+    The path of a simulated ss.exe with the default settings and no latency.
+    """
+
+    return install_fake_ss()
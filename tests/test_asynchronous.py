@@ -0,0 +1,95 @@
+from vss import asynchronous
+from vss import batching
+
+import subprocess
+
+import pytest
+
+TIMEOUT = 30
+
+def get_vss(ss_path, **kwargs):
+    """
+    Get an AsyncVSS instance with a spawner of its own, recording its invocations.
+    """
+
+    vss = asynchronous.AsyncVSS(ss_path=ss_path, spawner=asynchronous.Spawner(), **kwargs)
+    vss.invocations = []
+    vss.hooks.append(vss.invocations.append)
+
+    return vss
+
+def test_result(fake_ss_path):
+    vss = get_vss(fake_ss_path)
+    future = vss.dir('$/project')
+
+    assert isinstance(future, asynchronous.Future)
+    assert '$/project:' in future.result(TIMEOUT)
+    assert future.done()
+
+def test_concurrency_limit(install_fake_ss):
+    vss = get_vss(install_fake_ss(latency={'default': 0.2}), max_concurrency=2)
+    futures = [vss.get('$/project/file%d.txt' % i) for i in range(6)]
+
+    for future in futures:
+        future.result(TIMEOUT)
+
+    intervals = [(invocation.started_at, invocation.started_at + invocation.wall_time) for invocation in vss.invocations]
+    peak = max(len([1 for start, end in intervals if start <= instant < end]) for instant, _ in intervals)
+
+    assert len(intervals) == 6
+    assert peak == 2
+
+def test_invalid_limit(fake_ss_path):
+    with pytest.raises(ValueError):
+        get_vss(fake_ss_path, max_concurrency=0)
+
+def test_error(install_fake_ss):
+    vss = get_vss(install_fake_ss(failure_rate={'default': 0, 'Checkin': 1}))
+    future = vss.checkin('$/project/file0.txt')
+    error = future.exception(TIMEOUT)
+
+    assert isinstance(error, subprocess.CalledProcessError)
+    assert error.returncode == 1
+    assert 'simulated failure' in error.stderr
+
+    with pytest.raises(subprocess.CalledProcessError):
+        future.result()
+
+    assert not vss.invocations[0].succeeded
+
+def test_split_command(fake_ss_path):
+    vss = get_vss(fake_ss_path, max_argv_bytes=batching.get_argv_size([fake_ss_path, 'Get', '$/project/file0.txt']))
+    output = vss.get(['$/project/file%d.txt' % i for i in range(3)]).result(TIMEOUT)
+
+    assert len(vss.invocations) == 3
+    assert output.splitlines() == ['Get $/project/file%d.txt: line 0' % i for i in range(3)]
+
+def test_batch(install_fake_ss):
+    vss = get_vss(install_fake_ss(failure_rate={'default': 0, 'Checkin': 1}))
+    result = vss.batch('checkin', ['$/project/file0.txt', '$/project/file1.txt']).result(TIMEOUT)
+
+    assert isinstance(result, batching.BatchResult)
+    assert not result.succeeded
+    assert sorted(result.errors) == ['$/project/file0.txt', '$/project/file1.txt']
+
+def test_plan(fake_ss_path):
+    vss = get_vss(fake_ss_path)
+
+    with vss.plan() as plan:
+        plan.checkout('$/project/file0.txt')
+        plan.checkout('$/project/file1.txt')
+        plan.get('$/project/file0.txt')
+
+    assert [invocation.argv[1:] for invocation in vss.invocations] == [
+        ['Checkout', '$/project/file0.txt', '$/project/file1.txt'],
+        ['Get', '$/project/file0.txt'],
+    ]
+
+def test_plan_error(install_fake_ss):
+    vss = get_vss(install_fake_ss(failure_rate={'default': 0, 'Checkout': 1}))
+    plan = vss.plan()
+    plan.checkout('$/project/file0.txt')
+    plan.get('$/project/file0.txt')
+
+    assert isinstance(plan.commit().exception(TIMEOUT), subprocess.CalledProcessError)
+    assert [invocation.command for invocation in vss.invocations] == ['Checkout']
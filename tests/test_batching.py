@@ -0,0 +1,72 @@
+from vss import batching
+from vss.vss import VSS
+
+import subprocess
+
+def test_get_argv_size():
+    assert batching.get_argv_size([]) == 0
+    assert batching.get_argv_size(['ss', 'Get']) == 11
+
+def test_pack():
+    items = ['a' * 7] * 5
+
+    assert batching.pack([], 100) == []
+    assert batching.pack(items, 100) == [items]
+    assert batching.pack(items, 20) == [items[:2], items[2:4], items[4:]]
+    assert batching.pack(items, 30, 10) == [items[:2], items[2:4], items[4:]]
+
+def test_pack_oversized_item():
+    assert batching.pack(['a' * 50, 'b', 'c'], 20) == [['a' * 50], ['b', 'c']]
+
+def test_batch_result():
+    result = batching.BatchResult()
+    error = subprocess.CalledProcessError(1, ['ss'])
+    result.add(['a', 'b'], 'ab\n')
+    result.add(['c', 'd'], None, error)
+    result.add(['e'], 'e\n')
+
+    assert result.invocations == 3
+    assert result.output == 'ab\ne\n'
+    assert result.errors == {'c': error, 'd': error}
+    assert result.failed_items == ['c', 'd']
+    assert not result.succeeded
+    assert result.batches[0] == (['a', 'b'], 'ab\n', None)
+
+def get_vss(ss_path, items, per_invocation):
+    """
+    Get a VSS instance whose command lines fit per_invocation of items, recording its invocations.
+    """
+
+    vss = VSS(ss_path=ss_path, max_argv_bytes=batching.get_argv_size([ss_path, 'Undocheckout'] + items[:per_invocation]))
+    vss.invocations = []
+    vss.hooks.append(vss.invocations.append)
+
+    return vss
+
+def test_split_command(fake_ss_path):
+    items = ['$/project/file%d.txt' % i for i in range(5)]
+    vss = get_vss(fake_ss_path, items, 2)
+
+    assert vss.undo_checkout(items).splitlines() == ['Undocheckout %s: line 0' % item for item in items[::2]]
+    assert [invocation.argv[2:] for invocation in vss.invocations] == [items[:2], items[2:4], items[4:]]
+
+def test_batch(fake_ss_path):
+    items = ['$/project/file%d.txt' % i for i in range(5)]
+    vss = get_vss(fake_ss_path, items, 2)
+    result = vss.batch('undo_checkout', items, workers=2)
+
+    # The batches are sized for the Undocheckout command, not the longer name of the method.
+    assert result.invocations == 3
+    assert len(vss.invocations) == 3
+    assert result.succeeded
+    assert [batch[0] for batch in result.batches] == [items[:2], items[2:4], items[4:]]
+    assert result.batches[1][1] == 'Undocheckout $/project/file2.txt: line 0\n'
+
+def test_batch_errors(install_fake_ss):
+    items = ['$/project/file%d.txt' % i for i in range(3)]
+    vss = get_vss(install_fake_ss(failure_rate={'default': 0, 'Undocheckout': 1}), items, 2)
+    result = vss.batch('undo_checkout', items)
+
+    assert result.failed_items == items
+    assert result.output == ''
+    assert isinstance(result.errors[items[0]], subprocess.CalledProcessError)
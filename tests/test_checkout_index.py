@@ -0,0 +1,46 @@
+from vss.checkout_index import CheckoutIndex
+from vss.vss import VSS
+
+import os
+
+STATUS = '''a.txt                Admin        Exc 5/12/10  2:30p  C:\\work
+$/project/sub:
+b.txt                Bob              5/13/10  9:15a  C:\\work\\sub
+'''
+
+def test_files_of_a_project_are_under_it(install_fake_ss):
+    index = CheckoutIndex(VSS(ss_path=install_fake_ss(status=STATUS)))
+    index.add_project('$/project')
+
+    assert [entry.path for entry in index.query()] == ['$/project/a.txt', '$/project/sub/b.txt']
+    assert [entry.path for entry in index.query(user='bob', project='$/project/sub')] == ['$/project/sub/b.txt']
+
+def test_stale_items(install_fake_ss):
+    vss = VSS(ss_path=install_fake_ss(status=STATUS))
+    index = CheckoutIndex(vss)
+    index.add_project('$/project')
+    vss.checkout('$/project/sub')
+
+    assert index.stale() == set(['$/project/sub'])
+    assert index.refresh() == 1
+    assert index.stale() == set()
+
+    # The known project is listed again as a project: its files are not taken for files of its parent.
+    assert [entry.path for entry in index.query(project='$/project/sub')] == ['$/project/sub/a.txt', '$/project/sub/b.txt']
+
+def test_saves_are_deferred(install_fake_ss, tmpdir):
+    path = str(tmpdir.join('checkouts'))
+    vss = VSS(ss_path=install_fake_ss(status=STATUS))
+    index = CheckoutIndex(vss, path, save_delay=60)
+    index.add_project('$/project')
+
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+        vss.checkout('$/project/' + name)
+
+    assert not os.path.exists(path)
+
+    index.detach()
+    loaded = CheckoutIndex(VSS(ss_path=vss.ss_path), path)
+
+    assert [entry.path for entry in loaded.query()] == [entry.path for entry in index.query()]
+    assert loaded.stale() == index.stale()
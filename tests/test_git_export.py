@@ -0,0 +1,65 @@
+from vss import git_export
+from vss.vss import VSS
+
+import StringIO
+
+ENTRY = '''*****  %s  *****
+Version %d
+User: Admin        Date:  5/12/10   Time:  %s
+%s
+
+'''
+
+PROJECT_ENTRY = '''*****************  Version %d   *****************
+User: Admin        Date:  5/12/10   Time:  %s
+%s
+
+'''
+
+LABEL_ENTRY = '''*****************  Version %d   *****************
+Label: "%s"
+User: Admin        Date:  5/12/10   Time:  %s
+Labeled
+
+'''
+
+# Newest first, as output by ss.exe.
+HISTORY = ''.join([
+    ENTRY % ('a.txt', 2, '2:50p', 'Checked in $/project\nComment: Second'),
+    LABEL_ENTRY % (5, 'v1', '2:40p'),
+    ENTRY % ('sub', 1, '2:35p', 'Created'),
+    PROJECT_ENTRY % (4, '2:35p', '$sub added'),
+    ENTRY % ('a.txt', 1, '2:30p', 'Created'),
+    PROJECT_ENTRY % (3, '2:30p', 'a.txt added'),
+    LABEL_ENTRY % (2, 'empty', '2:10p'),
+    PROJECT_ENTRY % (1, '2:00p', 'Created'),
+])
+
+def test_build_timeline_skips_project_actions(install_fake_ss):
+    vss = VSS(ss_path=install_fake_ss(history=HISTORY))
+    timeline = git_export.build_timeline(vss, '$/project')
+
+    assert [item.get('label') or item['changes'] for item in timeline] == [
+        'empty',
+        [('modify', '$/project/a.txt', 1)],
+        'v1',
+        [('modify', '$/project/a.txt', 2)],
+    ]
+    assert timeline[-1]['comment'] == 'Second'
+
+def test_tags_wait_for_the_branch(install_fake_ss, tmpdir):
+    vss = VSS(ss_path=install_fake_ss(history=HISTORY, files={'$/project/a.txt': 'hello\n'}))
+    output = StringIO.StringIO()
+    checkpoint_path = str(tmpdir.join('checkpoint'))
+    count = git_export.Exporter(vss, '$/project', output, checkpoint_path=checkpoint_path, workers=1, chunk_size=2).run()
+    stream = output.getvalue()
+
+    assert count == 2
+    assert stream.index('commit refs/heads/master') < stream.index('reset refs/tags/empty\nfrom refs/heads/master\n')
+    assert stream.index('reset refs/tags/empty') < stream.index('reset refs/tags/v1') < stream.rindex('commit refs/heads/master')
+    assert 'from refs/heads/master^0' not in stream
+
+    # A resumed export starts from the branch imported so far.
+    exporter = git_export.Exporter(vss, '$/project', StringIO.StringIO(), checkpoint_path=checkpoint_path)
+
+    assert exporter.run() == 0
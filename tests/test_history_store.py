@@ -0,0 +1,77 @@
+from vss.benchmarks import fake_ss
+from vss.history_store import HistoryStore
+from vss.vss import VSS
+
+import datetime
+
+import pytest
+
+ENTRY = '''*****  %s  *****
+Version %d
+User: %s        Date:  5/%d/10   Time:  9:00a
+%s
+
+'''
+
+LABEL_ENTRY = '''*****************  Version %d   *****************
+Label: "%s"
+User: Admin        Date:  5/%d/10   Time:  9:00a
+Labeled
+
+'''
+
+# Newest first, as output by ss.exe. The non-ASCII names are cp1252 bytes.
+HISTORY = [
+    LABEL_ENTRY % (4, 'v2', 14),
+    ENTRY % ('caf\xe9.txt', 2, 'Ren\xe9', 13, 'Checked in $/project\nComment: R\xe9sum\xe9'),
+    ENTRY % ('a.txt', 2, 'Admin', 12, 'Checked in $/project'),
+    LABEL_ENTRY % (3, 'v1', 11),
+    ENTRY % ('caf\xe9.txt', 1, 'Ren\xe9', 10, 'Created'),
+    ENTRY % ('a.txt', 1, 'Admin', 10, 'Created'),
+]
+
+@pytest.fixture
+def store(tmpdir):
+    """
+    A store in a database file, closed after the test.
+    """
+
+    store = HistoryStore(str(tmpdir.join('history.db')))
+
+    yield store
+
+    store.close()
+
+def test_ingest_and_query(install_fake_ss, store):
+    vss = VSS(ss_path=install_fake_ss(history=''.join(HISTORY)))
+
+    assert store.ingest(vss, '$/project') == 6
+    assert [(entry.path, entry.version) for entry in store.query('$/project/CAF\xe9.txt')] == [
+        ('$/project/caf\xe9.txt', 2),
+        ('$/project/caf\xe9.txt', 1),
+    ]
+    assert store.query('$/project/caf\xe9.txt', limit=1)[0].comment == 'R\xe9sum\xe9'
+    assert [entry.version for entry in store.query('$/project', user='Ren\xe9')] == [2, 1]
+    assert [entry.path for entry in store.query(since=datetime.datetime(2010, 5, 12), kinds=['checked_in'])] == [
+        '$/project/caf\xe9.txt',
+        '$/project/a.txt',
+    ]
+    assert store.count_by_user('$/project') == [('Admin', 4), ('Ren\xe9', 2)]
+    assert [entry.path for entry in store.changes_between_labels('$/project', 'v1', 'v2')] == ['$/project/caf\xe9.txt', '$/project/a.txt']
+    assert store.projects()[0][:2] == ('$/project', datetime.datetime(2010, 5, 14, 9, 0))
+
+    with pytest.raises(ValueError):
+        store.changes_between_labels('$/project', 'v1', 'v3')
+
+def test_ingest_again(install_fake_ss, store, tmpdir):
+    vss = VSS(ss_path=install_fake_ss(history=''.join(HISTORY)))
+    store.ingest(vss, '$/project')
+
+    # The entries listed again are not stored twice.
+    assert store.ingest(vss, '$/project') == 0
+
+    fake_ss.write_config(str(tmpdir.join('fake_ss.json')), latency={'default': 0}, history=''.join([ENTRY % ('caf\xe9.txt', 3, 'Ren\xe9', 15, 'Checked in $/project')] + HISTORY))
+
+    assert store.ingest(vss, '$/project') == 1
+    assert [entry.version for entry in store.query('$/project/caf\xe9.txt')] == [3, 2, 1]
+    assert store.projects()[0][1] == datetime.datetime(2010, 5, 15, 9, 0)
@@ -0,0 +1,138 @@
+from vss import incremental
+from vss.benchmarks import fake_ss
+from vss.vss import VSS
+
+import datetime
+import os
+
+import pytest
+
+ENTRY = '''*****  %s  *****
+Version %d
+User: Admin        Date:  %s   Time:  %s
+%s
+
+'''
+
+FILES = {
+    '$/project/a.txt': 'a1',
+    '$/project/sub/b.txt': 'b1',
+}
+
+HISTORY = [
+    ENTRY % ('b.txt', 2, '5/12/10', '2:30p', 'Checked in $/project/sub'),
+    ENTRY % ('a.txt', 1, '5/11/10', '9:00a', 'Checked in $/project'),
+]
+
+@pytest.fixture
+def repository(install_fake_ss, tmpdir):
+    """
+    A simulated repository whose files and history can be changed between synchronizations.
+    """
+
+    class Repository(object):
+        def __init__(self):
+            self.files = dict(FILES)
+            self.history = list(HISTORY)
+            self.vss = VSS(ss_path=install_fake_ss(files=self.files, history=''.join(self.history)))
+            self.vss.invocations = []
+            self.vss.hooks.append(self.vss.invocations.append)
+            self.local_path = str(tmpdir.join('local'))
+
+        def commit(self, entry, **files):
+            self.history.insert(0, entry)
+            self.files.update(files)
+            fake_ss.write_config(str(tmpdir.join('fake_ss.json')), latency={'default': 0}, files=self.files, history=''.join(self.history))
+
+        def sync(self):
+            del self.vss.invocations[:]
+            incremental.sync(self.vss, '$/project', self.local_path)
+
+            return [invocation.argv[1:] for invocation in self.vss.invocations]
+
+        def read(self, *path):
+            with open(os.path.join(self.local_path, *path), 'rb') as f:
+                return f.read()
+
+        @property
+        def manifest(self):
+            return incremental.load_manifest(os.path.join(self.local_path, incremental.MANIFEST_NAME))
+
+    return Repository()
+
+def test_first_sync(repository):
+    assert repository.sync() == [
+        ['Dir', '$/project', '-R'],
+        ['History', '$/project', '-R'],
+        ['Get', '$/project', '-GL%s' % repository.local_path, '-I-', '-O-', '-R'],
+    ]
+    assert repository.read('sub', 'b.txt') == 'b1'
+    assert repository.manifest['synced_at'] == datetime.datetime(2010, 5, 12, 14, 30)
+    assert repository.manifest['files'] == {
+        'a.txt': {'version': 1, 'date': '2010-05-11T09:00:00'},
+        'sub/b.txt': {'version': 2, 'date': '2010-05-12T14:30:00'},
+    }
+
+def test_changed_file(repository):
+    repository.sync()
+    repository.commit(ENTRY % ('a.txt', 2, '5/13/10', '10:00a', 'Checked in $/project'), **{'$/project/a.txt': 'a2'})
+
+    # b.txt was checked in within the safety margin of the last synchronization, at the version already fetched.
+    assert repository.sync() == [
+        ['History', '$/project', '-R'],
+        ['Get', '$/project/a.txt', '-GL%s' % repository.local_path, '-I-', '-O-'],
+    ]
+    assert repository.read('a.txt') == 'a2'
+    assert repository.manifest['files']['a.txt']['version'] == 2
+    assert repository.manifest['synced_at'] == datetime.datetime(2010, 5, 13, 10, 0)
+
+    assert repository.sync() == [['History', '$/project', '-R']]
+
+def test_deleted_file(repository):
+    repository.sync()
+    repository.commit(ENTRY % ('sub', 7, '5/13/10', '10:00a', 'b.txt deleted'))
+    del repository.files['$/project/sub/b.txt']
+
+    assert repository.sync() == [['History', '$/project', '-R']]
+    assert not os.path.exists(os.path.join(repository.local_path, 'sub', 'b.txt'))
+    assert repository.manifest['files'].keys() == ['a.txt']
+
+def test_unknown_action_on_file(repository):
+    repository.sync()
+    repository.commit(ENTRY % ('a.txt', 3, '5/13/10', '10:00a', 'Archived'), **{'$/project/a.txt': 'a3'})
+
+    assert repository.sync()[1:] == [['Get', '$/project/a.txt', '-GL%s' % repository.local_path, '-I-', '-O-']]
+    assert repository.read('a.txt') == 'a3'
+
+def test_unknown_action_on_project(repository):
+    repository.sync()
+    repository.commit(ENTRY % ('sub', 8, '5/13/10', '10:00a', 'Archived'), **{'$/project/sub/b.txt': 'b3'})
+
+    assert repository.sync()[1:] == [
+        ['Dir', '$/project/sub', '-R'],
+        ['History', '$/project/sub', '-R'],
+        ['Get', '$/project/sub', '-GL%s' % os.path.join(repository.local_path, 'sub'), '-I-', '-O-', '-R'],
+    ]
+    assert repository.read('sub', 'b.txt') == 'b3'
+    assert repository.manifest['files']['sub/b.txt']['version'] == 2
+
+def test_project_moved_in(repository):
+    repository.sync()
+    repository.commit(ENTRY % ('$/project', 9, '5/13/10', '10:00a', '$moved moved from $/elsewhere'), **{'$/project/moved/c.txt': 'c1'})
+
+    assert repository.sync()[1:] == [
+        ['Dir', '$/project/moved', '-R'],
+        ['History', '$/project/moved', '-R'],
+        ['Get', '$/project/moved', '-GL%s' % os.path.join(repository.local_path, 'moved'), '-I-', '-O-', '-R'],
+    ]
+    assert repository.read('moved', 'c.txt') == 'c1'
+    assert 'moved/c.txt' in repository.manifest['files']
+
+def test_project_moved_out(repository):
+    repository.sync()
+    repository.commit(ENTRY % ('$/project', 9, '5/13/10', '10:00a', '$sub moved to $/elsewhere'))
+    del repository.files['$/project/sub/b.txt']
+
+    assert repository.sync() == [['History', '$/project', '-R']]
+    assert not os.path.exists(os.path.join(repository.local_path, 'sub'))
+    assert repository.manifest['files'].keys() == ['a.txt']
@@ -0,0 +1,109 @@
+from vss import scheduler
+from vss.job_queue import JobFailed, JobQueue, Worker
+
+import subprocess
+import time
+
+import pytest
+
+@pytest.fixture
+def queue(tmpdir):
+    """
+    A queue in a database file.
+    """
+
+    return JobQueue(str(tmpdir.join('jobs.db')))
+
+def test_non_ascii_output(install_fake_ss, queue):
+    ss_path = install_fake_ss(files={'$/project/caf\xe9.txt': 'R\xe9sum\xe9\n'})
+    job_id = queue.submit(None, 'view', ['$/project/caf\xe9.txt'], ss_path=ss_path)
+
+    assert Worker(queue).run_once() == job_id
+    assert queue.wait(job_id, timeout=0) == 'R\xe9sum\xe9\n'
+    assert queue.get(job_id)['args'] == ['$/project/caf\xe9.txt']
+
+def test_outcome_that_cannot_be_stored(fake_ss_path, queue):
+    # A result that sqlite refuses fails the job, and the worker goes on.
+    worker = Worker(queue)
+    job_id = queue.submit(None, 'view', ['$/project/a.txt'], ss_path=fake_ss_path)
+    complete = queue.complete
+    queue.complete = lambda job_id, lease_token, **outcome: complete(job_id, lease_token, **dict(outcome, result=outcome.get('result') and object()))
+
+    assert worker.run_once() == job_id
+    assert queue.get(job_id)['state'] == 'failed'
+    assert 'could not be stored' in queue.get(job_id)['error']['message']
+
+def test_submit(fake_ss_path, queue):
+    job_id = queue.submit(None, 'checkout', ['$/project/a.txt'], ss_path=fake_ss_path)
+
+    # An identical request in flight is the same job.
+    assert queue.submit(None, 'checkout', ['$/project/a.txt'], ss_path=fake_ss_path, priority=0) == job_id
+    assert queue.submit(None, 'checkout', ['$/project/b.txt'], ss_path=fake_ss_path) != job_id
+    assert queue.get(job_id)['priority'] == 0
+    assert queue.stats() == {'queued': 2}
+
+    for command in ('batch', 'plan', 'iter_history', 'iter_output', 'limits', 'streaming', '_call', 'missing'):
+        with pytest.raises(ValueError):
+            queue.submit(None, command, ['$/project/a.txt'])
+
+def test_lease_and_complete(fake_ss_path, queue):
+    job_id = queue.submit(None, 'checkout', ['$/project/a.txt'], ss_path=fake_ss_path)
+    job = queue.claim('worker')
+
+    assert (job['id'], job['state'], job['attempts'], job['worker']) == (job_id, 'running', 1, 'worker')
+    assert queue.claim('other') is None
+    assert queue.renew(job_id, job['lease_token'])
+    assert not queue.renew(job_id, 'stolen')
+    assert not queue.complete(job_id, 'stolen', result='output')
+    assert queue.complete(job_id, job['lease_token'], result='output')
+    assert queue.wait(job_id) == 'output'
+
+    # A completed job is not in flight: the same request makes a new job.
+    assert queue.submit(None, 'checkout', ['$/project/a.txt'], ss_path=fake_ss_path) != job_id
+
+def test_retry(install_fake_ss, queue, tmpdir):
+    lock_path = tmpdir.join('lock')
+    lock_path.write('')
+    job_id = queue.submit(None, 'checkout', ['$/project/a.txt'], ss_path=install_fake_ss(lock_path=str(lock_path)))
+    worker = Worker(queue)
+
+    # The database is locked: the job is queued again.
+    assert worker.run_once() == job_id
+    assert queue.get(job_id)['state'] == 'queued'
+    assert queue.get(job_id)['error']['stderr'] == 'Database is locked, try again later\n'
+
+    lock_path.remove()
+
+    time.sleep(scheduler.DEFAULT_BASE_DELAY)
+
+    assert worker.run_once() == job_id
+    assert queue.wait(job_id, timeout=0) == 'Checkout $/project/a.txt: line 0\n'
+    assert queue.get(job_id)['attempts'] == 2
+
+def test_failure_is_not_retried(install_fake_ss, queue):
+    job_id = queue.submit(None, 'checkout', ['$/project/a.txt'], ss_path=install_fake_ss(failure_rate={'default': 1.0}))
+    Worker(queue).run_once()
+
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        queue.wait(job_id, timeout=0)
+
+    assert error.value.stderr == 'Checkout failed: simulated failure\n'
+    assert queue.get(job_id)['attempts'] == 1
+
+def test_lease_expiry(fake_ss_path, queue):
+    job_id = queue.submit(None, 'checkout', ['$/project/a.txt'], ss_path=fake_ss_path, max_attempts=2)
+    first = queue.claim('worker', lease=0)
+    time.sleep(0.01)
+
+    # The worker stopped renewing its lease: the job is claimed again, then fails once out of attempts.
+    second = queue.claim('other', lease=0)
+
+    assert (second['id'], second['attempts'], second['worker']) == (job_id, 2, 'other')
+    assert not queue.complete(job_id, first['lease_token'], result='late')
+
+    time.sleep(0.01)
+
+    assert queue.claim('third') is None
+
+    with pytest.raises(JobFailed):
+        queue.wait(job_id, timeout=0)
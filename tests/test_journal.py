@@ -0,0 +1,70 @@
+from vss import journal
+from vss.vss import VSS
+
+import time
+
+import pytest
+
+@pytest.fixture
+def working_folder(install_fake_ss, tmpdir):
+    """
+    A journaled working folder of $/project, where a.txt is checked out and b.txt is not, with the VSS instance and the
+    commands it runs.
+    """
+
+    local_path = tmpdir.mkdir('local')
+    local_path.join('a.txt').write('a\n')
+    local_path.join('b.txt').write('b\n')
+    status = 'a.txt                Admin        Exc 5/12/10  2:30p  %s\n' % local_path
+    vss = VSS(ss_path=install_fake_ss(status=status))
+    vss.invocations = []
+    vss.hooks.append(vss.invocations.append)
+    working_journal = journal.Journal(str(local_path))
+    working_journal.record('a.txt', 'modified')
+    working_journal.record('b.txt', 'modified')
+
+    return vss, working_journal
+
+def test_files_not_checked_out_are_kept(working_folder):
+    vss, working_journal = working_folder
+    journal.checkin(vss, '$/project', working_journal, 'Fix')
+
+    assert [invocation.command for invocation in vss.invocations] == ['Status', 'Checkin']
+    assert '$/project/a.txt' in vss.invocations[1].argv
+    assert not '$/project/b.txt' in vss.invocations[1].argv
+    assert working_journal.changes() == [('b.txt', 'modified', False)]
+    assert journal.Journal(working_journal.local_path).changes() == [('b.txt', 'modified', False)]
+
+def test_files_not_checked_out_are_checked_out(working_folder):
+    vss, working_journal = working_folder
+    journal.checkin(vss, '$/project', working_journal, 'Fix', checkout=True)
+
+    assert [invocation.command for invocation in vss.invocations] == ['Status', 'Checkout', 'Checkin']
+    assert '$/project/b.txt' in vss.invocations[1].argv and '-G-' in vss.invocations[1].argv
+    assert '$/project/a.txt' in vss.invocations[2].argv and '$/project/b.txt' in vss.invocations[2].argv
+    assert working_journal.changes() == []
+
+@pytest.mark.parametrize('watcher_class', [journal.InotifyWatcher, journal.PollingWatcher])
+@pytest.mark.parametrize('journal_name', [journal.JOURNAL_NAME, 'custom.json'])
+def test_one_edit_saves_a_bounded_number_of_times(tmpdir, watcher_class, journal_name):
+    if watcher_class is journal.InotifyWatcher and journal.get_libc() is None:
+        pytest.skip('inotify is not available')
+
+    local_path = tmpdir.mkdir('local')
+    local_path.join('a.txt').write('a\n')
+    working_journal = journal.Journal(str(local_path), str(local_path.join(journal_name)))
+    saves = []
+    save = working_journal.save
+    working_journal.save = lambda: saves.append(save())
+    watcher = watcher_class is journal.PollingWatcher and watcher_class(working_journal, 0.1) or watcher_class(working_journal)
+    watcher.start()
+
+    try:
+        time.sleep(0.3)
+        local_path.join('a.txt').write('b\n', mode='a')
+        time.sleep(1)
+    finally:
+        watcher.stop()
+
+    assert 1 <= len(saves) <= 3
+    assert working_journal.changes() == [('a.txt', 'modified', False)]
@@ -0,0 +1,116 @@
+from vss import label_snapshot
+from vss.benchmarks import fake_ss
+from vss.label_snapshot import SnapshotStore
+from vss.vss import VSS
+
+import os
+
+import pytest
+
+ENTRY = '''*****  %s  *****
+Version %d
+User: Admin        Date:  5/%d/10   Time:  9:00a
+%s
+
+'''
+
+LABEL_ENTRY = '''*****************  Version %d   *****************
+Label: "%s"
+User: Admin        Date:  5/%d/10   Time:  9:00a
+Labeled
+
+'''
+
+# Newest first. From v1 to v2, a.txt is changed, b.txt deleted and c.txt added. The non-ASCII name is cp1252 bytes.
+HISTORY = ''.join([
+    LABEL_ENTRY % (8, 'v2', 14),
+    ENTRY % ('c.txt', 1, 13, 'Created'),
+    ENTRY % ('a.txt', 2, 12, 'Checked in $/project'),
+    LABEL_ENTRY % (5, 'v1', 11),
+    ENTRY % ('caf\xe9.txt', 1, 10, 'Created'),
+    ENTRY % ('b.txt', 1, 10, 'Created'),
+    ENTRY % ('a.txt', 1, 10, 'Created'),
+])
+
+FILES_V1 = {'$/project/a.txt': 'a1\n', '$/project/b.txt': 'b1\n', '$/project/caf\xe9.txt': 'caf\xe9\n'}
+
+FILES_V2 = {'$/project/a.txt': 'a2\n', '$/project/c.txt': 'c1\n', '$/project/caf\xe9.txt': 'caf\xe9\n'}
+
+@pytest.fixture
+def vss(install_fake_ss):
+    """
+    A VSS instance of a repository holding the files of $/project at v1, with the commands it runs recorded.
+    """
+
+    vss = VSS(ss_path=install_fake_ss(files=FILES_V1, history=HISTORY))
+    vss.invocations = []
+    vss.hooks.append(vss.invocations.append)
+
+    return vss
+
+def set_files(tmpdir, files):
+    """
+    Make the repository hold files.
+    """
+
+    fake_ss.write_config(str(tmpdir.join('fake_ss.json')), latency={'default': 0}, files=files, history=HISTORY)
+
+def get_fetched(vss):
+    """
+    Get the files fetched by the Get commands run since the last call, sorted.
+    """
+
+    gets = [invocation for invocation in vss.invocations if invocation.command == 'Get']
+    fetched = sorted(item for invocation in gets for item in invocation.argv[2:] if item.startswith('$'))
+    vss.invocations[:] = []
+
+    return fetched
+
+def test_resolve_manifest(vss):
+    assert label_snapshot.resolve_manifest(vss, '$/project', 'V1') == {
+        'a.txt': ('a.txt', 1),
+        'b.txt': ('b.txt', 1),
+        'caf\xe9.txt': ('caf\xe9.txt', 1),
+    }
+
+def test_diff_labels(vss, tmpdir):
+    store = SnapshotStore(str(tmpdir.join('snapshots')))
+    recorded = store.record(vss, '$/project', 'v1')
+    set_files(tmpdir, FILES_V2)
+    store.record(vss, '$/project', 'v2')
+
+    # The manifests are the same as recorded: the keys are bytes once loaded too.
+    assert store.get('$/project', 'v1') == recorded
+    assert [type(key) for key in store.get('$/project', 'v1')] == [str] * 3
+    assert store.labels('$/Project') == ['v1', 'v2']
+    assert store.diff('$/project', 'v1', 'v2') == ([('c.txt', 1)], [('b.txt', 1)], [('a.txt', 1, 2)])
+
+    with pytest.raises(KeyError):
+        store.diff('$/project', 'v1', 'v3')
+
+def test_materialize(vss, tmpdir):
+    store = SnapshotStore(str(tmpdir.join('snapshots')))
+    local_path = tmpdir.join('local')
+    label_snapshot.materialize(vss, store, '$/project', 'v1', str(local_path))
+
+    assert get_fetched(vss) == ['$/project/a.txt', '$/project/b.txt', '$/project/caf\xe9.txt']
+    assert local_path.join('caf\xe9.txt').read() == 'caf\xe9\n'
+
+    # Nothing changed: nothing is fetched.
+    label_snapshot.materialize(vss, store, '$/project', 'v1', str(local_path))
+
+    assert get_fetched(vss) == []
+
+    # A file changed locally is fetched again.
+    local_path.join('caf\xe9.txt').write('changed\n')
+    label_snapshot.materialize(vss, store, '$/project', 'v1', str(local_path))
+
+    assert get_fetched(vss) == ['$/project/caf\xe9.txt']
+
+    # The files changed from a label to the other are fetched, and the files dropped from the label are removed.
+    set_files(tmpdir, FILES_V2)
+    label_snapshot.materialize(vss, store, '$/project', 'v2', str(local_path))
+
+    assert get_fetched(vss) == ['$/project/a.txt', '$/project/c.txt']
+    assert sorted(os.listdir(str(local_path))) == [label_snapshot.STATE_NAME, 'a.txt', 'c.txt', 'caf\xe9.txt']
+    assert local_path.join('a.txt').read() == 'a2\n'
@@ -0,0 +1,123 @@
+from vss.benchmarks import fake_ss
+from vss.link_graph import LinkGraph
+from vss.vss import VSS
+
+import pytest
+
+FILES = {
+    '$/a/x.txt': 'x\n',
+    '$/a/y.txt': 'y\n',
+    '$/b/x.txt': 'x\n',
+    '$/c/x.txt': 'x\n',
+    '$/c/y.txt': 'y\n',
+}
+
+class LinkedVSS(VSS):
+    """
+    A VSS class whose Links and Paths commands output the trees set in its links_of and branches_of dicts, which map
+    file paths to their linked paths and to the files branched from them. The files listed by Links are kept in listed.
+    """
+
+    def __init__(self, **kwargs):
+        super(LinkedVSS, self).__init__(**kwargs)
+
+        self.links_of = {}
+        self.branches_of = {}
+        self.listed = []
+
+    def links(self, items, **options):
+        self.listed.extend(items)
+
+        return ''.join('%s\n%s' % (item, ''.join('  %s\n' % path for path in self.links_of.get(item, ()))) for item in items)
+
+    def paths(self, files, **options):
+        return ''.join('%s\n%s' % (fname, ''.join('  %s\n' % path for path in self.branches_of.get(fname, ()))) for fname in files)
+
+@pytest.fixture
+def vss(install_fake_ss):
+    """
+    A repository where x.txt is shared by $/a, $/b and $/c, and $/c/y.txt is branched from $/a/y.txt.
+    """
+
+    vss = LinkedVSS(ss_path=install_fake_ss(files=FILES))
+    shared = ['$/a/x.txt', '$/b/x.txt', '$/c/x.txt']
+
+    for path in shared:
+        vss.links_of[path] = [other.rsplit('/', 1)[0] for other in shared if other != path]
+
+    vss.branches_of['$/a/y.txt'] = ['$/c/y.txt']
+
+    return vss
+
+def test_shared_and_branched_files(vss):
+    graph = LinkGraph(vss)
+    graph.add_project('$/')
+
+    assert graph.get_shared_paths('$/A/x.txt') == ['$/a/x.txt', '$/b/x.txt', '$/c/x.txt']
+    assert graph.get_sharing_projects('$/b/x.txt') == ['$/a', '$/b', '$/c']
+    assert graph.get_shared_paths('$/a/y.txt') == ['$/a/y.txt']
+    assert graph.get_branches('$/c/y.txt') == ('$/a/y.txt', [])
+    assert graph.get_branches('$/a/y.txt') == (None, ['$/c/y.txt'])
+    assert graph.get_affected('$/a/y.txt') == ['$/a/y.txt']
+    assert graph.get_affected_projects('$/a/y.txt', branches=True) == ['$/a', '$/c']
+
+def test_unshared_file_leaves_the_others_shared(vss):
+    graph = LinkGraph(vss)
+    graph.add_project('$/')
+    vss.checkout('$/b/x.txt')
+
+    assert graph.stale() == set()
+
+    # Branching $/b/x.txt ends its sharing: $/a/x.txt and $/c/x.txt still share their file.
+    vss.branch('$/b/x.txt')
+    vss.links_of = {'$/a/x.txt': ['$/c'], '$/c/x.txt': ['$/a']}
+    vss.listed = []
+
+    assert graph.stale() == set(['$/b/x.txt'])
+    assert graph.refresh() == 1
+    assert vss.listed == ['$/b/x.txt']
+    assert graph.stale() == set()
+    assert graph.get_shared_paths('$/b/x.txt') == ['$/b/x.txt']
+    assert graph.get_shared_paths('$/a/x.txt') == ['$/a/x.txt', '$/c/x.txt']
+    assert graph.get_shared_paths('$/c/x.txt') == ['$/a/x.txt', '$/c/x.txt']
+
+def test_file_shared_again(vss):
+    graph = LinkGraph(vss)
+    graph.add_project('$/')
+    vss.links_of['$/a/y.txt'] = ['$/b']
+    vss.share('$/a/y.txt')
+    graph.refresh()
+
+    assert graph.get_shared_paths('$/b/y.txt') == ['$/a/y.txt', '$/b/y.txt']
+    assert graph.get_shared_paths('$/a/x.txt') == ['$/a/x.txt', '$/b/x.txt', '$/c/x.txt']
+
+def test_new_project_refreshed(vss, tmpdir):
+    graph = LinkGraph(vss)
+    graph.add_project('$/a')
+
+    assert graph.get_shared_paths('$/a/x.txt') == ['$/a/x.txt', '$/b/x.txt', '$/c/x.txt']
+
+    # A project that is not known is listed: its files are collected.
+    fake_ss.write_config(str(tmpdir.join('fake_ss.json')), latency={'default': 0}, files=dict(FILES, **{'$/d/sub/z.txt': 'z\n'}))
+    vss.share('$/d', recursive=True)
+    vss.listed = []
+
+    assert graph.stale() == set(['$/d'])
+    assert graph.refresh() == 1
+    assert vss.listed == ['$/d/sub/z.txt']
+    assert graph.get_shared_paths('$/d/sub/z.txt') == ['$/d/sub/z.txt']
+
+def test_saved_and_loaded(vss, tmpdir):
+    path = str(tmpdir.join('links'))
+    graph = LinkGraph(vss, path)
+    graph.add_project('$/')
+    vss.branch('$/b/x.txt')
+    graph.detach()
+
+    loaded = LinkGraph(VSS(ss_path=vss.ss_path), path)
+
+    assert loaded.get_shared_paths('$/a/x.txt') == ['$/a/x.txt', '$/b/x.txt', '$/c/x.txt']
+    assert loaded.get_branches('$/a/y.txt') == (None, ['$/c/y.txt'])
+
+    # The stale items were saved too.
+    assert loaded.stale() == set(['$/b/x.txt'])
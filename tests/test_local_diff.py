@@ -0,0 +1,42 @@
+from vss import journal, label_snapshot, local_diff
+from vss.vss import VSS
+
+import difflib
+import os
+
+def test_unified_diff_matches_difflib():
+    a = ['one\n', 'two\n', 'three\n', 'four\n', 'five\n', 'six\n', 'seven\n', 'eight\n', 'nine\n']
+    b = ['zero\n', 'one\n', 'two\n', 'THREE\n', 'four\n', 'five\n', 'six\n', 'seven\n', 'nine\n', 'ten\n']
+
+    assert local_diff.unified_diff(a, b, 'a/f', 'b/f') == ''.join(difflib.unified_diff(a, b, 'a/f', 'b/f'))
+    assert local_diff.unified_diff(['A \n'], ['a\r\n'], 'a/f', 'b/f', ignore=['case', 'eol', 'whitespace']) == ''
+
+def test_diff_label_with_folder(install_fake_ss, tmpdir):
+    files = {
+        '$/project/a.txt': 'one\ntwo\n',
+        '$/project/sub/b.txt': 'b\n',
+        '$/project/c.txt': 'c\n',
+    }
+    vss = VSS(ss_path=install_fake_ss(files=files))
+    invocations = []
+    vss.hooks.append(invocations.append)
+    local_path = tmpdir.mkdir('local')
+    local_path.join('a.txt').write('one\nthree\n')
+    local_path.mkdir('sub').join('b.txt').write('b\n')
+    local_path.join('d.txt').write('d\n')
+    local_path.join(journal.JOURNAL_NAME).write('{}')
+    local_path.join(label_snapshot.STATE_NAME + '.tmp').write('{}')
+    local_path.join('sub', 'vssver2.scc').write('')
+    base = local_diff.VersionSource(vss, '$/project', version_label='v1')
+    results = local_diff.diff_trees(base, local_diff.FolderSource(str(local_path)), workers=2, processes=False)
+
+    assert [(path, status) for path, status, _ in results] == [('a.txt', 'modified'), ('c.txt', 'deleted'), ('d.txt', 'added')]
+    assert '-two\n+three\n' in results[0][2]
+
+    # The files of the label are fetched by a single Get, into a folder removed afterwards.
+    assert [invocation.command for invocation in invocations] == ['Dir', 'Get']
+    assert '-R' in invocations[1].argv and '-Vlv1' in invocations[1].argv
+
+    folder = [arg[3:] for arg in invocations[1].argv if arg.startswith('-GL')][0]
+
+    assert not os.path.exists(folder)
@@ -0,0 +1,80 @@
+from vss import parsers
+from vss.benchmarks import fake_database
+from vss.native import NativeVSS
+
+import os
+
+import pytest
+
+FILES = {
+    '$/project/a.txt': ['hello world\n', 'hello there\n', 'hello there\nbye\n'],
+    '$/project/sub/b.txt': ['b1'],
+    '$/c.txt': ['c1'],
+}
+
+@pytest.fixture
+def vss(fake_ss_path, tmpdir):
+    """
+    A NativeVSS instance reading a generated database, with the commands it passes to ss.exe recorded.
+    """
+
+    fake_database.write_database(str(tmpdir.join('repository')), FILES)
+    vss = NativeVSS(str(tmpdir.join('repository')), fake_ss_path)
+    vss.invocations = []
+    vss.hooks.append(vss.invocations.append)
+
+    return vss
+
+def test_dir(vss):
+    assert parsers.parse_dir(vss.dir('$/', recursive=True)) == [
+        ('$/', ['$/project'], ['c.txt']),
+        ('$/project', ['$/project/sub'], ['a.txt']),
+        ('$/project/sub', [], ['b.txt']),
+    ]
+    assert parsers.parse_dir(vss.dir('$/PROJECT')) == [('$/PROJECT', ['$/PROJECT/sub'], ['a.txt'])]
+    assert vss.invocations == []
+
+def test_dir_of_missing_project_runs_ss(vss):
+    vss.dir('$/missing')
+
+    assert [invocation.argv[1] for invocation in vss.invocations] == ['Dir']
+
+def test_history(vss):
+    entries = list(parsers.iter_history(vss.history('$/project/a.txt').splitlines(), '$/project/a.txt'))
+
+    assert [entry.version for entry in entries] == [3, 2, 1]
+    assert [entry.action for entry in entries] == ['Checked in $/project', 'Checked in $/project', 'Created']
+    assert [entry.comment for entry in entries] == ['Change 3', 'Change 2', None]
+    assert entries[0].date > entries[1].date > entries[2].date
+    assert vss.invocations == []
+
+def test_view_rebuilds_versions_from_deltas(vss):
+    assert vss.view('$/project/a.txt') == 'hello there\nbye\n'
+    assert vss.view('$/project/a.txt', version_number=3) == 'hello there\nbye\n'
+    assert vss.view('$/project/a.txt', version_number=2) == 'hello there\n'
+    assert vss.view('$/project/a.txt', version_number=1) == 'hello world\n'
+    assert vss.invocations == []
+
+def test_get(vss, tmpdir):
+    folder = tmpdir.mkdir('local')
+    vss.get('$/project/a.txt', get_folder=str(folder), version_number=1)
+    vss.get(['$/project/sub/b.txt'], get_folder=str(folder))
+
+    assert folder.join('a.txt').read() == 'hello world\n'
+    assert folder.join('b.txt').read() == 'b1'
+    assert vss.invocations == []
+
+def test_project_entries_follow_changes(vss, tmpdir):
+    assert vss.database.find('$/project/d.txt') is None
+
+    files = dict(FILES)
+    files['$/project/d.txt'] = ['a longer content, to change the size of the record file of the project']
+    fake_database.write_database(str(tmpdir.join('repository')), files)
+    item = vss.database.find('$/project/d.txt')
+
+    try:
+        assert item is not None and not item.is_project
+    finally:
+        item.close()
+
+    assert vss.view('$/project/d.txt') == files['$/project/d.txt'][0]
@@ -0,0 +1,47 @@
+from vss.option_table import OptionTable, option_table
+
+import pytest
+
+def test_translate():
+    assert option_table.translate('Get', {'recursive': True, 'output': 'error', 'version_label': 'v1'}) == ['-O-', '-R', '-Vlv1']
+    assert option_table.translate('History', {'ignore': ['all', 'case']}) == ['-I-', '-IC']
+    assert option_table.translate('Get', {'recursive': False}) == []
+
+def test_translate_invalid():
+    with pytest.raises(ValueError):
+        option_table.translate('Get', {'no_such_option': True})
+
+    with pytest.raises(ValueError):
+        option_table.translate('About', {'recursive': True})
+
+    with pytest.raises(ValueError):
+        option_table.translate('Get', {'output': 'nowhere'})
+
+    with pytest.raises(ValueError):
+        option_table.translate('NoSuchCommand', {})
+
+def test_cached_result_is_a_copy():
+    table = OptionTable()
+    table.translate('Get', {'recursive': True}).append('-X')
+
+    assert table.translate('Get', {'recursive': True}) == ['-R']
+
+def test_lru_eviction():
+    table = OptionTable(cache_size=4)
+    numbers = [{'number': n} for n in range(5)]
+
+    for options in numbers[:4]:
+        table.translate('History', options)
+
+    table.translate('History', numbers[0])
+    table.translate('History', numbers[4])
+
+    cached = sorted(value for key in table._OptionTable__cache for _, _, value in key[1])
+
+    assert cached == [0, 3, 4]
+
+def test_uncached():
+    table = OptionTable(cache_size=0)
+
+    assert table.translate('Get', {'recursive': True}) == ['-R']
+    assert not table._OptionTable__cache
@@ -0,0 +1,50 @@
+from vss import parallel
+
+import subprocess
+
+import pytest
+
+def test_partition():
+    tree = {
+        '$/p': (['$/p/a', '$/p/b'], ['f%d' % i for i in range(3)]),
+        '$/p/a': (['$/p/a/c'], ['f%d' % i for i in range(4)]),
+        '$/p/a/c': ([], ['f%d' % i for i in range(20)]),
+        '$/p/b': ([], ['f%d' % i for i in range(5)]),
+    }
+
+    assert parallel.partition(tree, '$/p', 100) == [('$/p', True, 32)]
+    assert parallel.partition(tree, '$/p', 10) == [('$/p/a/c', True, 20), ('$/p/b', True, 5), ('$/p/a', False, 4), ('$/p', False, 3)]
+
+def test_run(fake_ss_path, tmpdir):
+    output = parallel.run(None, '$/project', str(tmpdir.join('local')), 'get', {}, fake_ss_path, workers=2, unit_size=50)
+
+    assert output.splitlines() == ['Get $/project: line 0'] + ['Get $/project/sub%d: line 0' % i for i in range(3)]
+    assert tmpdir.join('local', 'sub2').check(dir=True)
+
+def test_run_errors(install_fake_ss, tmpdir):
+    ss_path = install_fake_ss(failure_rate={'default': 0, 'Get': 1})
+
+    with pytest.raises(parallel.ParallelError) as info:
+        parallel.run(None, '$/project', str(tmpdir.join('local')), 'get', {}, ss_path, workers=2, unit_size=50)
+
+    assert sorted(info.value.errors) == ['$/project'] + ['$/project/sub%d' % i for i in range(3)]
+    assert isinstance(info.value.errors['$/project'], subprocess.CalledProcessError)
+
+def test_run_unit_exception(fake_ss_path, tmpdir):
+    # A file where a unit folder should be created: that unit fails, the others still run.
+    tmpdir.join('local', 'sub1').ensure()
+
+    with pytest.raises(parallel.ParallelError) as info:
+        parallel.run(None, '$/project', str(tmpdir.join('local')), 'get', {}, fake_ss_path, workers=2, unit_size=50)
+
+    assert info.value.errors.keys() == ['$/project/sub1']
+    assert isinstance(info.value.errors['$/project/sub1'], OSError)
+    assert 'Get $/project/sub2: line 0' in info.value.output
+
+def test_run_processes(fake_ss_path, tmpdir):
+    tmpdir.join('local', 'sub1').ensure()
+
+    with pytest.raises(parallel.ParallelError) as info:
+        parallel.run(None, '$/project', str(tmpdir.join('local')), 'get', {}, fake_ss_path, workers=2, unit_size=50, processes=True)
+
+    assert info.value.errors.keys() == ['$/project/sub1']
@@ -0,0 +1,143 @@
+from vss import parsers
+
+import datetime
+
+HISTORY = '''*****  a.txt  *****
+Version 3
+User: Admin        Date:  5/12/10   Time:  2:30p
+Checked in $/project/sub
+Comment: First line
+second line
+
+third line
+
+*****************  Version 7   *****************
+Label: "v1.0"
+User: Bob          Date: 12/01/09   Time:  9:05a
+Labeled
+Label comment: Release
+of version 1.0
+
+*****************  Version 6   *****************
+User: Bob          Date: 12/01/09   Time:  9:00a
+b.txt added
+'''
+
+def test_parse_datetime():
+    assert parsers.parse_datetime('5/12/10', '2:30p') == datetime.datetime(2010, 5, 12, 14, 30)
+    assert parsers.parse_datetime('12/01/99', '12:05a') == datetime.datetime(1999, 12, 1, 0, 5)
+    assert parsers.parse_datetime('1/2/2003', '13:00') == datetime.datetime(2003, 1, 2, 13, 0)
+    assert parsers.parse_datetime('yesterday', '2:30p') is None
+    assert parsers.parse_datetime('2/30/10', '2:30p') is None
+
+def test_parse_dir():
+    output = '$/project:\n$sub\na.txt\n\n$/project/sub:\nb.txt\n\n2 item(s)\n'
+
+    assert parsers.parse_dir(output) == [('$/project', ['$/project/sub'], ['a.txt']), ('$/project/sub', [], ['b.txt'])]
+    assert parsers.parse_dir('No items found under $/empty\n') == []
+
+def test_parse_dir_listing():
+    output = '$/project:\n$sub\na.txt\n\n$/project/sub:\nb.txt\n\n2 item(s)\n'
+    listing = parsers.parse_dir_listing(output)
+
+    assert len(listing) == 3
+    assert [(entry.path, entry.is_project) for entry in listing] == [('$/project/sub', True), ('$/project/a.txt', False), ('$/project/sub/b.txt', False)]
+    assert listing.files() == ['$/project/a.txt', '$/project/sub/b.txt']
+    assert listing.to_tree() == parsers.parse_dir(output)
+    assert parsers.parse_dir(listing) == parsers.parse_dir(output)
+    assert [entry.path for entry in parsers.iter_dir(output.splitlines(True))] == [entry.path for entry in listing]
+
+def test_iter_history():
+    entries = list(parsers.iter_history(HISTORY.splitlines(True), '$/project'))
+
+    assert len(entries) == 3
+
+    assert entries[0].version == 3
+    assert entries[0].path == '$/project/sub/a.txt'
+    assert entries[0].user == 'Admin'
+    assert entries[0].date == datetime.datetime(2010, 5, 12, 14, 30)
+    assert entries[0].action == 'Checked in $/project/sub'
+    assert entries[0].comment == 'First line\nsecond line'
+
+    assert entries[1].version == 7
+    assert entries[1].path == '$/project'
+    assert entries[1].label == 'v1.0'
+    assert entries[1].comment == 'Release\nof version 1.0'
+
+    assert entries[2].action == 'b.txt added'
+    assert entries[2].comment is None
+
+def test_iter_history_comment_at_end():
+    lines = ['*****************  Version 1   *****************\n', 'User: A  Date: 1/1/10  Time: 1:00p\n', 'Created\n', 'Comment: one\n', 'two\n']
+
+    assert [entry.comment for entry in parsers.iter_history(lines)] == ['one\ntwo']
+
+def test_iter_history_long_comment():
+    lines = ['*****************  Version 1   *****************\n', 'Comment: line 0\n'] + ['line %d\n' % i for i in range(1, 20000)]
+    entry, = parsers.iter_history(lines)
+
+    assert entry.comment.count('\n') == 19999
+
+def test_parse_action():
+    assert parsers.parse_action('Checked in $/project') == ('checked_in', None, '$/project')
+    assert parsers.parse_action('a.txt added') == ('added', 'a.txt', None)
+    assert parsers.parse_action('$sub deleted') == ('deleted', '$sub', None)
+    assert parsers.parse_action('a.txt renamed to b.txt') == ('renamed', 'a.txt', 'b.txt')
+    assert parsers.parse_action('$sub moved to $/other') == ('moved_to', '$sub', '$/other')
+    assert parsers.parse_action('$sub moved from $/other') == ('moved_from', '$sub', '$/other')
+    assert parsers.parse_action('Rolled back to version 2') == ('rolled_back', None, None)
+    assert parsers.parse_action('Branched at version 4') == ('branched', None, None)
+    assert parsers.parse_action('Labeled') == ('labeled', None, None)
+    assert parsers.parse_action('Created') == ('created', None, None)
+    assert parsers.parse_action('Something else') == (None, None, None)
+    assert parsers.parse_action(None) == (None, None, None)
+
+def test_parse_status():
+    output = '$/project:\na.txt               Admin       Exc  5/12/10  2:30p  C:\\work\n$/project/sub:\nb.txt               Bob              5/13/10  9:00a\n'
+    entries = parsers.parse_status(output)
+
+    assert [(entry.path, entry.user, entry.exclusive, entry.local_folder) for entry in entries] == [
+        ('$/project/a.txt', 'Admin', True, 'C:\\work'),
+        ('$/project/sub/b.txt', 'Bob', False, None),
+    ]
+    assert entries[1].date == datetime.datetime(2010, 5, 13, 9, 0)
+
+def test_parse_status_without_header():
+    output = 'a.txt               Admin       Exc  5/12/10  2:30p  C:\\work\n'
+
+    assert parsers.parse_status(output) == []
+    assert [entry.path for entry in parsers.parse_status(output, '$/project')] == ['$/project/a.txt']
+
+def test_parse_properties():
+    output = '''File:  $/project/a.txt
+Type:  Text
+Size:  120 bytes      4 lines
+Latest:                               Last Label:
+  Version:  5                           Version:  2
+  Date:     5/12/10   2:31p             Date:     1/02/10   9:15a
+Comment:  First
+second
+
+Project:  $/project
+Contains:  3 files
+'''
+    properties = parsers.parse_properties(output)
+
+    assert [(item.path, item.is_project) for item in properties] == [('$/project/a.txt', False), ('$/project', True)]
+    assert properties[0].type == 'Text'
+    assert (properties[0].size, properties[0].lines) == (120, 4)
+    assert properties[0].version == 5
+    assert properties[0].date == datetime.datetime(2010, 5, 12, 14, 31)
+    assert properties[0].comment == 'First\nsecond'
+    assert properties[1].fields['Contains'] == '3 files'
+
+def test_parse_tree():
+    output = '$/project/a.txt\n  $/release/a.txt  (Branched)\n    $/hotfix/a.txt\n  $/shared/a.txt\n'
+    entries = parsers.parse_tree(output)
+
+    assert [(entry.path, entry.depth, entry.parent, entry.note) for entry in entries] == [
+        ('$/project/a.txt', 0, None, None),
+        ('$/release/a.txt', 1, '$/project/a.txt', 'Branched'),
+        ('$/hotfix/a.txt', 2, '$/release/a.txt', None),
+        ('$/shared/a.txt', 1, '$/project/a.txt', None),
+    ]
@@ -0,0 +1,47 @@
+from vss import persistence
+
+import time
+
+def test_write_file(tmpdir):
+    path = str(tmpdir.join('data'))
+    persistence.write_file(path, 'first')
+    persistence.write_file(path, 'second')
+
+    assert tmpdir.join('data').read() == 'second'
+    assert tmpdir.listdir() == [tmpdir.join('data')]
+
+def test_deferred_save():
+    saves = []
+    deferred_save = persistence.DeferredSave(lambda: saves.append(time.time()), 0.1)
+
+    for i in range(5):
+        deferred_save.request()
+
+    assert deferred_save.pending
+    assert saves == []
+
+    time.sleep(0.5)
+
+    assert len(saves) == 1
+    assert not deferred_save.pending
+
+def test_deferred_save_flush():
+    saves = []
+    deferred_save = persistence.DeferredSave(lambda: saves.append(1), 60)
+    deferred_save.flush()
+
+    assert saves == []
+
+    deferred_save.request()
+    persistence.flush_all()
+
+    assert saves == [1]
+    assert not deferred_save.pending
+
+def test_immediate_save():
+    saves = []
+    deferred_save = persistence.DeferredSave(lambda: saves.append(1), 0)
+    deferred_save.request()
+    deferred_save.request()
+
+    assert saves == [1, 1]
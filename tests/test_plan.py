@@ -0,0 +1,80 @@
+from vss.vss import VSS
+
+import pytest
+
+@pytest.fixture
+def vss(fake_ss_path):
+    """
+    A VSS instance with the commands it runs recorded.
+    """
+
+    vss = VSS(ss_path=fake_ss_path)
+    vss.invocations = []
+    vss.hooks.append(vss.invocations.append)
+
+    return vss
+
+def test_calls_are_merged(vss):
+    with vss.plan() as plan:
+        plan.checkout('$/project/a.txt')
+        plan.get(['$/project/a.txt'])
+        plan.checkout(files=['$/project/b.txt'])
+        plan.get(items='$/project/b.txt')
+
+    assert [invocation.argv[1:] for invocation in vss.invocations] == [
+        ['Checkout', '$/project/a.txt', '$/project/b.txt'],
+        ['Get', '$/project/a.txt', '$/project/b.txt'],
+    ]
+
+def test_overlapping_calls_keep_their_order(vss):
+    with vss.plan() as plan:
+        plan.checkout('$/project/a.txt')
+        plan.get('$/project')
+        plan.checkout('$/project/b.txt')
+
+    assert [invocation.argv[1:] for invocation in vss.invocations] == [
+        ['Checkout', '$/project/a.txt'],
+        ['Get', '$/project'],
+        ['Checkout', '$/project/b.txt'],
+    ]
+
+def test_covered_calls_are_dropped(vss):
+    plan = vss.plan()
+    plan.get('$/project/sub/a.txt')
+    plan.get('$/project', recursive=True)
+    plan.get('$/project/b.txt')
+    plan.get('$/project', recursive=True)
+    plan.set_current_project('$/other')
+    plan.set_current_project('$/project')
+    plan.set_current_project('$/Project')
+
+    assert [repr(step) for step in plan.optimize()] == [
+        "get(['$/project'], recursive=True)",
+        "set_current_project('$/Project')",
+    ]
+    assert plan.explain().endswith('7 operations, 2 invocations instead of 7 (5 saved)\n')
+
+    plan.commit()
+
+    assert [invocation.command for invocation in vss.invocations] == ['Get', 'CP']
+
+def test_calls_without_items(vss):
+    with vss.plan() as plan:
+        plan.status()
+        plan.status('$/project/a.txt')
+        plan.status(items=None, recursive=True)
+
+    assert [invocation.argv[1:] for invocation in vss.invocations] == [
+        ['Status'],
+        ['Status', '$/project/a.txt'],
+        ['Status', '-R'],
+    ]
+
+def test_only_commands_are_recorded(vss):
+    plan = vss.plan()
+
+    for name in ('plan', 'batch', 'limits', 'streaming', 'iter_output', 'iter_history', 'missing'):
+        with pytest.raises(AttributeError):
+            getattr(plan, name)
+
+    assert plan.operations == []
@@ -0,0 +1,51 @@
+from vss import scheduler, timeouts
+from vss.vss import VSS
+
+import subprocess
+
+def get_error(stderr, output=''):
+    error = subprocess.CalledProcessError(1, ['ss', 'Checkout'], output=output)
+    error.stderr = stderr
+
+    return error
+
+def test_classify():
+    assert scheduler.classify(get_error('Database is locked, try again later\n')) == 'retryable'
+    assert scheduler.classify(get_error('Access to file "\\\\server\\vss\\data\\status.dat" denied\n')) == 'retryable'
+    assert scheduler.classify(get_error('The process cannot access the file because it is being used by another process.\n')) == 'retryable'
+    assert scheduler.classify(get_error('The specified network name is no longer available.\n')) == 'retryable'
+    assert scheduler.classify(timeouts.TimeoutExpired(None, ['ss', 'Dir'], 1)) == 'retryable'
+    assert scheduler.classify(timeouts.Cancelled(None, ['ss', 'Dir'])) == 'fatal'
+    assert scheduler.classify(ValueError()) == 'fatal'
+
+def test_classify_does_not_match_output_or_words():
+    assert scheduler.classify(get_error('', output='$/project/in use.txt is locked\nPlease try again\n')) == 'fatal'
+    assert scheduler.classify(get_error('$/project/a.txt is checked out by Bob, who is locked out\n')) == 'fatal'
+    assert scheduler.classify(get_error('Version not found: the plugin is unused\n')) == 'fatal'
+
+def test_retries_contention(install_fake_ss, tmpdir):
+    vss = VSS(ss_path=install_fake_ss(lock_path=str(tmpdir.join('lock')), lock_hold=0.1))
+    jobs = scheduler.Scheduler(workers=4, max_attempts=50, base_delay=0.05, max_delay=0.2)
+
+    try:
+        futures = [jobs.submit(vss, 'checkout', ('$/project/%d.txt' % index,)) for index in range(4)]
+        outputs = [future.result() for future in futures]
+    finally:
+        jobs.shutdown()
+
+    assert outputs == ['Checkout $/project/%d.txt: line 0\n' % index for index in range(4)]
+    assert jobs.metrics()['completed'] == 4
+    assert jobs.metrics()['retries'] > 0
+
+def test_fatal_errors_are_not_retried(install_fake_ss):
+    vss = VSS(ss_path=install_fake_ss(failure_rate={'default': 1.0}))
+    jobs = scheduler.Scheduler(workers=1, base_delay=0.01)
+
+    try:
+        error = jobs.submit(vss, 'checkout', ('$/project/a.txt',)).exception()
+    finally:
+        jobs.shutdown()
+
+    assert error.stderr == 'Checkout failed: simulated failure\n'
+    assert jobs.metrics()['failed'] == 1
+    assert jobs.metrics()['retries'] == 0
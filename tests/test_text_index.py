@@ -0,0 +1,100 @@
+from vss import incremental
+from vss.text_index import IndexedVSS, TextIndex
+
+import datetime
+
+import pytest
+
+ENTRY = '''*****  %s  *****
+Version %d
+User: Admin        Date:  %s   Time:  %s
+%s
+
+'''
+
+@pytest.fixture
+def local_copy(tmpdir):
+    """
+    A local copy of $/project.
+    """
+
+    local_path = tmpdir.mkdir('local')
+    local_path.join('a.txt').write('first line\nint value = 42;\n')
+    local_path.mkdir('sub').join('b.txt').write('Value: 7\n')
+    local_path.join('big.txt').write('value ' * 100)
+
+    return local_path
+
+def test_find(local_copy):
+    index = TextIndex(max_file_size=50)
+    index.add_project('$/project', str(local_copy))
+
+    assert index.find('VALUE', ['$/project'], recursive=True) == [
+        ('$/project/a.txt', 2, 'int value = 42;'),
+        ('$/project/sub/b.txt', 1, 'Value: 7'),
+    ]
+    assert index.find('VALUE', ['$/project']) == [('$/project/a.txt', 2, 'int value = 42;')]
+    assert index.find('value = ??;', ['$/project'], extended=True, recursive=True) == [('$/project/a.txt', 2, 'int value = 42;')]
+    assert index.find('v[a-z]lue*;', ['$/project'], extended=True, recursive=True) == [('$/project/a.txt', 2, 'int value = 42;')]
+    assert index.find('VALUE', ['$/project'], recursive=True, case_sensitive=True) == []
+    assert index.find('Value', ['$/project'], recursive=True, case_sensitive=True) == [('$/project/sub/b.txt', 1, 'Value: 7')]
+    assert index.find('value (', ['$/project'], extended=True) == []
+    assert index.find('missing', ['$/project'], recursive=True) == []
+
+def test_big_files_are_skipped(local_copy):
+    index = TextIndex(max_file_size=50)
+    index.add_project('$/project', str(local_copy))
+
+    assert index.skipped_files() == [('$/project/big.txt', str(local_copy.join('big.txt')))]
+    assert index.find('value', ['$/project/big.txt']) == []
+    assert '$/project/big.txt' not in [vss_path for vss_path, _ in index.get_candidates('e', extended=True)]
+
+def test_save_and_load(local_copy, tmpdir):
+    path = str(tmpdir.join('index'))
+    index = TextIndex(path, max_file_size=50)
+    index.add_project('$/project', str(local_copy))
+    index.save()
+    loaded = TextIndex(path, max_file_size=50)
+
+    assert loaded.find('value', ['$/project'], recursive=True) == index.find('value', ['$/project'], recursive=True)
+    assert loaded.skipped_files() == index.skipped_files()
+
+def test_find_in_files(local_copy, fake_ss_path):
+    index = TextIndex(max_file_size=50)
+    index.add_project('$/project', str(local_copy))
+    vss = IndexedVSS(ss_path=fake_ss_path, text_index=index)
+    invocations = []
+    vss.hooks.append(invocations.append)
+
+    assert vss.find_in_files('value', '$/project/sub', recursive=True) == '$/project/sub/b.txt\n'
+    assert vss.find_in_files('val*=', ['$/project/a.txt', '$/project/sub'], extended=True) == '$/project/a.txt\n'
+    assert vss.find_in_files('Value', '$/project/sub', case_sensitive=True) == '$/project/sub/b.txt\n'
+    assert invocations == []
+
+    # Items out of the index, files skipped by the index and other options are left to ss.exe.
+    vss.find_in_files('value', ['$/other'])
+    vss.find_in_files('value', '$/project')
+    vss.find_in_files('value', '$/project/sub', file_name_mode='long')
+    vss.find_in_files('value')
+
+    assert [invocation.argv[1:3] for invocation in invocations] == [['FindinFiles', 'value']] * 4
+
+def test_update_follows_history_dates(local_copy, install_fake_ss):
+    history = ENTRY % ('c.txt', 1, '5/12/10', '2:30p', 'Checked in $/project')
+    vss = IndexedVSS(ss_path=install_fake_ss(history=history), text_index=TextIndex())
+    vss.text_index.add_project('$/project', str(local_copy))
+    vss.text_index.get_project('$/project')['indexed_at'] = datetime.datetime(2010, 5, 1)
+    local_copy.join('c.txt').write('another value\n')
+    vss.text_index.update(vss)
+
+    assert vss.text_index.find('another', ['$/project']) == [('$/project/c.txt', 1, 'another value')]
+    assert vss.text_index.get_project('$/project')['indexed_at'] == datetime.datetime(2010, 5, 12, 14, 30)
+
+def test_indexed_at_read_from_manifest(local_copy):
+    manifest = {'project': '$/project', 'files': {}, 'synced_at': datetime.datetime(2010, 5, 12, 14, 30)}
+    incremental.save_manifest(str(local_copy.join(incremental.MANIFEST_NAME)), manifest)
+    index = TextIndex()
+    index.add_project('$/project', str(local_copy))
+
+    assert index.get_project('$/project')['indexed_at'] == datetime.datetime(2010, 5, 12, 14, 30)
+    assert index.find('synced_at', ['$/project']) == []
@@ -0,0 +1,67 @@
+from vss import instrumentation, timeouts
+from vss.vss import VSS
+
+import subprocess
+import threading
+import time
+
+import pytest
+
+@pytest.fixture
+def slow_ss_path(install_fake_ss):
+    """
+    The path of a simulated ss.exe whose Dir command takes 10 seconds.
+    """
+
+    return install_fake_ss(latency={'default': 0, 'Dir': 10})
+
+def test_timeout(slow_ss_path):
+    vss = VSS(ss_path=slow_ss_path, timeout=0.5)
+    invocations = []
+    vss.hooks.append(invocations.append)
+    started_at = time.time()
+
+    with pytest.raises(timeouts.TimeoutExpired):
+        vss.dir('$/project')
+
+    assert time.time() - started_at < 5
+    assert isinstance(invocations[0].error, timeouts.TimeoutExpired)
+    assert vss.history('$/project')
+
+def test_limits_deadline(slow_ss_path):
+    vss = VSS(ss_path=slow_ss_path)
+
+    with vss.limits(timeout=0.5):
+        with pytest.raises(timeouts.TimeoutExpired):
+            vss.dir('$/project')
+
+def test_cancellation(slow_ss_path):
+    cancellation = timeouts.CancellationToken()
+    vss = VSS(ss_path=slow_ss_path, cancellation=cancellation)
+    timer = threading.Timer(0.5, cancellation.cancel)
+    timer.start()
+
+    try:
+        with pytest.raises(timeouts.Cancelled):
+            vss.dir('$/project')
+    finally:
+        timer.cancel()
+
+    with pytest.raises(timeouts.Cancelled):
+        vss.history('$/project')
+
+def test_completed_command_not_reported_as_timed_out(fake_ss_path):
+    invocation = instrumentation.Invocation([fake_ss_path, 'Dir', '$/project'], timeout=0)
+    process = subprocess.Popen(invocation.argv, stdout=subprocess.PIPE, **timeouts.get_popen_options(invocation))
+    output = process.stdout.read()
+
+    # The process exits before the watchdog starts, and its timeout expires before it is waited for.
+    time.sleep(0.5)
+    watchdog = timeouts.Watchdog(process, invocation)
+    time.sleep(0.5)
+    process.wait()
+    watchdog.stop()
+
+    assert process.returncode == 0
+    assert output
+    assert watchdog.get_error(output) is None
@@ -0,0 +1,73 @@
+from vss import persistence
+from vss import tree_index
+from vss.vss import VSS
+
+import pytest
+
+@pytest.fixture
+def vss(fake_ss_path):
+    vss = VSS(ss_path=fake_ss_path)
+    vss.invocations = []
+    vss.hooks.append(vss.invocations.append)
+
+    return vss
+
+def test_children(vss):
+    index = tree_index.TreeIndex(vss)
+
+    assert index.children('$/project') == (['$/project/sub0', '$/project/sub1', '$/project/sub2'], ['file%d.txt' % i for i in range(10)])
+    assert index.children('$/Project/SUB1') == (['$/project/sub1/sub0', '$/project/sub1/sub1', '$/project/sub1/sub2'], ['file%d.txt' % i for i in range(10)])
+    assert index.exists('$/project/sub1/file3.txt')
+    assert not index.exists('$/project/sub1/file10.txt')
+    assert len(list(index.walk('$/project'))) == 13
+    assert len(vss.invocations) == 1
+
+def test_invalidate(vss):
+    index = tree_index.TreeIndex(vss)
+    index.children('$/project')
+    vss.move('$/project/sub0', '$/project/sub1')
+    index.children('$/project/sub2')
+
+    assert len(vss.invocations) == 2
+
+    index.children('$/project/sub1')
+    index.children('$/project/sub0/sub1')
+
+    assert [invocation.argv[1:] for invocation in vss.invocations[2:]] == [['Dir', '$/project/sub1', '-R'], ['Dir', '$/project/sub0/sub1', '-R']]
+
+def test_listing_bigger_than_cache(vss):
+    index = tree_index.TreeIndex(vss, max_projects=5)
+
+    # The 13 projects listed at once are all kept, including the root.
+    assert index.children('$/project')[0] == ['$/project/sub0', '$/project/sub1', '$/project/sub2']
+    assert index.children('$/project/sub2/sub2')[1]
+    assert len(vss.invocations) == 1
+
+    index.children('$/other')
+
+    assert index.children('$/other/sub1')[1]
+    assert len(vss.invocations) == 2
+
+    index.children('$/project')
+
+    assert len(vss.invocations) == 3
+
+def test_deferred_saves(vss, tmpdir, monkeypatch):
+    writes = []
+    write_file = persistence.write_file
+    monkeypatch.setattr(persistence, 'write_file', lambda path, data: (writes.append(path), write_file(path, data)))
+    path = str(tmpdir.join('index.pickle'))
+    index = tree_index.TreeIndex(vss, path=path, save_delay=60)
+    index.children('$/project')
+    vss.move('$/project/sub0', '$/project/sub1')
+
+    assert writes == []
+
+    index.detach()
+
+    assert writes == [path]
+
+    loaded = tree_index.TreeIndex(vss, path=path)
+    loaded.children('$/project/sub2')
+
+    assert len(vss.invocations) == 2
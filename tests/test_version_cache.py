@@ -0,0 +1,112 @@
+from vss.version_cache import CachingVSS, VersionCache
+
+import os
+import stat
+import sys
+
+import pytest
+
+FILES = {
+    '$/project/a.txt': 'a3',
+}
+
+HISTORY = '''**********************
+Label: "v1"
+User: Admin        Date:  5/12/10   Time:  2:30p
+Labeled
+Label comment: Release
+
+*****************  Version 3   *****************
+User: Admin        Date:  5/11/10   Time:  9:00a
+Checked in $/project
+Comment: Third
+
+*****************  Version 2   *****************
+User: Admin        Date:  5/10/10   Time:  9:00a
+Checked in $/project
+
+'''
+
+@pytest.fixture
+def vss(install_fake_ss, tmpdir):
+    """
+    A CachingVSS instance whose cache saves its index immediately, with the commands it runs recorded.
+    """
+
+    vss = CachingVSS(
+        ss_path=install_fake_ss(files=FILES, history=HISTORY),
+        version_cache=VersionCache(str(tmpdir.join('cache')), save_delay=0),
+    )
+    vss.invocations = []
+    vss.hooks.append(vss.invocations.append)
+
+    return vss
+
+def test_resolve_version_skips_label_record(vss):
+    assert vss.resolve_version('$/project/a.txt', version_label='v1') == 3
+    assert vss.resolve_version('$/project/a.txt', version_label='V1') == 3
+    assert [invocation.argv[1] for invocation in vss.invocations] == ['History']
+
+def test_view_served_from_cache(vss):
+    assert vss.view('$/project/a.txt', version_number=3) == vss.view('$/project/a.txt', version_number=3)
+    assert [invocation.argv[1] for invocation in vss.invocations] == ['View']
+    assert (vss.version_cache.hits, vss.version_cache.misses) == (1, 1)
+
+def test_get_served_from_cache(vss, tmpdir):
+    for name in ('first', 'second'):
+        tmpdir.mkdir(name)
+        vss.get('$/project/a.txt', get_folder=str(tmpdir.join(name)), version_number=3)
+
+        assert tmpdir.join(name, 'a.txt').read() == 'a3'
+
+    assert [invocation.argv[1] for invocation in vss.invocations] == ['Get']
+
+def test_eviction_drops_all_keys_of_a_content(tmpdir):
+    cache = VersionCache(str(tmpdir), max_size=4, save_delay=0)
+    cache.store('a|1', 'abc')
+    cache.store('a|2', 'abc')
+    cache.store('b|1', 'defg')
+
+    assert cache.size == 4
+    assert cache.read('a|1') is None
+    assert cache.read('a|2') is None
+    assert cache.read('b|1') == 'defg'
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='contents are copied on Windows')
+def test_eviction_leaves_linked_files_alone(tmpdir):
+    cache = VersionCache(str(tmpdir.join('cache')), max_size=4, save_delay=0)
+    cache.store('a|1', 'abc')
+    destination = str(tmpdir.join('a.txt'))
+
+    assert cache.materialize('a|1', destination)
+
+    cache.store('b|1', 'defg')
+
+    assert cache.read('a|1') is None
+    assert tmpdir.join('a.txt').read() == 'abc'
+    assert not os.stat(destination).st_mode & stat.S_IWUSR
+
+def test_index_saves_are_deferred(tmpdir):
+    cache = VersionCache(str(tmpdir), save_delay=60)
+    cache.store('a|1', 'abc')
+    cache.set_resolution('a|label|v1', 1)
+
+    assert not tmpdir.join('index.json').exists()
+
+    cache.flush()
+    cache = VersionCache(str(tmpdir))
+
+    assert cache.read('a|1') == 'abc'
+    assert cache.resolve('a|label|v1') == 1
+    assert cache.size == 3
+
+def test_non_ascii_paths(tmpdir):
+    cache = VersionCache(str(tmpdir), save_delay=0)
+    key = VersionCache.get_key(None, '$/project/\xc9T\xc9.txt', 'view', 3)
+    cache.store(key, 'abc')
+    cache.set_resolution(VersionCache.get_key(None, '$/project/\xc9T\xc9.txt', 'label', 'v1'), 3)
+    cache = VersionCache(str(tmpdir))
+
+    assert key == 'none|$/project/\xc9t\xc9.txt|view|3'
+    assert cache.read(key) == 'abc'
+    assert cache.resolve('none|$/project/\xc9t\xc9.txt|label|v1') == 3
@@ -0,0 +1,98 @@
+from vss import instrumentation, sinks
+from vss.parsed import ParsingVSS
+from vss.vss import VSS
+
+import subprocess
+
+import pytest
+
+def test_iter_history(install_fake_ss):
+    vss = VSS(ss_path=install_fake_ss(output_lines={'default': 50}))
+    entries = list(vss.iter_history('$/project'))
+
+    assert [entry.version for entry in entries] == range(10, 0, -1)
+    assert entries[0].action == 'Checked in $/project'
+
+def test_iter_history_stopped_early(install_fake_ss):
+    vss = VSS(ss_path=install_fake_ss(output_lines={'default': 500000}))
+    statistics = instrumentation.Statistics()
+    invocations = []
+    commands = []
+    vss.hooks.extend([statistics, invocations.append])
+    vss.listeners.append(lambda command, arguments: commands.append(command))
+    history = vss.iter_history('$/project')
+
+    assert history.next().version == 100000
+
+    history.close()
+
+    # Stopping the iteration kills ss.exe: the invocation is cancelled, not failed.
+    assert invocations[0].cancelled
+    assert not invocations[0].succeeded
+    assert statistics.snapshot()['History']['errors'] == 0
+    assert statistics.snapshot()['History']['cancelled'] == 1
+    assert commands == []
+
+def test_trace_printed_before_the_command_runs(fake_ss_path, monkeypatch, capsys):
+    monkeypatch.setenv('VSS_PYTHON_TRACE', '1')
+    vss = VSS(ss_path=fake_ss_path)
+    printed = []
+
+    with vss.streaming(lambda data: printed.append(capsys.readouterr()[0])):
+        vss.dir('$/project')
+
+    assert printed and 'Dir $/project' in printed[0]
+
+def test_errors_written_to_stderr_and_kept(install_fake_ss, capsys):
+    vss = VSS(ss_path=install_fake_ss(failure_rate={'default': 1.0}))
+
+    with pytest.raises(subprocess.CalledProcessError) as info:
+        vss.dir('$/project')
+
+    assert info.value.stderr == 'Dir failed: simulated failure\n'
+    assert capsys.readouterr()[1] == 'Dir failed: simulated failure\n'
+
+def test_streaming(fake_ss_path):
+    vss = ParsingVSS(ss_path=fake_ss_path)
+    lines = []
+
+    with vss.streaming(sinks.LineSink(lines.append)):
+        assert vss.get('$/project/a.txt') is sinks.STREAMED_OUTPUT
+
+        # The output went to the sink: parsing it would give empty results.
+        with pytest.raises(sinks.StreamingError):
+            vss.dir('$/project')
+
+        with vss.plan() as plan:
+            plan.get('$/project/a.txt')
+
+    assert lines[0] == 'Get $/project/a.txt: line 0\n'
+    assert lines[1] == '$/project:\n'
+
+def test_line_sink_joins_chunks():
+    lines = []
+    sink = sinks.LineSink(lines.append)
+
+    for chunk in ['a', 'b', 'c\nd', 'e\n\nf', 'g']:
+        sink.write(chunk)
+
+    sink.flush()
+
+    assert lines == ['abc\n', 'de\n', '\n', 'fg']
+
+def test_parsed_status_of_one_item(install_fake_ss):
+    status = 'a.txt                Admin        Exc 5/12/10  2:30p  C:\\work\n'
+    vss = ParsingVSS(ss_path=install_fake_ss(status=status))
+
+    assert [entry.path for entry in vss.status('$/project')] == ['$/project/a.txt']
+    assert [entry.path for entry in vss.status(['$/project/a.txt'])] == ['$/project/a.txt']
+    assert vss.status(['$/project', '$/other']) == []
+
+def test_parsed_iter_dir(install_fake_ss):
+    vss = ParsingVSS(ss_path=install_fake_ss(files={'$/project/a.txt': 'a\n', '$/project/sub/b.txt': 'b\n'}))
+
+    assert [(entry.project, entry.name, entry.is_project) for entry in vss.iter_dir('$/project', recursive=True)] == [
+        ('$/project', 'sub', True),
+        ('$/project', 'a.txt', False),
+        ('$/project/sub', 'b.txt', False),
+    ]
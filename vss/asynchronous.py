@@ -0,0 +1,466 @@
+"""
+An asynchronous Microsoft Visual SourceSafe class.
+"""
+
+from vss import VSS
+
+import batching
+import plan as plan_module
+import timeouts
+
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DEFAULT_CONCURRENCY = 4
+
+class Future(object):
+    """
+    The pending result of an asynchronous VSS command.
+    """
+
+    def __init__(self, invocation=None):
+        """
+        Create a pending future for the specified instrumentation.Invocation.
+        """
+
+        self.invocation = invocation
+        self.__condition = threading.Condition()
+        self.__done = False
+        self.__result = None
+        self.__exception = None
+        self.__callbacks = []
+
+    def done(self):
+        """
+        Check whether the command has completed.
+        """
+
+        with self.__condition:
+            return self.__done
+
+    def result(self, timeout=None):
+        """
+        Wait for the command to complete.
+
+        Returns the standard output of the command or raises its error.
+
+        If timeout (in seconds) expires before the command completes, a RuntimeError is raised.
+        """
+
+        exception = self.exception(timeout)
+
+        if exception is not None:
+            raise exception
+
+        return self.__result
+
+    def exception(self, timeout=None):
+        """
+        Wait for the command to complete.
+
+        Returns the error raised by the command, or None if it succeeded.
+        """
+
+        with self.__condition:
+            if not self.__done:
+                self.__condition.wait(timeout)
+
+            if not self.__done:
+                raise RuntimeError('Timed out waiting for %s' % ' '.join(self.invocation and self.invocation.argv or []))
+
+            return self.__exception
+
+    def add_done_callback(self, callback):
+        """
+        Register a callback to be called with the future as its only argument once it completes.
+
+        If the future has already completed, the callback is called immediately.
+        """
+
+        with self.__condition:
+            if not self.__done:
+                self.__callbacks.append(callback)
+                return
+
+        callback(self)
+
+    def set_result(self, result):
+        """
+        Complete the future with the specified result.
+        """
+
+        self.__complete(result, None)
+
+    def set_exception(self, exception):
+        """
+        Complete the future with the specified error.
+        """
+
+        self.__complete(None, exception)
+
+    def __complete(self, result, exception):
+        """
+        Complete the future and call its callbacks.
+        """
+
+        with self.__condition:
+            if self.__done:
+                raise RuntimeError('Future already completed')
+
+            self.__done = True
+            self.__result = result
+            self.__exception = exception
+            self.__condition.notify_all()
+            callbacks, self.__callbacks = self.__callbacks, []
+
+        for callback in callbacks:
+            callback(self)
+
+class Spawner(object):
+    """
+    Runs ss.exe processes in the background, with a concurrency limit per repository.
+
+    A single thread polls all the running processes: their standard output is redirected to temporary files so that no
+    thread is needed to drain their pipes. It also kills the process trees of the invocations that time out or get
+    cancelled.
+    """
+
+    def __init__(self, poll_interval=0.01):
+        """
+        Create a spawner that checks its processes every poll_interval seconds.
+        """
+
+        self.poll_interval = poll_interval
+        self.__condition = threading.Condition()
+        self.__limits = {}
+        self.__pending = {}
+        self.__running = {}
+        self.__interrupted = {}
+        self.__thread = None
+
+    def get_limit(self, repository_path):
+        """
+        Get the maximum number of ss.exe processes run concurrently for the specified repository.
+        """
+
+        with self.__condition:
+            return self.__limits.get(repository_path, DEFAULT_CONCURRENCY)
+
+    def set_limit(self, repository_path, limit):
+        """
+        Set the maximum number of ss.exe processes run concurrently for the specified repository.
+        """
+
+        if limit < 1:
+            raise ValueError('Invalid concurrency limit (%s)' % repr(limit))
+
+        with self.__condition:
+            self.__limits[repository_path] = limit
+            self.__schedule(repository_path)
+
+    def submit(self, repository_path, invocation):
+        """
+        Schedule the specified instrumentation.Invocation to be run for the specified repository.
+
+        The invocation is filled in as the command runs. Returns a Future.
+        """
+
+        future = Future(invocation)
+
+        with self.__condition:
+            self.__pending.setdefault(repository_path, []).append(future)
+            self.__schedule(repository_path)
+
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__poll, name='VSSSpawner')
+                self.__thread.daemon = True
+                self.__thread.start()
+
+            self.__condition.notify()
+
+        return future
+
+    def __schedule(self, repository_path):
+        """
+        Start as many pending commands as the repository limit allows.
+
+        Must be called with the lock held.
+        """
+
+        pending = self.__pending.get(repository_path, [])
+        running = self.__running.setdefault(repository_path, [])
+
+        while pending and len(running) < self.__limits.get(repository_path, DEFAULT_CONCURRENCY):
+            future = pending.pop(0)
+            invocation = future.invocation
+
+            if invocation.cancellation is not None and invocation.cancellation.cancelled:
+                invocation.error = timeouts.Cancelled(None, invocation.argv)
+                future.set_exception(invocation.error)
+                continue
+
+            output = tempfile.TemporaryFile()
+            errors = tempfile.TemporaryFile()
+            invocation.started_at = time.time()
+
+            try:
+                process = subprocess.Popen(invocation.argv, env=invocation.environment, stdout=output, stderr=errors, **timeouts.get_popen_options(invocation))
+            except Exception, ex:
+                output.close()
+                errors.close()
+                invocation.error = ex
+                future.set_exception(ex)
+            else:
+                invocation.spawn_latency = time.time() - invocation.started_at
+                running.append((process, output, errors, future))
+
+    def __poll(self):
+        """
+        Wait for the running processes to complete, until there is nothing left to run.
+        """
+
+        while True:
+            completed = []
+
+            with self.__condition:
+                for repository_path, running in self.__running.items():
+                    for job in running[:]:
+                        if job[0].poll() is not None:
+                            # Record the end of the invocation before its slot is given to another one.
+                            job[3].invocation.finish(job[0].returncode)
+                            running.remove(job)
+                            completed.append(job)
+                        elif not job[3] in self.__interrupted:
+                            self.__check(job[0], job[3])
+
+                    self.__schedule(repository_path)
+
+                if not completed and not any(self.__running.values()):
+                    self.__thread = None
+                    return
+
+            for process, output, errors, future in completed:
+                output.seek(0)
+                data = output.read()
+                output.close()
+                errors.seek(0)
+                error_data = errors.read()
+                errors.close()
+
+                future.invocation.stdout_bytes = len(data)
+                future.invocation.stderr_bytes = len(error_data)
+
+                if error_data:
+                    sys.stderr.write(error_data)
+
+                with self.__condition:
+                    reason = self.__interrupted.pop(future, None)
+
+                if reason is not None:
+                    future.invocation.error = timeouts.get_error(reason, future.invocation, data)
+                    future.set_exception(future.invocation.error)
+                elif process.returncode:
+                    error = subprocess.CalledProcessError(process.returncode, future.invocation.argv, output=data)
+                    error.stderr = error_data
+                    future.set_exception(error)
+                else:
+                    future.set_result(data)
+
+            if not completed:
+                time.sleep(self.poll_interval)
+
+    def __check(self, process, future):
+        """
+        Kill the process tree of a running invocation that timed out or was cancelled.
+
+        Must be called with the lock held.
+        """
+
+        invocation = future.invocation
+
+        if invocation.cancellation is not None and invocation.cancellation.cancelled:
+            self.__interrupted[future] = 'cancelled'
+        elif invocation.timeout is not None and time.time() - invocation.started_at > invocation.timeout:
+            self.__interrupted[future] = 'timeout'
+        else:
+            return
+
+        timeouts.kill_tree(process)
+
+spawner = Spawner()
+
+class AsyncPlan(plan_module.Plan):
+    """
+    A plan.Plan of an AsyncVSS instance: its operations run one after the other, in the background.
+    """
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit().result()
+
+    def commit(self):
+        """
+        Run the optimized plan, and clear it. Each operation starts once the previous one completed.
+
+        Returns a Future of the standard output of all the invocations, or of the first error.
+        """
+
+        steps = self.optimize()
+        self.operations = []
+        future = Future()
+        outputs = []
+
+        def run_next(previous=None):
+            if previous is not None:
+                if previous.exception() is not None:
+                    future.set_exception(previous.exception())
+                    return
+
+                outputs.append(previous.result() or '')
+
+            if len(outputs) == len(steps):
+                future.set_result(''.join(outputs))
+                return
+
+            step = steps[len(outputs)]
+
+            try:
+                pending = getattr(self.vss, step.method)(*step.args, **step.options)
+            except Exception, ex:
+                future.set_exception(ex)
+            else:
+                pending.add_done_callback(run_next)
+
+        run_next()
+
+        return future
+
+class AsyncVSS(VSS):
+    """
+    A VSS class whose commands run in the background.
+
+    Every command method returns a Future instead of the standard output: many commands can be in flight at once, up to
+    the concurrency limit of the repository. batch and plan return Futures too (see their documentation); iter_output
+    and iter_history, which parse the output as it comes, run synchronously.
+    """
+
+    def __init__(self, repository_path=None, ss_path=None, max_concurrency=None, spawner=spawner, **kwargs):
+        """
+        Create an AsyncVSS instance attached to a specified repository_path repository.
+
+        If max_concurrency is specified, it becomes the concurrency limit of the repository for all the instances that
+        share the same spawner.
+
+        Other keyword arguments are passed to the VSS constructor.
+        """
+
+        super(AsyncVSS, self).__init__(repository_path, ss_path, **kwargs)
+
+        self.spawner = spawner
+
+        if max_concurrency is not None:
+            self.spawner.set_limit(self.repository_path, max_concurrency)
+
+    def plan(self):
+        """
+        Create an AsyncPlan that records calls to the methods of this instance, to run them in fewer invocations.
+
+        Its commit method returns a Future. Used as a context manager, the plan runs when the block exits and the block
+        waits for it to complete.
+        """
+
+        return AsyncPlan(self)
+
+    def batch(self, command, items, workers=None, **options):
+        """
+        Calls the specified VSS command (the name of a VSS method, like 'checkin') for a list of items, in as few
+        invocations as the max_argv_bytes limit allows.
+
+        The invocations run up to the concurrency limit of the repository: workers is ignored.
+
+        Returns a Future of a batching.BatchResult that holds the output or the error of each invocation. Errors other
+        than failed commands complete the Future with that error.
+        """
+
+        if not isinstance(items, list):
+            items = [str(items)]
+
+        method = getattr(self, command)
+        pending = [(batch, method(batch, **options)) for batch in self._get_batches(command, items, options)]
+        future = Future()
+        remaining = [len(pending)]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+
+                if remaining[0]:
+                    return
+
+            result = batching.BatchResult()
+
+            for batch, output in pending:
+                error = output.exception()
+
+                if error is not None and not isinstance(error, subprocess.CalledProcessError):
+                    future.set_exception(error)
+                    return
+
+                result.add(batch, error is None and output.result() or None, error)
+
+            future.set_result(result)
+
+        if not pending:
+            future.set_result(batching.BatchResult())
+
+        for _, output in pending:
+            output.add_done_callback(on_done)
+
+        return future
+
+    def _call(self, invocation):
+        """
+        Schedule the specified ss.exe invocation.
+
+        Returns a Future.
+        """
+
+        future = self.spawner.submit(self.repository_path, invocation)
+        future.add_done_callback(lambda _: self._notify(invocation))
+
+        return future
+
+    def _gather(self, outputs):
+        """
+        Merge the futures of several invocations of ss.exe.
+
+        Returns a Future that completes once all the invocations completed, with their concatenated outputs or the first
+        error.
+        """
+
+        future = Future()
+        remaining = [len(outputs)]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+
+                if remaining[0]:
+                    return
+
+            for output in outputs:
+                if output.exception() is not None:
+                    future.set_exception(output.exception())
+                    return
+
+            future.set_result(''.join(output.result() for output in outputs))
+
+        for output in outputs:
+            output.add_done_callback(on_done)
+
+        return future
@@ -0,0 +1,110 @@
+"""
+Split item lists into batches that fit on a single ss.exe command line.
+"""
+
+# The Windows command line is limited to 32767 characters: keep some room for the environment of the shell.
+DEFAULT_MAX_ARGV_BYTES = 30000
+
+def get_argv_size(argv):
+    """
+    Get the size, in bytes, that the specified arguments take on the command line.
+
+    Every argument is counted as if it had to be quoted.
+    """
+
+    return sum(len(arg) + 3 for arg in argv)
+
+def pack(items, max_argv_bytes=DEFAULT_MAX_ARGV_BYTES, base_size=0):
+    """
+    Pack items into the fewest batches whose arguments, added to base_size bytes of fixed arguments, fit in
+    max_argv_bytes.
+
+    Items keep their order. An item too big to fit in any batch gets a batch of its own.
+
+    Returns a list of lists.
+    """
+
+    batches = []
+    batch = []
+    size = base_size
+
+    for item in items:
+        item_size = get_argv_size([item])
+
+        if batch and size + item_size > max_argv_bytes:
+            batches.append(batch)
+            batch = []
+            size = base_size
+
+        batch.append(item)
+        size += item_size
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+class BatchResult(object):
+    """
+    The result of a batched command, per invocation.
+
+    ss.exe prints a single output for all the items of an invocation, which cannot be told apart per item: batches holds
+    an (items, output, error) tuple for each invocation, in order. error is None if the invocation succeeded, and output
+    is None if it failed.
+    """
+
+    def __init__(self):
+        """
+        Create an empty result.
+        """
+
+        self.batches = []
+
+    def add(self, items, output=None, error=None):
+        """
+        Record the output or the error of the invocation of a batch of items.
+        """
+
+        self.batches.append((list(items), output, error))
+
+    @property
+    def invocations(self):
+        """
+        The number of invocations.
+        """
+
+        return len(self.batches)
+
+    @property
+    def output(self):
+        """
+        The concatenated standard output of the invocations that succeeded.
+        """
+
+        return ''.join(output or '' for _, output, error in self.batches if error is None)
+
+    @property
+    def errors(self):
+        """
+        A dict that maps the items of the invocations that failed to their error.
+
+        An invocation fails as a whole: the other items of a batch are listed even if the error is about a single one.
+        """
+
+        return dict((item, error) for items, _, error in self.batches if error is not None for item in items)
+
+    @property
+    def failed_items(self):
+        """
+        The items of the invocations that failed, in order.
+        """
+
+        return [item for items, _, error in self.batches if error is not None for item in items]
+
+    @property
+    def succeeded(self):
+        """
+        Check whether all the invocations succeeded.
+        """
+
+        return not [error for _, _, error in self.batches if error is not None]
@@ -0,0 +1,217 @@
+"""
+A generator of minimal VSS databases, to exercise native.NativeVSS without an actual database.
+
+write_database writes the data folder of a repository holding the specified files: the record file and the entries file
+of every project, and the record file and the data file of every file. Every file has a Created revision, and a
+Checked in revision for each of its later contents, whose reverse delta rebuilds the previous content. Long names are
+not used (there is no names.dat), so names must fit in 33 characters.
+"""
+
+from vss import native
+
+import datetime
+import itertools
+import os
+import struct
+
+BASE_DATE = datetime.datetime(2010, 5, 10, 9, 0)
+
+USER = 'Admin'
+
+class RecordWriter(object):
+    """
+    Builds the content of a database file: its header, then its records.
+    """
+
+    def __init__(self):
+        """
+        Create a file that holds only its header.
+        """
+
+        self.data = [native.FILE_SIGNATURE.ljust(native.FILE_HEADER_SIZE, '\0')]
+        self.size = native.FILE_HEADER_SIZE
+
+    def add(self, signature, data):
+        """
+        Append a record.
+
+        Returns its offset.
+        """
+
+        offset = self.size
+        self.data.append(native.RECORD_HEADER.pack(len(data), signature, 0) + data)
+        self.size += native.RECORD_HEADER.size + len(data)
+
+        return offset
+
+    def write(self, path):
+        """
+        Write the file to the specified path.
+        """
+
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        with open(path, 'wb') as f:
+            f.write(''.join(self.data))
+
+def pack_string(value, size):
+    """
+    Pack a zero-terminated string in a size bytes field.
+    """
+
+    return struct.pack('%ds' % size, value)
+
+def pack_name(name):
+    """
+    Pack an item name, as read by native.Reader.name.
+    """
+
+    return struct.pack('<h', 0) + pack_string(name, 34) + struct.pack('<i', 0)
+
+def get_physical(index):
+    """
+    Get the physical name of the item with the specified index: AAAAAAAA (the root project), BAAAAAAA...
+    """
+
+    letters = []
+
+    for _ in range(8):
+        letters.append(chr(ord('A') + index % 26))
+        index /= 26
+
+    return ''.join(letters)
+
+def get_delta(old, new):
+    """
+    Get a reverse delta that rebuilds old from new: the prefix they share is copied from new, the rest is logged.
+    """
+
+    prefix = 0
+
+    while prefix < min(len(old), len(new)) and old[prefix] == new[prefix]:
+        prefix += 1
+
+    commands = []
+
+    if prefix:
+        commands.append(struct.pack('<hhii', native.DELTA_WRITE_SUFFIX, 0, 0, prefix))
+
+    if prefix < len(old):
+        commands.append(struct.pack('<hhii', native.DELTA_WRITE_LOG, 0, 0, len(old) - prefix) + old[prefix:])
+
+    commands.append(struct.pack('<hhii', native.DELTA_STOP, 0, 0, 0))
+
+    return ''.join(commands)
+
+def write_item(database_path, physical, item_type, name, revisions, data):
+    """
+    Write the record file of an item, with its revisions (dicts of the Revision fields, oldest first), and its entries
+    or data file.
+    """
+
+    path = os.path.join(database_path, physical[0].lower(), physical.lower())
+    records = RecordWriter()
+    # The header is written last: it holds the offsets of the revisions.
+    records.size += native.RECORD_HEADER.size + 56
+    offsets = []
+    previous = 0
+
+    for revision in revisions:
+        comment_offset = 0
+        comment = revision.get('comment') or ''
+
+        if comment:
+            comment_offset = records.add('MC', comment + '\0')
+
+        delta_offset = 0
+
+        if revision['action'] == native.EDIT_FILE:
+            delta_offset = records.add('FD', revision['delta'])
+
+        fields = struct.pack('<ihhi', previous, revision['action'], revision['version'], revision['timestamp'])
+        fields += pack_string(USER, 32) + pack_string('', 32)
+        fields += struct.pack('<iihh', comment_offset, 0, comment and len(comment) + 1 or 0, 0)
+
+        if revision['action'] == native.EDIT_FILE:
+            fields += struct.pack('<ii', delta_offset, 0) + pack_string(revision['project'], 260)
+        else:
+            fields += pack_name(revision['name']) + pack_string(revision.get('physical') or '', 10)
+
+        previous = records.add('EL', fields)
+        offsets.append(previous)
+
+    header = struct.pack('<hh', item_type, len(revisions)) + pack_name(name)
+    header += struct.pack('<h', 1) + 'a\0' + struct.pack('<ii', offsets[0], offsets[-1])
+    header = header.ljust(56, '\0')
+    records.data.insert(1, native.RECORD_HEADER.pack(len(header), 'DH', 0) + header)
+    records.write(path)
+
+    with open(path + '.a', 'wb') as f:
+        f.write(data)
+
+def write_database(repository_path, files):
+    """
+    Write a database holding the specified files to the data folder of repository_path.
+
+    files maps the VSS paths of the files to the list of their contents, oldest first.
+
+    Returns a dict that maps the VSS path of every item (with the root project as $/) to its physical name.
+    """
+
+    database_path = os.path.join(repository_path, 'data')
+    physicals = {'$/': native.ROOT_PHYSICAL}
+    children = {'$/': []}
+
+    for path in sorted(files):
+        parent = '$/'
+
+        for component in path.split('/')[1:]:
+            child = parent.rstrip('/') + '/' + component
+
+            if not child in physicals:
+                physicals[child] = get_physical(len(physicals))
+                children[parent].append(child)
+
+                if child != path:
+                    children[child] = []
+
+            parent = child
+
+    timestamps = itertools.count(int((BASE_DATE - datetime.datetime(1970, 1, 1)).total_seconds()), 3600)
+
+    for path, contents in sorted(files.items()):
+        revisions = [{'action': native.CREATE_FILE, 'version': 1, 'timestamp': next(timestamps), 'name': path.rsplit('/', 1)[1], 'physical': physicals[path]}]
+
+        for version, (old, new) in enumerate(zip(contents, contents[1:]), 2):
+            revisions.append({
+                'action': native.EDIT_FILE,
+                'version': version,
+                'timestamp': next(timestamps),
+                'project': path.rsplit('/', 1)[0],
+                'comment': 'Change %d' % version,
+                'delta': get_delta(old, new),
+            })
+
+        write_item(database_path, physicals[path], native.FILE_ITEM, path.rsplit('/', 1)[1], revisions, contents[-1])
+
+    for project, names in children.items():
+        name = project == '$/' and '$' or project.rsplit('/', 1)[1]
+        revisions = [{'action': native.CREATE_PROJECT, 'version': 1, 'timestamp': next(timestamps), 'name': name, 'physical': physicals[project]}]
+        entries = RecordWriter()
+
+        for version, child in enumerate(sorted(names), 2):
+            is_project = child in children
+            revisions.append({
+                'action': is_project and native.ADD_PROJECT or native.ADD_FILE,
+                'version': version,
+                'timestamp': next(timestamps),
+                'name': child.rsplit('/', 1)[1],
+                'physical': physicals[child],
+            })
+            item_type = is_project and native.PROJECT_ITEM or native.FILE_ITEM
+            entries.add('JP', struct.pack('<hh', item_type, 0) + pack_name(child.rsplit('/', 1)[1]) + struct.pack('<h', 0) + pack_string(physicals[child], 10))
+
+        write_item(database_path, physicals[project], native.PROJECT_ITEM, name, revisions, ''.join(entries.data))
+
+    return physicals
@@ -0,0 +1,332 @@
+"""
+A simulated ss.exe, to benchmark VSSPython without a VSS database.
+
+The simulation is configured by a JSON file whose path is given by the VSS_FAKE_SS_CONFIG environment variable. Every
+setting can be given per command, with a 'default' entry for the other commands:
+
+- latency: the time each command takes, in seconds;
+- output_lines: the number of lines each command prints;
+- failure_rate: the probability that a command fails;
+- locking: whether the command takes the database lock.
+
+Commands that take the database lock fail with a "database locked" error when another one holds it (for lock_hold
+seconds). Dir and History print listings that the parsers understand: the tree of Dir has tree_depth levels of
+tree_fanout subprojects holding tree_files files each.
+
+The files setting simulates an actual repository instead: a dict that maps the VSS paths of files to their content.
+Dir then lists the projects that hold them, Get writes them to the folder given by -GL (or the current folder) and View
+prints them. The history and status settings, if set, are printed as is by History and Status.
+
+Failures are drawn from a generator seeded with the seed setting and the command line, so that a given command line
+always fails or succeeds the same way (set seed to null for really random failures).
+
+Use install() to get an executable that runs the simulation.
+"""
+
+import json
+import os
+import random
+import stat
+import sys
+import time
+
+CONFIG_VARIABLE = 'VSS_FAKE_SS_CONFIG'
+
+DEFAULT_CONFIG = {
+    'latency': {'default': 0.01},
+    'output_lines': {'default': 1},
+    'failure_rate': {'default': 0.0},
+    'locking': {'default': False, 'Add': True, 'Checkin': True, 'Checkout': True, 'Delete': True, 'Undocheckout': True},
+    'lock_path': None,
+    'lock_hold': 0.01,
+    'tree_depth': 2,
+    'tree_fanout': 3,
+    'tree_files': 10,
+    'files': None,
+    'history': None,
+    'status': None,
+    'seed': 0,
+}
+
+LOCKED_EXIT_CODE = 100
+FAILURE_EXIT_CODE = 1
+
+def get_setting(config, name, command):
+    """
+    Get the value of a per-command setting for the specified command.
+    """
+
+    values = config[name]
+
+    return values.get(command, values.get('default'))
+
+def to_bytes(value):
+    """
+    Convert the strings of a loaded configuration back to the bytes they were written from (see write_config).
+    """
+
+    if isinstance(value, unicode):
+        return value.encode('latin-1')
+
+    if isinstance(value, dict):
+        return dict((to_bytes(key), to_bytes(item)) for key, item in value.items())
+
+    if isinstance(value, list):
+        return [to_bytes(item) for item in value]
+
+    return value
+
+def load_config():
+    """
+    Load the configuration of the simulation.
+    """
+
+    config = dict(DEFAULT_CONFIG)
+    path = os.environ.get(CONFIG_VARIABLE)
+
+    if path:
+        with open(path, 'rb') as f:
+            config.update(to_bytes(json.load(f)))
+
+    return config
+
+def write_config(path, **settings):
+    """
+    Write a configuration file for the simulation, with the specified settings overriding the default ones.
+
+    Strings are the bytes that ss.exe outputs or is given: they are saved as latin-1 to be restored as is.
+    """
+
+    config = dict(DEFAULT_CONFIG)
+    config.update(settings)
+
+    with open(path, 'wb') as f:
+        json.dump(config, f, indent=1, sort_keys=True, encoding='latin-1')
+
+def install(folder, config_path=None):
+    """
+    Install an executable that runs the simulation in the specified folder.
+
+    Returns the path of the executable, which can be given as VSS_PYTHON_SS_PATH or as a ss_path.
+    """
+
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+
+    environment = config_path and '%s=%s ' % (CONFIG_VARIABLE, config_path) or ''
+
+    if sys.platform == 'win32':
+        path = os.path.join(folder, 'ss.bat')
+        environment = config_path and 'set %s=%s\r\n' % (CONFIG_VARIABLE, config_path) or ''
+        script = '@echo off\r\n%s"%s" "%s" %%*\r\n' % (environment, sys.executable, os.path.abspath(__file__.replace('.pyc', '.py')))
+    else:
+        path = os.path.join(folder, 'ss')
+        script = '#!/bin/sh\n%sexec "%s" "%s" "$@"\n' % (environment, sys.executable, os.path.abspath(__file__.replace('.pyc', '.py')))
+
+    with open(path, 'wb') as f:
+        f.write(script)
+
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    return path
+
+def print_dir(project, config, depth, recursive):
+    """
+    Print the listing of a simulated project tree.
+    """
+
+    subprojects = depth < config['tree_depth'] and ['sub%d' % i for i in range(config['tree_fanout'])] or []
+
+    print '%s:' % project
+
+    for subproject in subprojects:
+        print '$%s' % subproject
+
+    for i in range(config['tree_files']):
+        print 'file%d.txt' % i
+
+    print
+
+    if recursive:
+        for subproject in subprojects:
+            print_dir(project.rstrip('/') + '/' + subproject, config, depth + 1, recursive)
+
+def get_repository_tree(files):
+    """
+    Get the tree of the projects holding the simulated files.
+
+    Returns a dict that maps each lowercase project path to a (path, subprojects, files) tuple.
+    """
+
+    tree = {}
+
+    def add_project(path):
+        if not path.lower() in tree:
+            tree[path.lower()] = (path, [], [])
+
+            if path != '$':
+                parent, name = path.rsplit('/', 1)
+                add_project(parent or '$')
+                tree[(parent or '$').lower()][1].append(name)
+
+    for path in sorted(files):
+        project, name = path.rsplit('/', 1)
+        add_project(project or '$')
+        tree[(project or '$').lower()][2].append(name)
+
+    return tree
+
+def print_repository_dir(tree, project, recursive):
+    """
+    Print the listing of a project of the simulated repository.
+
+    Returns False if there is no such project.
+    """
+
+    key = project.rstrip('/').lower() or '$'
+
+    if not key in tree:
+        return False
+
+    path, subprojects, files = tree[key]
+
+    print '%s:' % (path == '$' and '$/' or path)
+
+    for subproject in sorted(subprojects):
+        print '$%s' % subproject
+
+    for name in sorted(files):
+        print name
+
+    print
+
+    if recursive:
+        for subproject in sorted(subprojects):
+            print_repository_dir(tree, path.rstrip('/') + '/' + subproject, recursive)
+
+    return True
+
+def get_repository_items(files, items, folder, recursive):
+    """
+    Write the simulated files designated by items (files or projects) to folder.
+
+    Returns False if an item does not exist.
+    """
+
+    for item in items:
+        key = item.rstrip('/').lower()
+        matches = [(path, '') for path in files if path.lower() == key]
+
+        for path in files:
+            relative_path = path[len(key) + 1:]
+
+            if path.lower().startswith(key + '/') and (recursive or not '/' in relative_path):
+                matches.append((path, '/' in relative_path and relative_path.rsplit('/', 1)[0] or ''))
+
+        if not matches:
+            return False
+
+        for path, subfolder in matches:
+            target_folder = subfolder and os.path.join(folder, *subfolder.split('/')) or folder
+
+            if not os.path.isdir(target_folder):
+                os.makedirs(target_folder)
+
+            with open(os.path.join(target_folder, path.rsplit('/', 1)[1]), 'wb') as f:
+                f.write(files[path])
+
+    return True
+
+def print_history(config, lines):
+    """
+    Print a simulated history with about the specified number of lines.
+    """
+
+    for version in range(max(lines / 5, 1), 0, -1):
+        print '*****************  Version %d   *****************' % version
+        print 'User: Admin        Date:  1/%02d/10   Time: 12:00p' % (version % 28 + 1)
+        print 'Checked in $/project'
+        print 'Comment: Change %d' % version
+        print
+
+def lock(config):
+    """
+    Take the database lock.
+
+    Returns False if another command holds it.
+    """
+
+    try:
+        fd = os.open(config['lock_path'], os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except OSError:
+        return False
+
+    os.close(fd)
+
+    return True
+
+def main(argv):
+    """
+    Run the simulation of the specified ss.exe command line.
+
+    Returns the exit code.
+    """
+
+    config = load_config()
+    command = argv and argv[0] or 'Help'
+    arguments = [arg for arg in argv[1:] if not arg.startswith('-')]
+    options = [arg for arg in argv[1:] if arg.startswith('-')]
+
+    if config['seed'] is not None:
+        random.seed('%s %s' % (config['seed'], ' '.join(argv)))
+
+    locked = get_setting(config, 'locking', command) and config['lock_path']
+
+    if locked and not lock(config):
+        sys.stderr.write('Database is locked, try again later\n')
+        return LOCKED_EXIT_CODE
+
+    try:
+        time.sleep(get_setting(config, 'latency', command))
+
+        if random.random() < get_setting(config, 'failure_rate', command):
+            sys.stderr.write('%s failed: simulated failure\n' % command)
+            return FAILURE_EXIT_CODE
+
+        lines = get_setting(config, 'output_lines', command)
+        files = config['files']
+
+        if files is not None and command == 'Dir':
+            if not print_repository_dir(get_repository_tree(files), arguments and arguments[0] or '$/', '-R' in options):
+                sys.stderr.write('%s is not an existing filename or project\n' % arguments[0])
+                return FAILURE_EXIT_CODE
+        elif files is not None and command == 'Get':
+            folders = [option[3:] for option in options if option.startswith('-GL')]
+
+            if not get_repository_items(files, arguments, folders and folders[-1] or os.getcwd(), '-R' in options):
+                sys.stderr.write('%s is not an existing filename or project\n' % ' '.join(arguments))
+                return FAILURE_EXIT_CODE
+        elif files is not None and command == 'View':
+            sys.stdout.write(files.get(arguments[0], ''))
+        elif command == 'Dir':
+            print_dir(arguments and arguments[0] or '$/', config, 0, '-R' in options)
+        elif command == 'History' and config['history'] is not None:
+            sys.stdout.write(config['history'])
+        elif command == 'History':
+            print_history(config, lines)
+        elif command == 'Status' and config['status'] is not None:
+            sys.stdout.write(config['status'])
+        else:
+            for i in range(lines):
+                print '%s %s: line %d' % (command, ' '.join(arguments[:1]), i)
+
+        if locked:
+            time.sleep(config['lock_hold'])
+
+        return 0
+    finally:
+        if locked:
+            os.remove(config['lock_path'])
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
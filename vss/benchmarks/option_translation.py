@@ -0,0 +1,101 @@
+"""
+Compare the compiled option table with the option translator it replaced.
+
+Run with: python -m vss.benchmarks.option_translation
+"""
+
+from vss.option_table import OPTIONS, OptionTable
+
+import timeit
+
+DEFAULT_NUMBER = 100000
+
+# Option sets, as typically passed by callers: the same few combinations recur constantly.
+OPTION_SETS = [
+    ('Get', {'recursive': True, 'output': 'error', 'ignore': 'all'}),
+    ('Checkout', {'recursive': True, 'get_folder': r'C:\work\project', 'output': 'error'}),
+    ('Checkin', {'recursive': True, 'get_folder': r'C:\work\project', 'output': 'error', 'comment_no_text': True}),
+    ('History', {'recursive': True, 'version_label': 'v1.0', 'ignore': ['all', 'case']}),
+]
+
+def build_legacy_map():
+    """
+    Build the map of options the way the legacy translator did, on every call: a new dict, with new dicts of values.
+
+    The map is built from option_table.OPTIONS, so that the benchmark measures the legacy cost without a second copy of
+    the table.
+    """
+
+    return dict((name, isinstance(entry, dict) and dict(entry) or entry) for name, _, entry in OPTIONS)
+
+def legacy_translate(options):
+    """
+    Convert options to their VSS format, the way VSS did before the option table was compiled.
+    """
+
+    result = []
+    options_map = build_legacy_map()
+
+    for option, value in options.items():
+
+        if not option in options_map:
+            raise ValueError('Invalid option name (%s)' % repr(option))
+
+        map_entry = options_map[option]
+
+        if isinstance(map_entry, dict):
+
+            def handle_value(v):
+                if not v in map_entry:
+                    raise ValueError('Invalid option value for %s (%s)' % (repr(option), repr(v)))
+
+                result.append(map_entry[v])
+
+            if isinstance(value, list):
+                for v in value:
+                    handle_value(v)
+            else:
+                handle_value(value)
+
+        elif isinstance(map_entry, str):
+
+            if isinstance(value, str):
+                result.append(map_entry.replace('{param}', value or ''))
+            elif value:
+                result.append(map_entry)
+
+    return result
+
+def run(number=DEFAULT_NUMBER):
+    """
+    Time number translations of each option set with both translators.
+
+    Returns a dict that maps each translator name to its time per translation, in microseconds.
+    """
+
+    translators = {
+        'legacy': lambda command, options: legacy_translate(options),
+        'uncached': OptionTable(cache_size=0).translate,
+        'compiled': OptionTable().translate,
+    }
+    results = {}
+
+    for name, translator in sorted(translators.items()):
+        def translate_all():
+            for command, options in OPTION_SETS:
+                translator(command, options)
+
+        results[name] = timeit.timeit(translate_all, number=number) * 1e6 / (number * len(OPTION_SETS))
+
+    return results
+
+def main():
+    """
+    Run the benchmark and print its results.
+    """
+
+    for name, duration in sorted(run().items()):
+        print '%-10s %8.3f us per translation' % (name, duration)
+
+if __name__ == '__main__':
+    main()
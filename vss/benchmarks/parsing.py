@@ -0,0 +1,124 @@
+"""
+Measure the throughput of the output parsers on generated sample outputs.
+
+Run with: python -m vss.benchmarks.parsing
+"""
+
+from vss import parsers
+
+import timeit
+
+DEFAULT_NUMBER = 5
+
+DIR_PROJECTS = 200
+DIR_FILES = 100
+STATUS_FILES = 5000
+PROPERTIES_ITEMS = 2000
+TREE_ITEMS = 2000
+
+def get_dir_output():
+    """
+    Get the output of a recursive Dir command over DIR_PROJECTS projects of DIR_FILES files.
+    """
+
+    lines = []
+
+    for i in range(DIR_PROJECTS):
+        lines.append('$/project/module%03d:' % i)
+        lines.extend('$sub%02d' % j for j in range(i < DIR_PROJECTS / 10 and 9 or 0))
+        lines.extend('file%04d.cpp' % j for j in range(DIR_FILES))
+        lines.append('')
+
+    lines.append('%d item(s)' % (DIR_PROJECTS * DIR_FILES))
+
+    return '\n'.join(lines) + '\n'
+
+def get_status_output():
+    """
+    Get the output of a recursive Status command listing STATUS_FILES checked out files.
+    """
+
+    lines = []
+
+    for i in range(STATUS_FILES):
+        if i % 50 == 0:
+            lines.append('$/project/module%03d:' % (i / 50))
+
+        lines.append('%-20s%-12sExc  5/12/10  2:%02dp  C:\\work\\module%03d' % ('file%04d.cpp' % i, 'user%d' % (i % 7), i % 60, i / 50))
+
+    return '\n'.join(lines) + '\n'
+
+def get_properties_output():
+    """
+    Get the output of a Properties command for PROPERTIES_ITEMS files.
+    """
+
+    blocks = []
+
+    for i in range(PROPERTIES_ITEMS):
+        blocks.append('\n'.join([
+            'File:  $/project/file%04d.cpp' % i,
+            'Type:  Text',
+            'Size:  %d bytes      %d lines' % (i * 40, i),
+            'Store only latest version:  No',
+            'Latest:                               Last Label:',
+            '  Version:  %d                           Version:  1' % (i % 30 + 1),
+            '  Date:     5/12/10   2:31p             Date:     1/02/10   9:15a',
+            'Comment:  Revision %d' % i,
+            '',
+        ]))
+
+    return '\n'.join(blocks)
+
+def get_tree_output():
+    """
+    Get the output of a Paths command for TREE_ITEMS files, each shared and branched twice.
+    """
+
+    lines = []
+
+    for i in range(TREE_ITEMS):
+        lines.append('$/project/file%04d.cpp' % i)
+        lines.append('  $/release1/file%04d.cpp  (Branched)' % i)
+        lines.append('    $/release2/file%04d.cpp' % i)
+        lines.append('  $/shared/file%04d.cpp' % i)
+
+    return '\n'.join(lines) + '\n'
+
+def run(number=DEFAULT_NUMBER):
+    """
+    Time number parses of each sample output with each parser.
+
+    Returns a dict that maps each parser name to its throughput, in parsed entries per second.
+    """
+
+    dir_output = get_dir_output()
+    status_output = get_status_output()
+    properties_output = get_properties_output()
+    tree_output = get_tree_output()
+
+    parses = {
+        'dir_legacy': (lambda: parsers.parse_dir(dir_output), sum(len(subprojects) + len(files) for _, subprojects, files in parsers.parse_dir(dir_output))),
+        'dir_listing': (lambda: parsers.parse_dir_listing(dir_output), len(parsers.parse_dir_listing(dir_output))),
+        'dir_iter': (lambda: list(parsers.iter_dir(dir_output.splitlines(True))), len(parsers.parse_dir_listing(dir_output))),
+        'status': (lambda: parsers.parse_status(status_output), STATUS_FILES),
+        'properties': (lambda: parsers.parse_properties(properties_output), PROPERTIES_ITEMS),
+        'paths': (lambda: parsers.parse_tree(tree_output), TREE_ITEMS * 4),
+    }
+    results = {}
+
+    for name, (parse, entries) in sorted(parses.items()):
+        results[name] = entries * number / timeit.timeit(parse, number=number)
+
+    return results
+
+def main():
+    """
+    Run the benchmark and print its results.
+    """
+
+    for name, throughput in sorted(run().items()):
+        print '%-12s %12.0f entries per second' % (name, throughput)
+
+if __name__ == '__main__':
+    main()
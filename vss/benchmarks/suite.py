@@ -0,0 +1,323 @@
+"""
+Throughput benchmarks of VSSPython against the simulated ss.exe of fake_ss.
+
+Run with: python -m vss.benchmarks.suite [--output results.json] [--compare baseline.json]
+"""
+
+from vss import functions
+from vss import instrumentation
+from vss import parallel
+from vss import text_index
+from vss.vss import VSS
+from vss.benchmarks import fake_ss
+from vss.benchmarks import option_translation
+from vss.benchmarks import parsing
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+DEFAULT_REPEAT = 3
+
+PROJECT = '$/project'
+
+# The simulated database: a tree of 21 projects holding 50 files each, answered in 5 ms per command.
+SETTINGS = {
+    'latency': {'default': 0.005},
+    'output_lines': {'default': 1, 'Checkin': 50, 'Checkout': 50, 'Get': 50},
+    'tree_depth': 2,
+    'tree_fanout': 4,
+    'tree_files': 50,
+}
+
+LARGE_LIST_SIZE = 5000
+
+TEXT_INDEX_FILES = 1000
+# FindinFiles patterns, with wildcards.
+TEXT_INDEX_QUERIES = ['function_0042', 'Module123Handler', 'value_7 * 512;']
+
+class Context(object):
+    """
+    The simulated environment the benchmarks run in.
+    """
+
+    def __init__(self, folder, **settings):
+        """
+        Install the simulated ss.exe with the specified settings in folder and select it through VSS_PYTHON_SS_PATH.
+        """
+
+        self.folder = folder
+        self.config_path = os.path.join(folder, 'config.json')
+        self.settings = dict(SETTINGS, **settings)
+        fake_ss.write_config(self.config_path, **self.settings)
+        self.ss_path = fake_ss.install(os.path.join(folder, 'bin'), self.config_path)
+        self.previous_ss_path = os.environ.get('VSS_PYTHON_SS_PATH')
+        os.environ['VSS_PYTHON_SS_PATH'] = self.ss_path
+
+    def get_local_path(self):
+        """
+        Get an empty local folder.
+        """
+
+        return tempfile.mkdtemp(dir=self.folder)
+
+    def close(self):
+        """
+        Restore VSS_PYTHON_SS_PATH.
+        """
+
+        if self.previous_ss_path is None:
+            del os.environ['VSS_PYTHON_SS_PATH']
+        else:
+            os.environ['VSS_PYTHON_SS_PATH'] = self.previous_ss_path
+
+def get_files(count):
+    """
+    Get a list of count VSS file paths, with realistic lengths.
+    """
+
+    return ['%s/src/module%03d/implementation_file_%05d.cpp' % (PROJECT, i / 100, i) for i in range(count)]
+
+def bench_checkout(context):
+    """
+    Check out the whole project.
+    """
+
+    functions.checkout(None, PROJECT, context.get_local_path())
+
+def bench_checkout_parallel(context):
+    """
+    Check out the whole project with 4 workers.
+    """
+
+    functions.checkout(None, PROJECT, context.get_local_path(), workers=4, unit_size=parallel.DEFAULT_UNIT_SIZE)
+
+def bench_checkin(context):
+    """
+    Check in the whole project.
+    """
+
+    functions.checkin(None, PROJECT, context.get_local_path())
+
+def bench_get(context):
+    """
+    Get the whole project.
+    """
+
+    functions.get(None, PROJECT, context.get_local_path())
+
+def bench_get_parallel(context):
+    """
+    Get the whole project with 4 workers.
+    """
+
+    functions.get(None, PROJECT, context.get_local_path(), workers=4, unit_size=parallel.DEFAULT_UNIT_SIZE)
+
+def bench_large_list(context):
+    """
+    Check in a long list of files, split in batches.
+    """
+
+    vss = VSS()
+    statistics = instrumentation.Statistics()
+    vss.hooks.append(statistics)
+    vss.checkin(get_files(LARGE_LIST_SIZE), comment_no_text=True)
+
+    return {'invocations': statistics.snapshot()['Checkin']['count']}
+
+def bench_large_list_parallel(context):
+    """
+    Check in a long list of files, split in batches run by 4 workers.
+    """
+
+    result = VSS().batch('checkin', get_files(LARGE_LIST_SIZE), workers=4, comment_no_text=True)
+
+    return {'invocations': result.invocations}
+
+def bench_lock_contention(context):
+    """
+    Check out files in many small batches run by 8 workers that compete for the database lock.
+    """
+
+    result = VSS(max_argv_bytes=2000).batch('checkout', get_files(LARGE_LIST_SIZE / 10), workers=8)
+
+    return {'errors': len(result.errors)}
+
+def bench_failures(context):
+    """
+    Get the whole project with 4 workers while some Get commands fail.
+    """
+
+    try:
+        functions.get(None, PROJECT, context.get_local_path(), workers=4, unit_size=50)
+    except parallel.ParallelError, ex:
+        return {'errors': len(ex.errors)}
+
+    return {'errors': 0}
+
+def bench_text_index(context):
+    """
+    Build a text index of a local copy and query it, and compare the queries with a scan of every file.
+    """
+
+    local_path = context.get_local_path()
+
+    for i in range(TEXT_INDEX_FILES):
+        folder = os.path.join(local_path, 'module%02d' % (i / 100))
+
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        with open(os.path.join(folder, 'file%04d.cpp' % i), 'wb') as f:
+            for j in range(100):
+                f.write('int function_%04d(int value_%d) { return value_%d * %d; }\n' % (i * 7 + j, j, j, i))
+
+            f.write('class Module%dHandler {};\n' % i)
+
+    start = time.time()
+    index = text_index.TextIndex()
+    index.add_project(PROJECT, local_path)
+    build_time = time.time() - start
+
+    start = time.time()
+
+    for query in TEXT_INDEX_QUERIES:
+        index.find(query, [PROJECT], extended=True, recursive=True)
+
+    query_time = (time.time() - start) / len(TEXT_INDEX_QUERIES)
+
+    start = time.time()
+
+    for query in TEXT_INDEX_QUERIES:
+        matches = text_index.get_matcher(query, extended=True)
+
+        for folder, _, files in os.walk(local_path):
+            for fname in files:
+                with open(os.path.join(folder, fname), 'rb') as f:
+                    [line for line in f if matches(line)]
+
+    scan_time = (time.time() - start) / len(TEXT_INDEX_QUERIES)
+
+    return {'build_s': build_time, 'query_s': query_time, 'scan_s': scan_time}
+
+# The benchmarks: (name, function, settings overriding SETTINGS). Functions may return extra measures as a dict.
+BENCHMARKS = [
+    ('checkout', bench_checkout, {}),
+    ('checkout_parallel', bench_checkout_parallel, {}),
+    ('checkin', bench_checkin, {}),
+    ('get', bench_get, {}),
+    ('get_parallel', bench_get_parallel, {}),
+    ('large_list', bench_large_list, {}),
+    ('large_list_parallel', bench_large_list_parallel, {}),
+    ('lock_contention', bench_lock_contention, {'lock_hold': 0.02}),
+    ('failures', bench_failures, {'failure_rate': {'default': 0.0, 'Get': 0.1}}),
+    ('text_index', bench_text_index, {}),
+]
+
+def run_benchmark(function, repeat, **settings):
+    """
+    Run function repeat times in a new Context with the specified settings.
+
+    Returns a dict of measures: the min, median and mean durations in seconds, plus the extra measures of the last run.
+    """
+
+    folder = tempfile.mkdtemp(prefix='vss-benchmark-')
+
+    if 'lock_hold' in settings:
+        settings['lock_path'] = os.path.join(folder, 'database.lock')
+
+    context = Context(folder, **settings)
+    durations = []
+    measures = {}
+
+    try:
+        for _ in range(repeat):
+            start = time.time()
+            measures = function(context) or {}
+            durations.append(time.time() - start)
+    finally:
+        context.close()
+        shutil.rmtree(folder, ignore_errors=True)
+
+    durations.sort()
+    measures.update({
+        'min': durations[0],
+        'median': durations[len(durations) / 2],
+        'mean': sum(durations) / len(durations),
+        'repeat': repeat,
+    })
+
+    return measures
+
+def run(names=None, repeat=DEFAULT_REPEAT):
+    """
+    Run the benchmarks (only the ones in names, if specified).
+
+    Returns a dict that maps each benchmark name to its measures.
+    """
+
+    results = {}
+
+    for name, function, settings in BENCHMARKS:
+        if names and not name in names:
+            continue
+
+        results[name] = run_benchmark(function, repeat, **settings)
+
+    if not names or 'option_translation' in names:
+        results['option_translation'] = dict(('%s_us' % key, value) for key, value in option_translation.run(10000).items())
+
+    if not names or 'parsing' in names:
+        results['parsing'] = dict(('%s_per_s' % key, value) for key, value in parsing.run().items())
+
+    return results
+
+def compare(results, baseline):
+    """
+    Print the median durations of results next to the ones of a baseline.
+    """
+
+    for name, measures in sorted(results['benchmarks'].items()):
+        base = baseline['benchmarks'].get(name, {})
+
+        if 'median' in measures and 'median' in base:
+            print '%-20s %9.3f s %9.3f s %+7.1f%%' % (name, base['median'], measures['median'], (measures['median'] / base['median'] - 1) * 100)
+
+def main():
+    """
+    Run the benchmarks and print or save their results.
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark VSSPython against a simulated ss.exe.')
+    parser.add_argument('names', nargs='*', help='the benchmarks to run (all by default)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='the number of runs of each benchmark')
+    parser.add_argument('--label', default=None, help='a label for the results, like a version number')
+    parser.add_argument('--output', default=None, help='a JSON file to save the results to')
+    parser.add_argument('--compare', default=None, help='a JSON file of results to compare with')
+    args = parser.parse_args()
+
+    results = {
+        'label': args.label,
+        'time': time.time(),
+        'python': sys.version.split()[0],
+        'platform': sys.platform,
+        'settings': SETTINGS,
+        'benchmarks': run(args.names, args.repeat),
+    }
+
+    if args.output:
+        with open(args.output, 'wb') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, 'rb') as f:
+            compare(results, json.load(f))
+    else:
+        print json.dumps(results['benchmarks'], indent=1, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
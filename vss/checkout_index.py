@@ -0,0 +1,231 @@
+"""
+An index of the checked out files of VSS projects, to avoid calling the Status command over whole trees.
+"""
+
+import parsers
+import persistence
+import timeouts
+import tree_index
+
+import cPickle
+import datetime
+import os
+import subprocess
+import threading
+
+# The commands that change the checkouts of their items.
+TRACKED_COMMANDS = frozenset(['Checkin', 'Checkout', 'Delete', 'Destroy', 'Move', 'Purge', 'Rename', 'Undocheckout'])
+
+class CheckoutIndex(object):
+    """
+    Records the checked out files of some VSS projects, queryable by user, project and age.
+
+    Projects are listed with a recursive Status command when they are added. Then, the commands run through the VSS
+    instance mark the items they name as stale, and refresh lists only those items again. Checkouts made elsewhere (by
+    other clients) are only seen when a project is rescanned: refresh rescans the projects scanned more than max_age
+    ago.
+
+    If path is specified, the index is also saved to and loaded from that file, stale items included. Saves are deferred
+    by save_delay seconds, so that the changes made by a series of commands are saved at once (see
+    persistence.DeferredSave); detach and save write the index immediately.
+    """
+
+    def __init__(self, vss, path=None, save_delay=persistence.DEFAULT_SAVE_DELAY):
+        """
+        Create an index for the repository of the specified VSS instance.
+        """
+
+        self.vss = vss
+        self.path = path
+        self.__lock = threading.RLock()
+        self.__projects = {}
+        self.__entries = {}
+        self.__stale = set()
+        self.__deferred_save = persistence.DeferredSave(self.save, save_delay)
+
+        if self.path and os.path.isfile(self.path):
+            self.load()
+
+        self.vss.listeners.append(self.on_command)
+
+    def detach(self):
+        """
+        Stop tracking the commands run through the VSS instance, and save the pending changes.
+        """
+
+        self.vss.listeners.remove(self.on_command)
+        self.__deferred_save.flush()
+
+    def add_project(self, project):
+        """
+        List the checked out files of the specified project (recursively) and add them to the index.
+        """
+
+        self.__scan(project, True)
+
+        with self.__lock:
+            self.__projects[tree_index.normalize(project)] = (project, datetime.datetime.now())
+
+        if self.path:
+            self.__deferred_save.request()
+
+    def remove_project(self, project):
+        """
+        Remove a project and its checked out files from the index.
+        """
+
+        key = tree_index.normalize(project)
+
+        with self.__lock:
+            self.__projects.pop(key, None)
+
+            for entry_key in self.__entries.keys():
+                if entry_key.startswith(key + '/'):
+                    del self.__entries[entry_key]
+
+        if self.path:
+            self.__deferred_save.request()
+
+    def refresh(self, max_age=None):
+        """
+        List the stale items again, and the whole projects scanned before max_age (a datetime.timedelta) if specified.
+
+        Returns the number of Status commands run.
+        """
+
+        now = datetime.datetime.now()
+
+        with self.__lock:
+            stale = set(self.__stale)
+            projects = [
+                project for project, scanned_at in self.__projects.values()
+                if None in stale or (max_age is not None and scanned_at < now - max_age)
+            ]
+
+        for project in projects:
+            self.__scan(project, True)
+
+            with self.__lock:
+                self.__projects[tree_index.normalize(project)] = (project, now)
+
+        # Items under a project that was just scanned are up to date.
+        scanned = [tree_index.normalize(project) for project in projects]
+        items = [item for item in stale if item is not None and not [key for key in scanned if item == key or item.startswith(key + '/')]]
+
+        for item in items:
+            self.__scan(item, self.__is_project(item))
+
+        with self.__lock:
+            self.__stale -= stale
+
+        if self.path:
+            self.__deferred_save.request()
+
+        return len(projects) + len(items)
+
+    def query(self, user=None, project=None, older_than=None):
+        """
+        Get the checked out files matching all the specified criteria: checked out by user, under project, or for more
+        than older_than (a datetime.timedelta).
+
+        Returns a list of parsers.StatusEntry instances, sorted by path.
+        """
+
+        key = project is not None and tree_index.normalize(project)
+        limit = older_than is not None and datetime.datetime.now() - older_than
+
+        with self.__lock:
+            entries = self.__entries.items()
+
+        return [
+            entry for entry_key, entry in sorted(entries)
+            if (user is None or (entry.user or '').lower() == user.lower())
+            and (key is False or entry_key.startswith(key + '/'))
+            and (limit is False or (entry.date is not None and entry.date <= limit))
+        ]
+
+    def stale(self):
+        """
+        Get the items that refresh will list again (None standing for all the projects).
+        """
+
+        with self.__lock:
+            return set(self.__stale)
+
+    def on_command(self, command, arguments):
+        """
+        Mark the items named by the specified command as stale.
+
+        Local files are checked in or out of the current project, which is not known: commands that do not name a VSS
+        path mark all the projects as stale.
+        """
+
+        if not command in TRACKED_COMMANDS:
+            return
+
+        paths = [argument for argument in arguments if argument.startswith('$')]
+
+        with self.__lock:
+            if not paths or len(paths) < len([argument for argument in arguments if not argument.startswith('-')]):
+                self.__stale.add(None)
+            else:
+                self.__stale.update(tree_index.normalize(path) for path in paths)
+
+        if self.path:
+            self.__deferred_save.request()
+
+    def load(self):
+        """
+        Load the index from its file.
+        """
+
+        with open(self.path, 'rb') as f:
+            data = cPickle.load(f)
+
+        with self.__lock:
+            self.__projects, self.__entries, self.__stale = data
+
+    def save(self):
+        """
+        Save the index to its file.
+        """
+
+        with self.__lock:
+            data = cPickle.dumps((self.__projects, self.__entries, self.__stale), cPickle.HIGHEST_PROTOCOL)
+
+        persistence.write_file(self.path, data)
+
+    def __is_project(self, key):
+        """
+        Check whether an item (a normalized path) is known to be a project: an indexed project, or the project of
+        indexed checkouts.
+        """
+
+        with self.__lock:
+            return key in self.__projects or any(entry_key.startswith(key + '/') for entry_key in self.__entries)
+
+    def __scan(self, item, is_project):
+        """
+        List the checked out files of an item (a file, or a project and its subprojects) and replace its entries.
+        """
+
+        # The files of a project are listed before any project header.
+        project = is_project and item or tree_index.get_parent(item)
+
+        try:
+            entries = parsers.parse_status(self.vss.status(item, recursive=True), project)
+        except (timeouts.TimeoutExpired, timeouts.Cancelled):
+            raise
+        except subprocess.CalledProcessError:
+            # Status fails when nothing is checked out, and for items that no longer exist.
+            entries = []
+
+        key = tree_index.normalize(item)
+
+        with self.__lock:
+            for entry_key in self.__entries.keys():
+                if entry_key == key or entry_key.startswith(key + '/'):
+                    del self.__entries[entry_key]
+
+            for entry in entries:
+                self.__entries[tree_index.normalize(entry.path)] = entry
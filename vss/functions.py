@@ -4,46 +4,88 @@ A set of high-level functions to ease the use of Microsoft Visual SourceSafe.
 
 from vss import VSS
 
-def checkout(repository_path, vss_project_path, local_path, ss_path=None):
+import parallel
+import incremental
+import journal as journal_module
+
+def checkout(repository_path, vss_project_path, local_path, ss_path=None, workers=None, unit_size=parallel.DEFAULT_UNIT_SIZE, processes=False):
     """
     Check out a VSS project to the specified local directory.
 
+    If workers is specified, the project tree is split into work units of about unit_size files that are run in parallel
+    by that many threads (or processes, if processes is True). See parallel.run.
+
     Return the standard output.
     """
 
+    if workers:
+        return parallel.run(repository_path, vss_project_path, local_path, 'checkout', {'output': 'error'}, ss_path, workers, unit_size, processes)
+
     vss = VSS(repository_path, ss_path)
 
     return vss.checkout(vss_project_path, recursive=True, get_folder=local_path, output='error')
 
-def undo_checkout(repository_path, vss_project_path, local_path, ss_path=None):
+def undo_checkout(repository_path, vss_project_path, local_path, ss_path=None, workers=None, unit_size=parallel.DEFAULT_UNIT_SIZE, processes=False):
     """
     Undo a checkout of a VSS project to the specified local directory.
 
+    If workers is specified, the project tree is split into work units of about unit_size files that are run in parallel
+    by that many threads (or processes, if processes is True). See parallel.run.
+
     Return the standard output.
     """
 
+    if workers:
+        return parallel.run(repository_path, vss_project_path, local_path, 'undo_checkout', {'output': 'error'}, ss_path, workers, unit_size, processes)
+
     vss = VSS(repository_path, ss_path)
 
     return vss.undo_checkout(vss_project_path, recursive=True, get_folder=local_path, output='error')
 
-def checkin(repository_path, vss_project_path, local_path, ss_path=None):
+def checkin(repository_path, vss_project_path, local_path, ss_path=None, journal=None):
     """
     Check in a VSS project from the specified local directory.
 
+    If journal (a journal.Journal of local_path, kept by a watcher) is specified, only the journaled changes are checked
+    in, added and deleted. See journal.checkin.
+
     Return the standard output.
     """
 
     vss = VSS(repository_path, ss_path)
 
+    if journal is not None:
+        return journal_module.checkin(vss, vss_project_path, journal)
+
     return vss.checkin(vss_project_path, recursive=True, get_folder=local_path, output='error', comment_no_text=True)
 
-def get(repository_path, vss_project_path, local_path, ss_path=None):
+def get(repository_path, vss_project_path, local_path, ss_path=None, workers=None, unit_size=parallel.DEFAULT_UNIT_SIZE, processes=False):
     """
     Get a read-only copy of a VSS project into the specified local directory.
 
+    If workers is specified, the project tree is split into work units of about unit_size files that are run in parallel
+    by that many threads (or processes, if processes is True). See parallel.run.
+
     Return the standard output.
     """
 
+    if workers:
+        return parallel.run(repository_path, vss_project_path, local_path, 'get', {'output': 'error', 'ignore': 'all'}, ss_path, workers, unit_size, processes)
+
     vss = VSS(repository_path, ss_path)
 
     return vss.get(vss_project_path, recursive=True, get_folder=local_path, output='error', ignore='all')
+
+def sync(repository_path, vss_project_path, local_path, ss_path=None):
+    """
+    Get a read-only copy of a VSS project into the specified local directory, fetching only what changed since the last
+    call.
+
+    The state of the local copy is kept in a manifest file in the local directory. See incremental.sync.
+
+    Return the standard output.
+    """
+
+    vss = VSS(repository_path, ss_path)
+
+    return incremental.sync(vss, vss_project_path, local_path)
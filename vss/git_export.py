@@ -0,0 +1,405 @@
+"""
+Export the history of a VSS project as a git fast-import stream.
+
+Run with: python -m vss.git_export [options] $/Project | git fast-import
+"""
+
+from vss import VSS
+
+import parsers
+import persistence
+
+import argparse
+import calendar
+import json
+import multiprocessing.pool
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+DEFAULT_WORKERS = 4
+
+# Consecutive checkins of a user with the same comment within that many seconds make a single commit.
+DEFAULT_WINDOW = 300
+
+# The number of commits emitted between checkpoints.
+DEFAULT_CHUNK_SIZE = 100
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+CONTENT_KINDS = ('checked_in', 'created', 'rolled_back')
+
+INVALID_REF_CHARACTERS = re.compile(r'[^A-Za-z0-9._/-]+')
+
+def get_relative_path(path, project):
+    """
+    Get the git path of a VSS item under project, or None if it is not under project.
+    """
+
+    root = project.rstrip('/')
+
+    if not path.lower().startswith(root.lower() + '/'):
+        return None
+
+    return path[len(root) + 1:]
+
+def build_timeline(vss, project, window=DEFAULT_WINDOW):
+    """
+    Build the timeline of the changes of the files under project from its history.
+
+    Returns a list of commits and labels, oldest first. Commits are dicts with the user, comment, date and changes of
+    the commit: ('modify', path, version), ('delete', path) or ('rename', old path, new path) tuples, where path is the
+    VSS path. Labels are dicts with the label and date.
+
+    The history is read as it is output, and only the changes it records are kept. Actions on the projects themselves
+    (their creation, or checkins and rollbacks reported on a project) change no file and are left out.
+    """
+
+    records = []
+    projects = set([project.rstrip('/').lower() or '$'])
+
+    for entry in vss.iter_history(project, recursive=True):
+        kind, name, argument = parsers.parse_action(entry.action)
+        date = entry.date and calendar.timegm(entry.date.timetuple()) or 0
+
+        if name and name.startswith('$'):
+            projects.add(parsers.join(entry.path, name[1:]).lower())
+
+        if kind == 'labeled' or entry.label:
+            change = ('label', entry.label)
+        elif kind in CONTENT_KINDS or (kind == 'branched' and not name):
+            change = ('modify', entry.path, entry.version)
+        elif kind in ('deleted', 'destroyed', 'purged'):
+            change = ('delete', parsers.join(entry.path, name.lstrip('$')))
+        elif kind == 'renamed':
+            change = ('rename', parsers.join(entry.path, name.lstrip('$')), parsers.join(entry.path, argument.lstrip('$')))
+        elif kind == 'moved_to':
+            change = ('rename', parsers.join(entry.path, name.lstrip('$')), parsers.join(argument, name.lstrip('$')))
+        elif kind == 'recovered' and not name.startswith('$'):
+            change = ('recover', parsers.join(entry.path, name))
+        else:
+            continue
+
+        records.append((date, entry.user, entry.comment, change))
+
+    # The history is output newest first: the records are put back in order, keeping the order of those of a same date.
+    records.reverse()
+    records.sort(key=lambda record: record[0])
+    timeline = []
+    versions = {}
+    commit = None
+
+    for date, user, comment, change in records:
+        if change[0] == 'label':
+            timeline.append({'label': change[1], 'date': date})
+            commit = None
+            continue
+
+        if change[0] == 'modify':
+            if change[1].lower() in projects:
+                continue
+
+            versions[change[1].lower()] = change[2]
+        elif change[0] == 'recover':
+            if not change[1].lower() in versions:
+                continue
+
+            change = ('modify', change[1], versions[change[1].lower()])
+
+        paths = set(change[1].lower() for change in commit and commit['changes'] or [])
+
+        if commit is None or commit['user'] != user or commit['comment'] != comment or date - commit['started_at'] > window or change[1].lower() in paths:
+            commit = {'user': user, 'comment': comment, 'date': date, 'started_at': date, 'changes': []}
+            timeline.append(commit)
+
+        commit['date'] = date
+        commit['changes'].append(change)
+
+    return timeline
+
+def fetch_version(args):
+    """
+    Get a version of a file into a temporary file.
+
+    Returns the path of the temporary file, or None if the version could not be fetched.
+    """
+
+    vss, path, version = args
+    folder = tempfile.mkdtemp(prefix='vss-export-')
+
+    try:
+        vss.get(path, version_number=str(version), get_folder=folder, output='error', ignore='all')
+        fnames = os.listdir(folder)
+
+        if not fnames:
+            return None
+
+        fd, result = tempfile.mkstemp(prefix='vss-blob-')
+        os.close(fd)
+        shutil.move(os.path.join(folder, fnames[0]), result)
+
+        return result
+    except Exception, ex:
+        sys.stderr.write('Could not get version %s of %s: %s\n' % (version, path, ex))
+        return None
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+class Exporter(object):
+    """
+    Writes the history of a VSS project as a git fast-import stream.
+
+    File versions are fetched in parallel by a pool of workers threads into temporary files, and copied from there to
+    the stream: contents are never held in memory.
+
+    If checkpoint_path is specified, the timeline and the progress of the export are saved to that file after each
+    chunk of commits, along with a checkpoint command in the stream: an interrupted export resumes from there, on top of
+    the branch imported so far.
+    """
+
+    def __init__(self, vss, project, output=sys.stdout, branch='master', checkpoint_path=None, workers=DEFAULT_WORKERS, window=DEFAULT_WINDOW, chunk_size=DEFAULT_CHUNK_SIZE, authors=None, email_domain='vss'):
+        """
+        Create an exporter of project.
+
+        authors maps VSS user names to git identities ('Name <email>'). Other users are given user@email_domain
+        addresses.
+        """
+
+        self.vss = vss
+        self.project = project
+        self.output = output
+        self.branch = branch
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        self.window = window
+        self.chunk_size = chunk_size
+        self.authors = authors or {}
+        self.email_domain = email_domain
+        self.__mark = 0
+
+    def get_identity(self, user):
+        """
+        Get the git identity of a VSS user.
+        """
+
+        user = user or 'unknown'
+
+        return self.authors.get(user) or '%s <%s@%s>' % (user, user.lower().replace(' ', '.'), self.email_domain)
+
+    def run(self):
+        """
+        Export the project, or resume the export.
+
+        Returns the number of commits written.
+        """
+
+        state = self.__load_checkpoint()
+
+        if state is None:
+            state = {'project': self.project, 'timeline': build_timeline(self.vss, self.project, self.window), 'done': 0}
+
+        # Checkpoints saved before the branch and the pending labels were recorded assume the branch exists once a
+        # chunk is done.
+        state.setdefault('branch_exists', state['done'] > 0)
+        state.setdefault('pending_labels', [])
+        timeline = state['timeline']
+        resumed = state['branch_exists']
+        count = 0
+
+        while state['done'] < len(timeline):
+            chunk = timeline[state['done']:state['done'] + self.chunk_size]
+            count += self.__write_chunk(chunk, state, resumed and not count)
+            state['done'] += len(chunk)
+
+            self.output.write('checkpoint\n\n')
+            self.output.flush()
+            self.__save_checkpoint(state)
+
+        for label in state['pending_labels']:
+            sys.stderr.write('No commit to tag with label %s\n' % label)
+
+        return count
+
+    def __write_chunk(self, chunk, state, resumed):
+        """
+        Write the blobs and commits of a chunk of the timeline.
+
+        A tag can only be created from the branch once the branch has a commit: the labels met before that are kept in
+        the pending labels of state, and tag the first commit.
+
+        Returns the number of commits written.
+        """
+
+        marks = {}
+        fetches = []
+
+        for item in chunk:
+            for change in item.get('changes', []):
+                if change[0] == 'modify' and not (change[1].lower(), change[2]) in marks:
+                    marks[(change[1].lower(), change[2])] = None
+                    fetches.append((self.vss, change[1], change[2]))
+
+        pool = multiprocessing.pool.ThreadPool(self.workers)
+
+        try:
+            for (_, path, version), blob_path in zip(fetches, pool.imap(fetch_version, fetches)):
+                if blob_path is not None:
+                    marks[(path.lower(), version)] = self.__write_blob(blob_path)
+        finally:
+            pool.close()
+            pool.join()
+
+        count = 0
+
+        for item in chunk:
+            if 'label' in item:
+                if state['branch_exists']:
+                    self.__write_tag(item['label'])
+                else:
+                    state['pending_labels'].append(item['label'])
+
+                continue
+
+            lines = []
+
+            for change in item['changes']:
+                paths = [get_relative_path(path, self.project) for path in change[1:2] + change[2:3 * (change[0] == 'rename')]]
+
+                if change[0] == 'modify' and paths[0] and marks.get((change[1].lower(), change[2])):
+                    lines.append('M 100644 :%d %s\n' % (marks[(change[1].lower(), change[2])], quote(paths[0])))
+                elif change[0] == 'delete' and paths[0]:
+                    lines.append('D %s\n' % quote(paths[0]))
+                elif change[0] == 'rename' and paths[0] and paths[1]:
+                    lines.append('R %s %s\n' % (quote(paths[0]), quote(paths[1])))
+                elif change[0] == 'rename' and paths[0]:
+                    lines.append('D %s\n' % quote(paths[0]))
+
+            if not lines:
+                continue
+
+            message = (item['comment'] or '') + '\n'
+            identity = self.get_identity(item['user'])
+            self.output.write('commit refs/heads/%s\ncommitter %s %d +0000\ndata %d\n%s' % (self.branch, identity, item['date'], len(message), message))
+
+            if resumed and not count:
+                self.output.write('from refs/heads/%s^0\n' % self.branch)
+
+            self.output.write(''.join(lines) + '\n')
+            count += 1
+            state['branch_exists'] = True
+
+            for label in state['pending_labels']:
+                self.__write_tag(label)
+
+            del state['pending_labels'][:]
+
+        return count
+
+    def __write_tag(self, label):
+        """
+        Write a tag of the head of the branch.
+        """
+
+        self.output.write('reset refs/tags/%s\nfrom refs/heads/%s\n\n' % (INVALID_REF_CHARACTERS.sub('_', label).strip('/.') or 'label', self.branch))
+
+    def __write_blob(self, blob_path):
+        """
+        Write a blob from a temporary file, and remove the file.
+
+        Returns the mark of the blob.
+        """
+
+        self.__mark += 1
+
+        try:
+            self.output.write('blob\nmark :%d\ndata %d\n' % (self.__mark, os.path.getsize(blob_path)))
+
+            with open(blob_path, 'rb') as f:
+                shutil.copyfileobj(f, self.output, COPY_BUFFER_SIZE)
+
+            self.output.write('\n')
+        finally:
+            os.remove(blob_path)
+
+        return self.__mark
+
+    def __load_checkpoint(self):
+        """
+        Load the saved state of the export, or None.
+        """
+
+        if not self.checkpoint_path or not os.path.isfile(self.checkpoint_path):
+            return None
+
+        with open(self.checkpoint_path, 'rb') as f:
+            state = json.load(f)
+
+        if state['project'].lower() != self.project.lower():
+            raise ValueError('The checkpoint is for another project (%s)' % repr(state['project']))
+
+        # The strings of the timeline are the bytes output by ss.exe: they are saved as latin-1 to be restored as is.
+        for item in state['timeline']:
+            for key in ('user', 'comment', 'label'):
+                if isinstance(item.get(key), unicode):
+                    item[key] = item[key].encode('latin-1')
+
+            if 'changes' in item:
+                item['changes'] = [tuple(isinstance(value, unicode) and value.encode('latin-1') or value for value in change) for change in item['changes']]
+
+        state['pending_labels'] = [isinstance(label, unicode) and label.encode('latin-1') or label for label in state.get('pending_labels', [])]
+
+        return state
+
+    def __save_checkpoint(self, state):
+        """
+        Save the state of the export.
+        """
+
+        if not self.checkpoint_path:
+            return
+
+        persistence.write_file(self.checkpoint_path, json.dumps(state, encoding='latin-1'))
+
+def quote(path):
+    """
+    Quote a path for a fast-import file command, if needed.
+    """
+
+    if path.startswith('"') or '\n' in path or ' ' in path:
+        return '"%s"' % path.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return path
+
+def main():
+    """
+    Export a project to the standard output.
+    """
+
+    parser = argparse.ArgumentParser(description='Export the history of a VSS project as a git fast-import stream.')
+    parser.add_argument('project', help='the VSS project to export')
+    parser.add_argument('--repository', default=None, help='the VSS repository (SSDIR)')
+    parser.add_argument('--ss-path', default=None, help='the path of ss.exe')
+    parser.add_argument('--branch', default='master', help='the git branch to import into')
+    parser.add_argument('--checkpoint', default=None, help='a file to save the progress to, to resume interrupted exports')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='the number of parallel Get commands')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help='the time window of a commit, in seconds')
+    parser.add_argument('--authors', default=None, help='a JSON file mapping VSS users to git identities')
+    args = parser.parse_args()
+
+    authors = None
+
+    if args.authors:
+        with open(args.authors, 'rb') as f:
+            authors = json.load(f)
+
+    if sys.platform == 'win32':
+        import msvcrt
+        msvcrt.setmode(sys.stdout.fileno(), os.O_BINARY)
+
+    exporter = Exporter(VSS(args.repository, args.ss_path), args.project, sys.stdout, args.branch, args.checkpoint, args.workers, args.window, authors=authors)
+    exporter.run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+"""
+Store the history of VSS projects in a SQLite database, to query it without calling the History command again.
+"""
+
+import incremental
+import parsers
+
+import datetime
+import sqlite3
+import threading
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+DEFAULT_BATCH_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    project_key TEXT NOT NULL,
+    path TEXT,
+    path_key TEXT,
+    version INTEGER,
+    user TEXT,
+    date TEXT,
+    action TEXT,
+    kind TEXT,
+    name TEXT,
+    argument TEXT,
+    comment TEXT,
+    label TEXT,
+    entry_key TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS entries_path ON entries (path_key, date);
+CREATE INDEX IF NOT EXISTS entries_user ON entries (user, date);
+CREATE INDEX IF NOT EXISTS entries_date ON entries (date);
+CREATE INDEX IF NOT EXISTS entries_label ON entries (label);
+CREATE TABLE IF NOT EXISTS projects (
+    project_key TEXT PRIMARY KEY,
+    project TEXT NOT NULL,
+    last_date TEXT,
+    ingested_at TEXT
+);
+"""
+
+COLUMNS = ('version', 'user', 'date', 'action', 'path', 'comment', 'label')
+
+def get_key(path):
+    """
+    Get the key of a VSS path: VSS paths are case insensitive.
+    """
+
+    return path and (path.rstrip('/').lower() or '$')
+
+def format_date(date):
+    """
+    Convert a datetime to its stored form, which sorts like the dates.
+    """
+
+    return date and date.strftime(DATE_FORMAT)
+
+def parse_date(date):
+    """
+    Convert a stored date back to a datetime.
+    """
+
+    return date and datetime.datetime.strptime(date, DATE_FORMAT)
+
+def add_path_condition(conditions, parameters, path, recursive):
+    """
+    Add the SQL condition selecting the entries of path (and of the items under it, if recursive is True).
+    """
+
+    key = get_key(path)
+
+    if not recursive:
+        conditions.append('path_key = ?')
+        parameters.append(key)
+    elif key != '$':
+        # A range rather than LIKE, so that the path index is used: '0' follows '/'.
+        conditions.append('(path_key = ? OR (path_key >= ? AND path_key < ?))')
+        parameters.extend([key, key + '/', key + '0'])
+
+class HistoryStore(object):
+    """
+    A SQLite database of history entries, indexed by path, user, date and label.
+
+    Projects are ingested with ingest: the first time, their whole history is read; next times, only the entries newer
+    than the last ingested one (minus incremental.SAFETY_MARGIN, as VSS dates have a one minute resolution).
+    """
+
+    def __init__(self, path):
+        """
+        Create or open the store in the specified SQLite database file (':memory:' for a store in memory).
+        """
+
+        self.path = path
+        self.__lock = threading.RLock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+
+        # The strings of the entries are the bytes output by ss.exe: they are stored and returned as is.
+        self.__connection.text_factory = str
+        self.__connection.executescript(SCHEMA)
+
+    def close(self):
+        """
+        Close the database.
+        """
+
+        with self.__lock:
+            self.__connection.close()
+
+    def ingest(self, vss, project, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Ingest the history of project (recursively) from the specified VSS instance, resuming after the last ingested
+        entry.
+
+        Returns the number of new entries.
+        """
+
+        project_key = get_key(project)
+
+        with self.__lock:
+            row = self.__connection.execute('SELECT last_date FROM projects WHERE project_key = ?', (project_key,)).fetchone()
+
+        last_date = row and parse_date(row[0])
+        until_date = last_date and last_date - incremental.SAFETY_MARGIN
+        newest = last_date
+        count = 0
+        rows = []
+
+        for entry in vss.iter_history(project, recursive=True, until_date=until_date):
+            if entry.date is not None and (newest is None or entry.date > newest):
+                newest = entry.date
+
+            rows.append(self.__get_row(project_key, project, entry))
+
+            if len(rows) >= batch_size:
+                count += self.__insert(rows)
+                rows = []
+
+        count += self.__insert(rows)
+
+        with self.__lock:
+            with self.__connection:
+                self.__connection.execute(
+                    'INSERT OR REPLACE INTO projects (project_key, project, last_date, ingested_at) VALUES (?, ?, ?, ?)',
+                    (project_key, project, format_date(newest), format_date(datetime.datetime.now())),
+                )
+
+        return count
+
+    def projects(self):
+        """
+        Get the ingested projects, as (project, last entry date, ingestion date) tuples.
+        """
+
+        with self.__lock:
+            rows = self.__connection.execute('SELECT project, last_date, ingested_at FROM projects ORDER BY project_key').fetchall()
+
+        return [(project, parse_date(last_date), parse_date(ingested_at)) for project, last_date, ingested_at in rows]
+
+    def query(self, path=None, recursive=True, user=None, since=None, until=None, label=None, kinds=None, limit=None):
+        """
+        Get the stored history entries matching all the specified criteria, newest first.
+
+        path restricts the entries to an item (and the items under it, if recursive is True). since and until are
+        datetimes bounding the dates (inclusively). kinds is a list of action kinds, as returned by parsers.parse_action.
+
+        Returns a list of parsers.HistoryEntry instances.
+        """
+
+        conditions = []
+        parameters = []
+
+        if path is not None:
+            add_path_condition(conditions, parameters, path, recursive)
+
+        if user is not None:
+            conditions.append('user = ?')
+            parameters.append(user)
+
+        if since is not None:
+            conditions.append('date >= ?')
+            parameters.append(format_date(since))
+
+        if until is not None:
+            conditions.append('date <= ?')
+            parameters.append(format_date(until))
+
+        if label is not None:
+            conditions.append('label = ?')
+            parameters.append(label)
+
+        if kinds is not None:
+            conditions.append('kind IN (%s)' % ', '.join('?' * len(kinds)))
+            parameters.extend(kinds)
+
+        sql = 'SELECT %s FROM entries' % ', '.join(COLUMNS)
+
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+
+        sql += ' ORDER BY date DESC, id'
+
+        if limit is not None:
+            sql += ' LIMIT %d' % limit
+
+        with self.__lock:
+            rows = self.__connection.execute(sql, parameters).fetchall()
+
+        return [parsers.HistoryEntry(version, user, parse_date(date), action, path, comment, label) for version, user, date, action, path, comment, label in rows]
+
+    def get_label_date(self, path, label):
+        """
+        Get the date of the specified label, applied to path or to an item under it, or None.
+        """
+
+        entries = self.query(path, label=label, limit=1)
+
+        return entries and entries[0].date or None
+
+    def changes_between_labels(self, path, from_label, to_label):
+        """
+        Get the entries (labels excluded) of the items under path dated between the two specified labels, newest first.
+
+        Raises a ValueError if a label is not found.
+        """
+
+        dates = []
+
+        for label in (from_label, to_label):
+            date = self.get_label_date(path, label)
+
+            if date is None:
+                raise ValueError('Unknown label (%s)' % repr(label))
+
+            dates.append(date)
+
+        return [entry for entry in self.query(path, since=min(dates), until=max(dates)) if entry.label is None and parsers.parse_action(entry.action)[0] != 'labeled']
+
+    def count_by_user(self, path=None, since=None, until=None):
+        """
+        Count the entries of each user, under path and between since and until if specified.
+
+        Returns a list of (user, count) tuples, biggest counts first.
+        """
+
+        conditions = []
+        parameters = []
+
+        if path is not None:
+            add_path_condition(conditions, parameters, path, True)
+
+        if since is not None:
+            conditions.append('date >= ?')
+            parameters.append(format_date(since))
+
+        if until is not None:
+            conditions.append('date <= ?')
+            parameters.append(format_date(until))
+
+        sql = 'SELECT user, COUNT(*) FROM entries'
+
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+
+        sql += ' GROUP BY user ORDER BY COUNT(*) DESC, user'
+
+        with self.__lock:
+            return [tuple(row) for row in self.__connection.execute(sql, parameters).fetchall()]
+
+    def __get_row(self, project_key, project, entry):
+        """
+        Get the database row of a history entry.
+        """
+
+        kind, name, argument = parsers.parse_action(entry.action)
+        path = entry.path or project
+
+        # Identifies the entry when overlapping ingestions list it again.
+        entry_key = '|'.join(str(value) for value in (get_key(path), entry.version, entry.date, entry.action, entry.label))
+
+        return (project_key, path, get_key(path), entry.version, entry.user, format_date(entry.date), entry.action, kind, name, argument, entry.comment, entry.label, entry_key)
+
+    def __insert(self, rows):
+        """
+        Insert rows in a single transaction, skipping the ones already stored.
+
+        Returns the number of inserted rows.
+        """
+
+        if not rows:
+            return 0
+
+        with self.__lock:
+            before = self.__connection.total_changes
+
+            with self.__connection:
+                self.__connection.executemany(
+                    'INSERT OR IGNORE INTO entries (project_key, path, path_key, version, user, date, action, kind, name, argument, comment, label, entry_key) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    rows,
+                )
+
+            return self.__connection.total_changes - before
@@ -0,0 +1,263 @@
+"""
+Keep a local copy of a VSS project up to date by fetching only what changed.
+"""
+
+import parsers
+import parallel
+import persistence
+
+import datetime
+import json
+import os
+import shutil
+import stat
+
+MANIFEST_NAME = '.vsspython-manifest.json'
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# VSS dates have a one minute resolution and the clocks of the clients that wrote them may drift.
+SAFETY_MARGIN = datetime.timedelta(minutes=5)
+
+# The synchronization date of a project without any history.
+EPOCH = datetime.datetime(1970, 1, 1)
+
+GET_OPTIONS = {
+    'output': 'error',
+    'ignore': 'all',
+}
+
+def load_manifest(path):
+    """
+    Load the manifest at the specified path.
+
+    Returns None if there is no manifest.
+    """
+
+    if not os.path.isfile(path):
+        return None
+
+    with open(path, 'rb') as f:
+        manifest = json.load(f)
+
+    manifest['synced_at'] = datetime.datetime.strptime(manifest['synced_at'], DATE_FORMAT)
+
+    return manifest
+
+def save_manifest(path, manifest):
+    """
+    Save a manifest at the specified path.
+    """
+
+    data = dict(manifest)
+    data['synced_at'] = manifest['synced_at'].strftime(DATE_FORMAT)
+
+    persistence.write_file(path, json.dumps(data, indent=1, sort_keys=True))
+
+def get_relative_path(path, root_project):
+    """
+    Get the path of a VSS item relative to root_project, or None if the item is not under root_project.
+    """
+
+    root = root_project.rstrip('/')
+
+    if path.lower() == root.lower():
+        return ''
+
+    if not path.lower().startswith(root.lower() + '/'):
+        return None
+
+    return path[len(root) + 1:]
+
+def get_changes(vss, vss_project_path, since, files=()):
+    """
+    Get the changes made to the tree under vss_project_path since the specified date, from its history.
+
+    Returns a list of (change, path, is_project, entry) tuples, newest first, where change is either 'get' (an item to
+    fetch, recursively for projects) or 'delete' (an item to remove).
+
+    Actions that cannot be interpreted cause the item they were listed under to be fetched again: recursively, unless
+    it is one of files (the lowercase paths of the known files, relative to vss_project_path).
+    """
+
+    changes = []
+
+    for entry in vss.iter_history(vss_project_path, recursive=True, until_date=since - SAFETY_MARGIN):
+        kind, name, argument = parsers.parse_action(entry.action)
+        is_project = bool(name) and name.startswith('$')
+        item = name and parsers.join(entry.path, name.lstrip('$'))
+
+        if kind == 'labeled':
+            continue
+        elif kind in ('checked_in', 'rolled_back', 'created') or (kind == 'branched' and not name):
+            changes.append(('get', entry.path, False, entry))
+        elif kind in ('added', 'recovered', 'shared', 'branched'):
+            changes.append(('get', item, is_project, entry))
+        elif kind in ('deleted', 'destroyed', 'purged'):
+            changes.append(('delete', item, is_project, entry))
+        elif kind == 'renamed':
+            changes.append(('delete', item, is_project, entry))
+            changes.append(('get', parsers.join(entry.path, argument.lstrip('$')), is_project, entry))
+        elif kind == 'moved_from':
+            # Moved into the project: the project under the tree is fetched, its former place is not part of it.
+            changes.append(('get', item, True, entry))
+        elif kind == 'moved_to':
+            # Moved out of the project: its new place is listed as moved_from in the history of its new parent.
+            changes.append(('delete', item, True, entry))
+        else:
+            relative_path = get_relative_path(entry.path, vss_project_path)
+            changes.append(('get', entry.path, relative_path is None or not relative_path.lower() in files, entry))
+
+    return [change for change in changes if get_relative_path(change[1], vss_project_path) is not None]
+
+def get_versions(vss, vss_project_path, files):
+    """
+    Get the latest version of files (lowercase paths relative to vss_project_path) from a single recursive History of
+    vss_project_path. The history is read until all the files are found.
+
+    Returns a (versions, newest_date) tuple: versions maps the files found to their manifest record, and newest_date is
+    the date of the newest entry of the history, or None.
+    """
+
+    versions = {}
+    newest_date = None
+    remaining = set(files)
+
+    if not remaining:
+        return versions, newest_date
+
+    for entry in vss.iter_history(vss_project_path, recursive=True):
+        if entry.date is not None and (newest_date is None or entry.date > newest_date):
+            newest_date = entry.date
+
+        relative_path = entry.path and get_relative_path(entry.path, vss_project_path)
+
+        if relative_path is not None and entry.version is not None and relative_path.lower() in remaining:
+            remaining.discard(relative_path.lower())
+            versions[relative_path.lower()] = {'version': entry.version, 'date': entry.date and entry.date.strftime(DATE_FORMAT)}
+
+            if not remaining:
+                break
+
+    return versions, newest_date
+
+def list_files(vss, vss_project_path):
+    """
+    List the files under vss_project_path with a recursive Dir command.
+
+    Returns their lowercase paths relative to vss_project_path.
+    """
+
+    files = []
+
+    for project, _, names in parsers.parse_dir(vss.dir(vss_project_path, recursive=True)):
+        files.extend(get_relative_path(parsers.join(project, name), vss_project_path).lower() for name in names)
+
+    return files
+
+def remove(path):
+    """
+    Remove a local file or folder, even if it is read-only.
+    """
+
+    def make_writable(function, path, _):
+        os.chmod(path, stat.S_IWRITE)
+        function(path)
+
+    if os.path.isdir(path):
+        shutil.rmtree(path, onerror=make_writable)
+    elif os.path.exists(path):
+        os.chmod(path, stat.S_IWRITE)
+        os.remove(path)
+
+def sync(vss, vss_project_path, local_path, manifest_name=MANIFEST_NAME):
+    """
+    Bring the local copy of a VSS project in local_path up to date.
+
+    The first time, the whole project is fetched. Next times, the files changed since the last synchronization (as told
+    by the manifest saved in local_path) are looked up in the history of the project and only those are fetched or
+    removed. The manifest records the version and the date of each synchronized file, and the date of the newest
+    history entry seen: dates are compared with the ones of the VSS server, never with the local clock.
+
+    Returns the standard output of the Get commands.
+    """
+
+    manifest_path = os.path.join(local_path, manifest_name)
+    manifest = load_manifest(manifest_path)
+    output = []
+
+    if manifest is None or manifest['project'].lower() != vss_project_path.lower():
+        # The history is read before the files are fetched: a change made in between is fetched again next time.
+        files = list_files(vss, vss_project_path)
+        versions, newest_date = get_versions(vss, vss_project_path, files)
+        output.append(vss.get(vss_project_path, recursive=True, get_folder=local_path, **GET_OPTIONS))
+        manifest = {'project': vss_project_path, 'files': {}, 'synced_at': newest_date or EPOCH}
+
+        for fname in files:
+            manifest['files'][fname] = versions.get(fname, {'version': None, 'date': None})
+    else:
+        seen = set()
+        seen_projects = set()
+        deleted = []
+        fetched_files = {}
+        fetched_projects = []
+        changes = get_changes(vss, vss_project_path, manifest['synced_at'], manifest['files'])
+
+        for change, path, is_project, entry in changes:
+            relative_path = get_relative_path(path, vss_project_path)
+
+            if entry.date is not None and entry.date > manifest['synced_at']:
+                manifest['synced_at'] = entry.date
+
+            # The history is listed newest first: only the last change of each item matters, and the changes to the items
+            # of a project that was removed or fetched whole since are moot.
+            if relative_path.lower() in seen or [project for project in seen_projects if relative_path.lower().startswith(project + '/')]:
+                continue
+
+            seen.add(relative_path.lower())
+
+            if is_project:
+                seen_projects.add(relative_path.lower())
+
+            local_item_path = parallel.get_local_folder(path, vss_project_path, local_path)
+
+            if change == 'delete':
+                deleted.append(local_item_path)
+
+                for key in manifest['files'].keys():
+                    if key == relative_path.lower() or (is_project and key.startswith(relative_path.lower() + '/')):
+                        del manifest['files'][key]
+            elif is_project:
+                fetched_projects.append((relative_path, path, local_item_path))
+            else:
+                # The version of the entries of a project (like 'a.txt added') is the one of the project.
+                version = path == entry.path and entry.version or None
+
+                # The entries within the safety margin of the last synchronization may have been fetched already.
+                if version is None or manifest['files'].get(relative_path.lower(), {}).get('version') != version:
+                    fetched_files.setdefault(os.path.dirname(local_item_path), []).append(path)
+                    manifest['files'][relative_path.lower()] = {'version': version, 'date': entry.date and entry.date.strftime(DATE_FORMAT)}
+
+        for local_item_path in deleted:
+            remove(local_item_path)
+
+        for folder, files in sorted(fetched_files.items()):
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+
+            output.append(vss.get(files, get_folder=folder, **GET_OPTIONS))
+
+        for relative_path, project, folder in fetched_projects:
+            files = list_files(vss, project)
+            versions, _ = get_versions(vss, project, files)
+            output.append(vss.get(project, recursive=True, get_folder=folder, **GET_OPTIONS))
+
+            for fname in files:
+                manifest['files'][relative_path and relative_path.lower() + '/' + fname or fname] = versions.get(fname, {'version': None, 'date': None})
+
+    if not os.path.isdir(local_path):
+        os.makedirs(local_path)
+
+    save_manifest(manifest_path, manifest)
+
+    return ''.join(output)
@@ -0,0 +1,230 @@
+"""
+Instrumentation of the ss.exe invocations.
+
+Every VSS instance has a list of hooks: callables that get an Invocation once each ss.exe invocation completes.
+"""
+
+import timeouts
+
+import bisect
+import json
+import os
+import threading
+import time
+
+# The upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30, 60, 300)
+
+DEFAULT_EXPORT_INTERVAL = 60
+
+class Invocation(object):
+    """
+    The measures of a single ss.exe invocation.
+
+    Times are in seconds: spawn_latency is the time it took to start the process and wall_time the time between the
+    start and the end of the invocation. returncode is None if the process could not be started.
+
+    timeout and cancellation (a timeouts.CancellationToken) limit how long the invocation may run.
+    """
+
+    __slots__ = ('command', 'argv', 'argv_size', 'environment', 'timeout', 'cancellation', 'started_at', 'spawn_latency', 'wall_time', 'returncode', 'stdout_bytes', 'stderr_bytes', 'error')
+
+    def __init__(self, argv, environment=None, timeout=None, cancellation=None):
+        """
+        Create the invocation of the specified command line (ss.exe path included).
+        """
+
+        self.command = len(argv) > 1 and argv[1] or None
+        self.argv = argv
+        self.argv_size = sum(len(arg) + 1 for arg in argv)
+        self.environment = environment
+        self.timeout = timeout
+        self.cancellation = cancellation
+        self.started_at = time.time()
+        self.spawn_latency = None
+        self.wall_time = None
+        self.returncode = None
+        self.stdout_bytes = 0
+        self.stderr_bytes = 0
+        self.error = None
+
+    @property
+    def succeeded(self):
+        """
+        Check whether the invocation succeeded.
+        """
+
+        return self.returncode == 0 and self.error is None
+
+    @property
+    def cancelled(self):
+        """
+        Check whether the invocation was cancelled: through its cancellation token, or because the caller stopped
+        reading its output.
+        """
+
+        return isinstance(self.error, timeouts.Cancelled)
+
+    def finish(self, returncode, stdout_bytes=0, stderr_bytes=0):
+        """
+        Record the end of the invocation.
+        """
+
+        self.wall_time = time.time() - self.started_at
+        self.returncode = returncode
+        self.stdout_bytes = stdout_bytes
+        self.stderr_bytes = stderr_bytes
+
+def trace(invocation):
+    """
+    Print the command line (and the environment, if VSS_PYTHON_TRACE is 'all') of an invocation when the
+    VSS_PYTHON_TRACE environment variable is set.
+
+    VSS calls it before starting ss.exe, so that the command line is printed before anything ss.exe prints.
+    """
+
+    mode = os.environ.get('VSS_PYTHON_TRACE', None)
+
+    if not mode:
+        return
+
+    if mode == 'all' and invocation.environment is not None:
+        print 'Environment:'
+
+        for key, value in invocation.environment.items():
+            print '%s: %s' % (key, value)
+
+    print ' '.join(invocation.argv)
+
+class Statistics(object):
+    """
+    A hook that aggregates counters and latency histograms per command.
+    """
+
+    def __init__(self):
+        """
+        Create empty statistics.
+        """
+
+        self.__lock = threading.Lock()
+        self.__commands = {}
+
+    def __call__(self, invocation):
+        """
+        Account for the specified invocation.
+        """
+
+        with self.__lock:
+            stats = self.__commands.get(invocation.command)
+
+            if stats is None:
+                stats = self.__commands[invocation.command] = {
+                    'count': 0,
+                    'errors': 0,
+                    'cancelled': 0,
+                    'wall_time': 0.0,
+                    'spawn_latency': 0.0,
+                    'max_wall_time': 0.0,
+                    'argv_bytes': 0,
+                    'stdout_bytes': 0,
+                    'stderr_bytes': 0,
+                    'histogram': [0] * (len(LATENCY_BUCKETS) + 1),
+                }
+
+            wall_time = invocation.wall_time or 0.0
+
+            stats['count'] += 1
+            stats['errors'] += not invocation.succeeded and not invocation.cancelled and 1 or 0
+            stats['cancelled'] += invocation.cancelled and 1 or 0
+            stats['wall_time'] += wall_time
+            stats['spawn_latency'] += invocation.spawn_latency or 0.0
+            stats['max_wall_time'] = max(stats['max_wall_time'], wall_time)
+            stats['argv_bytes'] += invocation.argv_size
+            stats['stdout_bytes'] += invocation.stdout_bytes
+            stats['stderr_bytes'] += invocation.stderr_bytes
+            stats['histogram'][bisect.bisect_left(LATENCY_BUCKETS, wall_time)] += 1
+
+    def reset(self):
+        """
+        Reset the statistics.
+        """
+
+        with self.__lock:
+            self.__commands.clear()
+
+    def snapshot(self):
+        """
+        Get a copy of the current statistics.
+
+        Returns a dict that maps each command name to its counters. The histogram counts the invocations whose wall time
+        falls under each of the LATENCY_BUCKETS bounds, plus the ones above the last bound.
+        """
+
+        with self.__lock:
+            result = {}
+
+            for command, stats in self.__commands.items():
+                result[command] = dict(stats, histogram=list(stats['histogram']))
+
+            return result
+
+class SnapshotExporter(object):
+    """
+    Periodically appends snapshots of Statistics to a file, one JSON document per line.
+    """
+
+    def __init__(self, statistics, path, interval=DEFAULT_EXPORT_INTERVAL):
+        """
+        Create an exporter that writes a snapshot of statistics to path every interval seconds, once started.
+        """
+
+        self.statistics = statistics
+        self.path = path
+        self.interval = interval
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def export(self):
+        """
+        Append a snapshot now.
+        """
+
+        line = json.dumps({
+            'time': time.time(),
+            'buckets': LATENCY_BUCKETS,
+            'commands': self.statistics.snapshot(),
+        }, sort_keys=True)
+
+        with open(self.path, 'ab') as f:
+            f.write(line + '\n')
+
+    def start(self):
+        """
+        Start exporting snapshots in a background thread.
+        """
+
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.__run, name='VSSSnapshotExporter')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Stop exporting snapshots, after writing a last one.
+        """
+
+        self.__stopped.set()
+
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __run(self):
+        """
+        Export snapshots until stopped.
+        """
+
+        while not self.__stopped.wait(self.interval):
+            self.export()
+
+        self.export()
@@ -0,0 +1,518 @@
+"""
+A durable queue of VSS commands in a SQLite database, shared by workers on several hosts.
+
+Run a worker with: python -m vss.job_queue [options] database
+"""
+
+from vss import VSS
+
+import plan
+import scheduler
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+
+DEFAULT_LEASE = 60
+DEFAULT_POLL_INTERVAL = 0.5
+DEFAULT_MAX_ATTEMPTS = scheduler.DEFAULT_MAX_ATTEMPTS
+DEFAULT_REPOSITORY_LIMIT = 4
+
+# Seconds to wait for another host to release the database.
+BUSY_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    dedup_key TEXT NOT NULL,
+    repository_path TEXT,
+    ss_path TEXT,
+    command TEXT NOT NULL,
+    args TEXT NOT NULL,
+    options TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_token TEXT,
+    lease_expires REAL,
+    worker TEXT,
+    submitted_at REAL NOT NULL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (state, priority, id);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, state);
+CREATE INDEX IF NOT EXISTS jobs_repository ON jobs (repository_path, state);
+"""
+
+IN_FLIGHT_STATES = ('queued', 'running')
+
+class JobFailed(Exception):
+    """
+    Error raised when waiting for a job that failed with something else than an ss.exe error.
+    """
+
+    def __init__(self, job_id, message):
+        """
+        Create an error for the specified job.
+        """
+
+        Exception.__init__(self, 'Job %d failed: %s' % (job_id, message))
+
+        self.job_id = job_id
+
+def dump(value):
+    """
+    Convert a value to its stored form. Its strings are bytes (as given to and output by ss.exe): they are saved as
+    latin-1, to be restored as is by load.
+    """
+
+    return json.dumps(value, sort_keys=True, encoding='latin-1')
+
+def load(data):
+    """
+    Convert a stored value back (see dump).
+    """
+
+    return to_bytes(json.loads(data))
+
+def to_bytes(value):
+    """
+    Convert the strings of a value loaded from JSON back to the bytes they were saved from.
+    """
+
+    if isinstance(value, unicode):
+        return value.encode('latin-1')
+
+    if isinstance(value, dict):
+        return dict((to_bytes(key), to_bytes(item)) for key, item in value.items())
+
+    if isinstance(value, list):
+        return [to_bytes(item) for item in value]
+
+    return value
+
+def get_dedup_key(repository_path, ss_path, command, args, options):
+    """
+    Get the key identifying identical requests: the same command with the same arguments on the same repository.
+    """
+
+    data = dump([(repository_path or '').lower(), ss_path, command, args, options])
+
+    return hashlib.sha1(data).hexdigest()
+
+def get_error(job_id, error):
+    """
+    Rebuild the error a job failed with, from its stored form.
+    """
+
+    if error.get('returncode') is None:
+        return JobFailed(job_id, error.get('message'))
+
+    result = subprocess.CalledProcessError(error['returncode'], error['cmd'], error['output'])
+    result.stderr = error.get('stderr')
+
+    return result
+
+class JobQueue(object):
+    """
+    Jobs (VSS commands) submitted by clients and run by workers, stored in a SQLite database.
+
+    Submitting a request identical to one that is queued or running returns the existing job instead of a new one, so
+    that the same work is done once. Workers claim jobs with leases: a job whose worker stopped renewing its lease is
+    claimed again by another worker. At most repository_limit jobs run at once against a repository, over all the
+    workers.
+
+    The database may be shared by several processes. SQLite stands in for a shared store here: its locking is not
+    reliable on network shares.
+    """
+
+    def __init__(self, path, repository_limit=DEFAULT_REPOSITORY_LIMIT):
+        """
+        Create or open the queue in the specified SQLite database file.
+        """
+
+        self.path = path
+        self.repository_limit = repository_limit
+        self.__local = threading.local()
+
+        self.__get_connection().executescript(SCHEMA)
+
+    def submit(self, repository_path, command, args=(), options=None, ss_path=None, priority=scheduler.NORMAL_PRIORITY, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Queue the specified VSS command (the name of a VSS method that runs a single ss.exe command, like 'get': see
+        plan.COMMAND_METHODS) to be called with args and options on the repository_path repository.
+
+        Local paths in args and options are resolved on the host of the worker that runs the job.
+
+        Returns the id of the job: an existing one if an identical request is queued or running.
+        """
+
+        if not command in plan.COMMAND_METHODS:
+            raise ValueError('Invalid command (%s)' % repr(command))
+
+        args = list(args)
+        options = options or {}
+        dedup_key = get_dedup_key(repository_path, ss_path, command, args, options)
+        now = time.time()
+
+        with self.__transaction() as connection:
+            row = connection.execute(
+                'SELECT id FROM jobs WHERE dedup_key = ? AND state IN (?, ?) ORDER BY id LIMIT 1',
+                (dedup_key,) + IN_FLIGHT_STATES,
+            ).fetchone()
+
+            if row is not None:
+                connection.execute('UPDATE jobs SET priority = MIN(priority, ?) WHERE id = ?', (priority, row[0]))
+
+                return row[0]
+
+            return connection.execute(
+                'INSERT INTO jobs (dedup_key, repository_path, ss_path, command, args, options, priority, state, max_attempts, available_at, submitted_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (dedup_key, repository_path, ss_path, command, dump(args), dump(options), priority, 'queued', max_attempts, now, now),
+            ).lastrowid
+
+    def get(self, job_id):
+        """
+        Get the state of a job, as a dict, or None if there is no such job.
+        """
+
+        cursor = self.__get_connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        job = dict(zip([column[0] for column in cursor.description], row))
+
+        for name in ('args', 'options', 'error'):
+            job[name] = job[name] and load(job[name])
+
+        return job
+
+    def wait(self, job_id, timeout=None, poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        Wait for a job to complete.
+
+        Returns the standard output of its command, or raises the error it failed with. Raises a RuntimeError if the job
+        is still in flight after timeout seconds.
+        """
+
+        deadline = timeout is not None and time.time() + timeout
+
+        while True:
+            job = self.get(job_id)
+
+            if job is None:
+                raise ValueError('Unknown job (%s)' % repr(job_id))
+
+            if job['state'] == 'done':
+                return job['result']
+
+            if job['state'] == 'failed':
+                raise get_error(job_id, job['error'])
+
+            if deadline is not False and time.time() >= deadline:
+                raise RuntimeError('Job %d is still %s' % (job_id, job['state']))
+
+            time.sleep(poll_interval)
+
+    def claim(self, worker, lease=DEFAULT_LEASE):
+        """
+        Claim the next job to run for worker: the queued (or abandoned) job with the lowest priority value, among the
+        repositories under their limit.
+
+        Returns the job, as a dict with a lease_token to pass to renew and complete, or None if there is none.
+        """
+
+        now = time.time()
+        token = uuid.uuid4().hex
+
+        with self.__transaction() as connection:
+            self.__expire(connection, now)
+
+            row = connection.execute(
+                'SELECT id FROM jobs AS job WHERE state = ? AND available_at <= ? '
+                'AND (SELECT COUNT(*) FROM jobs WHERE repository_path IS job.repository_path AND state = ?) < ? '
+                'ORDER BY priority, id LIMIT 1',
+                ('queued', now, 'running', self.repository_limit),
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            connection.execute(
+                'UPDATE jobs SET state = ?, attempts = attempts + 1, lease_token = ?, lease_expires = ?, worker = ? WHERE id = ?',
+                ('running', token, now + lease, worker, row[0]),
+            )
+
+        return self.get(row[0])
+
+    def renew(self, job_id, lease_token, lease=DEFAULT_LEASE):
+        """
+        Extend the lease of a running job.
+
+        Returns False if the lease was lost: the job was given to another worker.
+        """
+
+        with self.__transaction() as connection:
+            return connection.execute(
+                'UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_token = ? AND state = ?',
+                (time.time() + lease, job_id, lease_token, 'running'),
+            ).rowcount == 1
+
+    def complete(self, job_id, lease_token, result=None, error=None, retry_delay=None):
+        """
+        Publish the result of a job (its standard output), or the error it failed with (a dict). If retry_delay is
+        specified, the job is queued again to run in that many seconds instead of failing.
+
+        Returns False if the lease was lost: the result is dropped.
+        """
+
+        now = time.time()
+
+        with self.__transaction() as connection:
+            if retry_delay is not None:
+                cursor = connection.execute(
+                    'UPDATE jobs SET state = ?, available_at = ?, lease_token = NULL, lease_expires = NULL, error = ? WHERE id = ? AND lease_token = ? AND state = ?',
+                    ('queued', now + retry_delay, dump(error), job_id, lease_token, 'running'),
+                )
+            else:
+                cursor = connection.execute(
+                    'UPDATE jobs SET state = ?, finished_at = ?, lease_token = NULL, lease_expires = NULL, result = ?, error = ? WHERE id = ? AND lease_token = ? AND state = ?',
+                    (error is None and 'done' or 'failed', now, result, error and dump(error), job_id, lease_token, 'running'),
+                )
+
+            return cursor.rowcount == 1
+
+    def purge(self, older_than):
+        """
+        Remove the jobs completed more than older_than seconds ago.
+
+        Returns the number of removed jobs.
+        """
+
+        with self.__transaction() as connection:
+            return connection.execute('DELETE FROM jobs WHERE state IN (?, ?) AND finished_at < ?', ('done', 'failed', time.time() - older_than)).rowcount
+
+    def stats(self):
+        """
+        Count the jobs in each state.
+        """
+
+        return dict(self.__get_connection().execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+    def __expire(self, connection, now):
+        """
+        Queue the running jobs whose lease expired again, or fail them if they ran out of attempts.
+        """
+
+        connection.execute(
+            'UPDATE jobs SET state = ?, finished_at = ?, lease_token = NULL, error = ? WHERE state = ? AND lease_expires < ? AND attempts >= max_attempts',
+            ('failed', now, dump({'returncode': None, 'message': 'the lease of the last attempt expired'}), 'running', now),
+        )
+        connection.execute(
+            'UPDATE jobs SET state = ?, lease_token = NULL, available_at = ? WHERE state = ? AND lease_expires < ?',
+            ('queued', now, 'running', now),
+        )
+
+    def __get_connection(self):
+        """
+        Get the connection of the current thread, in autocommit mode.
+        """
+
+        connection = getattr(self.__local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+
+            # Results are the bytes output by ss.exe: they are stored and returned as is.
+            connection.text_factory = str
+            self.__local.connection = connection
+
+        return connection
+
+    @contextlib.contextmanager
+    def __transaction(self):
+        """
+        Run a write transaction: the database is locked for the other processes from its start, so that what is read
+        within it is still true when it is updated.
+        """
+
+        connection = self.__get_connection()
+        connection.execute('BEGIN IMMEDIATE')
+
+        try:
+            yield connection
+        except:
+            connection.execute('ROLLBACK')
+            raise
+
+        connection.execute('COMMIT')
+
+class Worker(object):
+    """
+    Runs the jobs of a JobQueue with a pool of threads, renewing their leases while they run.
+
+    Errors that classify as retryable (see scheduler.classify) are retried after a backoff, up to the max_attempts of
+    the job.
+    """
+
+    def __init__(self, queue, threads=1, lease=DEFAULT_LEASE, poll_interval=DEFAULT_POLL_INTERVAL, name=None, **vss_options):
+        """
+        Create a worker for the specified queue.
+
+        vss_options are passed to the constructor of the VSS instances that run the jobs.
+        """
+
+        self.queue = queue
+        self.threads = threads
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.name = name or '%s:%d' % (socket.gethostname(), os.getpid())
+        self.vss_options = vss_options
+        self.__lock = threading.Lock()
+        self.__instances = {}
+        self.__leases = {}
+        self.__stopped = threading.Event()
+
+    def run(self):
+        """
+        Run jobs until stop is called.
+        """
+
+        threads = [threading.Thread(target=self.__work, name='VSSWorker') for _ in xrange(self.threads)]
+        threads.append(threading.Thread(target=self.__renew, name='VSSWorkerLeases'))
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            while not self.__stopped.wait(1):
+                pass
+        finally:
+            self.__stopped.set()
+
+            for thread in threads:
+                thread.join()
+
+    def stop(self):
+        """
+        Stop claiming jobs: run returns once the running ones complete.
+        """
+
+        self.__stopped.set()
+
+    def run_once(self):
+        """
+        Claim and run a single job.
+
+        Returns the id of the job, or None if there was none to run.
+        """
+
+        job = self.queue.claim(self.name, self.lease)
+
+        if job is None:
+            return None
+
+        with self.__lock:
+            self.__leases[job['id']] = job['lease_token']
+
+        try:
+            vss = self.__get_vss(job['repository_path'], job['ss_path'])
+            result = getattr(vss, job['command'])(*job['args'], **dict((str(name), value) for name, value in job['options'].items()))
+        except Exception, ex:
+            error = {'returncode': None, 'message': str(ex)}
+            retry_delay = None
+
+            if isinstance(ex, subprocess.CalledProcessError):
+                error = {'returncode': ex.returncode, 'cmd': ex.cmd, 'output': ex.output, 'stderr': getattr(ex, 'stderr', None), 'message': str(ex)}
+
+            if job['attempts'] < job['max_attempts'] and scheduler.classify(ex) == 'retryable':
+                retry_delay = scheduler.get_backoff(job['attempts'])
+
+            self.__complete(job, error=error, retry_delay=retry_delay)
+        else:
+            self.__complete(job, result=result)
+        finally:
+            with self.__lock:
+                self.__leases.pop(job['id'], None)
+
+        return job['id']
+
+    def __complete(self, job, **outcome):
+        """
+        Publish the outcome of a job (see JobQueue.complete). An outcome that cannot be stored fails the job, rather than
+        the thread of the worker.
+        """
+
+        try:
+            self.queue.complete(job['id'], job['lease_token'], **outcome)
+        except Exception, ex:
+            try:
+                self.queue.complete(job['id'], job['lease_token'], error={'returncode': None, 'message': 'the outcome could not be stored: %s' % ex})
+            except Exception:
+                # The job is claimed again once its lease expires.
+                pass
+
+    def __get_vss(self, repository_path, ss_path):
+        """
+        Get the VSS instance of a repository.
+        """
+
+        with self.__lock:
+            key = (repository_path, ss_path)
+
+            if not key in self.__instances:
+                self.__instances[key] = VSS(repository_path, ss_path, **self.vss_options)
+
+            return self.__instances[key]
+
+    def __work(self):
+        while not self.__stopped.is_set():
+            if self.run_once() is None:
+                self.__stopped.wait(self.poll_interval)
+
+    def __renew(self):
+        while not self.__stopped.wait(self.lease / 3.0):
+            with self.__lock:
+                leases = self.__leases.items()
+
+            for job_id, lease_token in leases:
+                self.queue.renew(job_id, lease_token, self.lease)
+
+def main():
+    """
+    Run a worker.
+    """
+
+    parser = argparse.ArgumentParser(description='Run the VSS commands of a job queue.')
+    parser.add_argument('database', help='the SQLite database of the queue')
+    parser.add_argument('--threads', type=int, default=1, help='the number of jobs run at once')
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE, help='the lease of a job, in seconds')
+    parser.add_argument('--repository-limit', type=int, default=DEFAULT_REPOSITORY_LIMIT, help='the number of jobs run at once against a repository, over all the workers')
+    args = parser.parse_args()
+
+    worker = Worker(JobQueue(args.database, args.repository_limit), args.threads, args.lease)
+
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,533 @@
+"""
+Journal the changes made to a working folder, to check in only what changed instead of the whole tree.
+"""
+
+import incremental
+import label_snapshot
+import parallel
+import parsers
+import persistence
+import timeouts
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import subprocess
+import sys
+import threading
+
+JOURNAL_NAME = '.vsspython-journal.json'
+
+# Files that VSS and VSSPython write to working folders.
+IGNORED_NAMES = frozenset([
+    'vssver.scc',
+    'vssver2.scc',
+    JOURNAL_NAME,
+    JOURNAL_NAME + '.tmp',
+    incremental.MANIFEST_NAME,
+    incremental.MANIFEST_NAME + '.tmp',
+    label_snapshot.STATE_NAME,
+    label_snapshot.STATE_NAME + '.tmp',
+])
+
+DEFAULT_INTERVAL = 2
+
+# inotify constants, from <sys/inotify.h>.
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+def is_ignored(relative_path):
+    """
+    Check whether changes to a file are never journaled.
+    """
+
+    return relative_path.rsplit('/', 1)[-1].lower() in IGNORED_NAMES
+
+def is_under(relative_path, folders):
+    """
+    Check whether a path is under one of the specified folders.
+    """
+
+    return [folder for folder in folders if relative_path.lower().startswith(folder.lower() + '/')] != []
+
+class Journal(object):
+    """
+    The files added, modified and deleted under a working folder since the last checkin, as reported by a watcher.
+
+    Changes to the same path are merged: a file added then modified is added, a file added then deleted is forgotten,
+    and so on. If a watcher misses events, the journal is marked as overflowed: the next checkin then falls back to a
+    recursive one.
+
+    The journal is saved to path (by default, a file in the working folder).
+    """
+
+    def __init__(self, local_path, path=None):
+        """
+        Create or load the journal of the working folder local_path.
+        """
+
+        self.local_path = local_path
+        self.path = path or os.path.join(local_path, JOURNAL_NAME)
+        self.overflowed = False
+        self.__lock = threading.RLock()
+        self.__entries = {}
+
+        if os.path.isfile(self.path):
+            self.load()
+
+    def record(self, relative_path, change, is_dir=False):
+        """
+        Record a change ('added', 'modified' or 'deleted') to a file or folder, given by its path relative to the working
+        folder with '/' separators.
+
+        Returns whether the journal changed: changes to ignored files (see is_ignored) and to the files of the journal
+        itself are never recorded.
+        """
+
+        if is_ignored(relative_path) or self.is_own_file(relative_path):
+            return False
+
+        key = relative_path.lower()
+
+        with self.__lock:
+            count = len(self.__entries)
+            current = self.__entries.get(key)
+            previous = (current or (None, None, None))[1]
+
+            if change == 'deleted':
+                if is_dir:
+                    for other_key in self.__entries.keys():
+                        if other_key.startswith(key + '/'):
+                            del self.__entries[other_key]
+
+                if previous == 'added':
+                    del self.__entries[key]
+                    return True
+            elif previous == 'added':
+                change = 'added'
+            elif previous is not None and change == 'added':
+                # Deleted then created again, or replaced (as editors save files): the item already existed.
+                change = 'modified'
+
+            self.__entries[key] = (relative_path, change, is_dir)
+
+            return self.__entries[key] != current or len(self.__entries) != count
+
+    def is_own_file(self, relative_path):
+        """
+        Check whether a path of the working folder is the file of the journal, or its temporary file.
+        """
+
+        path = os.path.normcase(os.path.abspath(os.path.join(self.local_path, *relative_path.split('/'))))
+
+        return path in (os.path.normcase(os.path.abspath(self.path)), os.path.normcase(os.path.abspath(self.path + '.tmp')))
+
+    def changes(self):
+        """
+        Get the journaled changes, as (relative_path, change, is_dir) tuples sorted by path.
+        """
+
+        with self.__lock:
+            return sorted(self.__entries.values(), key=lambda entry: entry[0].lower())
+
+    def discard(self, relative_paths):
+        """
+        Remove the changes to the specified paths (and to the items under them) from the journal.
+        """
+
+        keys = [relative_path.lower() for relative_path in relative_paths]
+
+        with self.__lock:
+            for other_key in self.__entries.keys():
+                if other_key in keys or is_under(other_key, keys):
+                    del self.__entries[other_key]
+
+    def mark_overflowed(self):
+        """
+        Record that some changes were missed.
+        """
+
+        with self.__lock:
+            self.overflowed = True
+
+    def reset(self):
+        """
+        Forget all the changes.
+        """
+
+        with self.__lock:
+            self.__entries = {}
+            self.overflowed = False
+
+    def load(self):
+        """
+        Load the journal from its file.
+        """
+
+        with open(self.path, 'rb') as f:
+            data = json.load(f)
+
+        with self.__lock:
+            self.overflowed = data['overflowed']
+            self.__entries = dict((relative_path.lower(), (relative_path, change, is_dir)) for relative_path, change, is_dir in data['changes'])
+
+    def save(self):
+        """
+        Save the journal to its file.
+        """
+
+        with self.__lock:
+            data = json.dumps({'overflowed': self.overflowed, 'changes': self.changes()}, indent=1)
+
+        persistence.write_file(self.path, data)
+
+class PollingWatcher(object):
+    """
+    Journals the changes to a working folder by comparing the modification times and sizes of its files every interval
+    seconds.
+    """
+
+    def __init__(self, journal, interval=DEFAULT_INTERVAL):
+        """
+        Create a watcher of the working folder of journal.
+        """
+
+        self.journal = journal
+        self.interval = interval
+        self.__snapshot = None
+        self.__thread = None
+        self.__stopped = threading.Event()
+
+    def start(self):
+        """
+        Take a snapshot of the folder, then start watching it in a background thread.
+        """
+
+        self.__snapshot = self.__scan()
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Stop watching the folder, once the changes made so far are journaled.
+        """
+
+        self.__stopped.set()
+        self.__thread.join()
+        self.poll()
+
+    def poll(self):
+        """
+        Journal the changes made since the previous snapshot.
+        """
+
+        snapshot = self.__scan()
+        changed = False
+
+        for relative_path, state in snapshot.iteritems():
+            previous = self.__snapshot.get(relative_path)
+
+            if previous is None:
+                changed = self.journal.record(relative_path, 'added', state[0]) or changed
+            elif not state[0] and state != previous:
+                changed = self.journal.record(relative_path, 'modified') or changed
+
+        for relative_path, state in self.__snapshot.iteritems():
+            if not relative_path in snapshot:
+                changed = self.journal.record(relative_path, 'deleted', state[0]) or changed
+
+        # Saving the journal changes the folder: it is only saved when changes were recorded, or it would save forever.
+        if changed:
+            self.journal.save()
+
+        self.__snapshot = snapshot
+
+    def __run(self):
+        while not self.__stopped.wait(self.interval):
+            self.poll()
+
+    def __scan(self):
+        """
+        Get the (is_dir, modification time, size) of each item under the folder.
+        """
+
+        snapshot = {}
+
+        for folder, folders, files in os.walk(self.journal.local_path):
+            relative_folder = os.path.relpath(folder, self.journal.local_path).replace(os.sep, '/')
+            prefix = relative_folder != '.' and relative_folder + '/' or ''
+
+            for name in folders:
+                snapshot[prefix + name] = (True, None, None)
+
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(folder, name))
+                except OSError:
+                    continue
+
+                snapshot[prefix + name] = (False, stat.st_mtime, stat.st_size)
+
+        return snapshot
+
+class InotifyWatcher(object):
+    """
+    Journals the changes to a working folder as the Linux kernel reports them, with inotify.
+    """
+
+    def __init__(self, journal):
+        """
+        Create a watcher of the working folder of journal.
+        """
+
+        self.journal = journal
+        self.__libc = get_libc()
+        self.__fd = None
+        self.__folders = {}
+        self.__thread = None
+        self.__stopped = threading.Event()
+
+    def start(self):
+        """
+        Start watching the folder in a background thread.
+        """
+
+        self.__fd = self.__libc.inotify_init()
+
+        if self.__fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+        self.__add_watches(self.journal.local_path)
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Stop watching the folder, once the events reported so far are journaled.
+        """
+
+        self.__stopped.set()
+        self.__thread.join()
+        os.close(self.__fd)
+        self.__folders = {}
+
+    def __run(self):
+        while True:
+            stopping = self.__stopped.is_set()
+
+            # Saving the journal raises events of its own: it is only saved when changes were recorded, or it would save
+            # forever.
+            if select.select([self.__fd], [], [], not stopping and 0.2 or 0)[0] and self.__handle(os.read(self.__fd, READ_SIZE)):
+                self.journal.save()
+
+            if stopping:
+                return
+
+    def __handle(self, data):
+        """
+        Journal a buffer of inotify events.
+
+        Returns whether the journal changed.
+        """
+
+        offset = 0
+        changed = False
+
+        while offset < len(data):
+            wd, mask, _, size = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + size].rstrip('\0')
+            offset += EVENT_HEADER.size + size
+
+            if mask & IN_Q_OVERFLOW:
+                self.journal.mark_overflowed()
+                changed = True
+                continue
+
+            if mask & IN_IGNORED:
+                self.__folders.pop(wd, None)
+                continue
+
+            folder = self.__folders.get(wd)
+
+            if folder is None or not name:
+                continue
+
+            relative_path = folder and folder + '/' + name or name
+            is_dir = bool(mask & IN_ISDIR)
+
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                if is_dir:
+                    self.__add_watches(os.path.join(self.journal.local_path, *relative_path.split('/')))
+
+                changed = self.journal.record(relative_path, 'added', is_dir) or changed
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                changed = self.journal.record(relative_path, 'deleted', is_dir) or changed
+            elif not is_dir:
+                changed = self.journal.record(relative_path, 'modified') or changed
+
+        return changed
+
+    def __add_watches(self, path):
+        """
+        Watch a folder and its subfolders.
+        """
+
+        for folder, _, _ in os.walk(path):
+            wd = self.__libc.inotify_add_watch(self.__fd, folder, WATCH_MASK)
+
+            # The folder may have been removed in the meantime.
+            if wd < 0:
+                continue
+
+            relative_folder = os.path.relpath(folder, self.journal.local_path).replace(os.sep, '/')
+            self.__folders[wd] = relative_folder != '.' and relative_folder or ''
+
+def get_libc():
+    """
+    Get the C library if it provides inotify, or None.
+    """
+
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+
+    if not hasattr(libc, 'inotify_init') or not hasattr(libc, 'inotify_add_watch'):
+        return None
+
+    return libc
+
+def watch(journal, interval=DEFAULT_INTERVAL):
+    """
+    Start watching the working folder of journal: with inotify if available, by polling every interval seconds
+    otherwise.
+
+    Returns the started watcher: call its stop method to stop watching.
+    """
+
+    watcher = get_libc() is not None and InotifyWatcher(journal) or PollingWatcher(journal, interval)
+    watcher.start()
+
+    return watcher
+
+def get_checked_out_names(vss, project, local_folder):
+    """
+    Get the lowercase names of the files of project checked out to local_folder.
+    """
+
+    try:
+        entries = parsers.parse_status(vss.status(project), project)
+    except (timeouts.TimeoutExpired, timeouts.Cancelled):
+        raise
+    except subprocess.CalledProcessError:
+        # Status fails when nothing is checked out.
+        return set()
+
+    key = os.path.normcase(os.path.normpath(local_folder)).lower()
+
+    return set(
+        entry.path.rsplit('/', 1)[-1].lower() for entry in entries
+        if entry.local_folder and os.path.normcase(os.path.normpath(entry.local_folder)).lower() == key
+    )
+
+def checkin(vss, vss_project_path, journal, comment=None, checkout=False):
+    """
+    Check in the journaled changes of the working folder of vss_project_path.
+
+    Modified files are checked in with one Checkin command per folder, new files and folders are added and deleted ones
+    are deleted. Changes are removed from the journal as they are checked in. If the journal overflowed, the whole
+    project is checked in recursively instead.
+
+    Modified files that are not checked out to the working folder are checked out first (keeping their local copy) if
+    checkout is True. Otherwise they are not checked in, and are left in the journal: journal.changes() reports them
+    after the checkin.
+
+    Returns the standard output.
+    """
+
+    local_path = journal.local_path
+    options = comment is None and {'comment_no_text': True} or {'comment_text': comment}
+
+    if journal.overflowed:
+        output = vss.checkin(vss_project_path, recursive=True, get_folder=local_path, output='error', **options)
+        journal.reset()
+        journal.save()
+
+        return output
+
+    changes = journal.changes()
+    added_folders = [path for path, change, is_dir in changes if is_dir and change == 'added']
+    added_folders = [path for path in added_folders if not is_under(path, added_folders)]
+    deleted = [path for path, change, is_dir in changes if change == 'deleted']
+    deleted = [path for path in deleted if not is_under(path, deleted)]
+    files = {}
+    output = []
+
+    for path, change, is_dir in changes:
+        if not is_dir and change != 'deleted' and not is_under(path, added_folders):
+            files.setdefault(path.rpartition('/')[0], []).append((path, change))
+
+    for folder, folder_files in sorted(files.items()):
+        project = folder and parsers.join(vss_project_path, folder) or vss_project_path
+        local_folder = parallel.get_local_folder(project, vss_project_path, local_path)
+        added = [path for path, change in folder_files if change == 'added']
+
+        if added:
+            existing = set(name.lower() for _, _, names in parsers.parse_dir(vss.dir(project)) for name in names)
+        else:
+            existing = set()
+
+        new = [path for path in added if not path.rpartition('/')[2].lower() in existing]
+        modified = [path for path, change in folder_files if not path in new]
+        checked_out = modified and get_checked_out_names(vss, project, local_folder) or set()
+        not_checked_out = [path for path in modified if not path.rpartition('/')[2].lower() in checked_out]
+
+        if not_checked_out and checkout:
+            output.append(vss.checkout([parsers.join(project, path.rpartition('/')[2]) for path in not_checked_out], get_local=False, get_folder=local_folder, output='error'))
+            not_checked_out = []
+
+        checkin_paths = [path for path in modified if not path in not_checked_out]
+
+        if checkin_paths:
+            output.append(vss.checkin([parsers.join(project, path.rpartition('/')[2]) for path in checkin_paths], get_folder=local_folder, output='error', **options))
+
+        if new:
+            vss.set_current_project(project)
+            output.append(vss.add([os.path.join(local_folder, path.rpartition('/')[2]) for path in new], **options))
+
+        journal.discard([path for path, _ in folder_files if not path in not_checked_out])
+        journal.save()
+
+    for folder in added_folders:
+        parent = folder.rpartition('/')[0]
+        vss.set_current_project(parent and parsers.join(vss_project_path, parent) or vss_project_path)
+        output.append(vss.add(os.path.join(local_path, *folder.split('/')), recursive=True, **options))
+        journal.discard([folder])
+        journal.save()
+
+    if deleted:
+        output.append(vss.delete([parsers.join(vss_project_path, path) for path in deleted]))
+        journal.discard(deleted)
+        journal.save()
+
+    return ''.join(output)
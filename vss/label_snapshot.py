@@ -0,0 +1,338 @@
+"""
+Record the files and versions of labelled VSS trees, to compare labels and to materialize labelled trees without
+fetching them whole.
+"""
+
+import incremental
+import parsers
+import persistence
+import tree_index
+import version_cache
+
+import datetime
+import hashlib
+import json
+import multiprocessing.pool
+import os
+import subprocess
+
+STATE_NAME = '.vsspython-snapshot.json'
+
+DATE_FORMAT = incremental.DATE_FORMAT
+
+DEFAULT_WORKERS = 4
+
+def to_bytes(value):
+    """
+    Convert the strings of a value loaded from JSON back to the bytes they were saved from (see write_json).
+    """
+
+    if isinstance(value, unicode):
+        return value.encode('latin-1')
+
+    if isinstance(value, dict):
+        return dict((to_bytes(key), to_bytes(item)) for key, item in value.items())
+
+    if isinstance(value, list):
+        return [to_bytes(item) for item in value]
+
+    return value
+
+def read_json(path):
+    """
+    Read a manifest or state file (see write_json).
+    """
+
+    with open(path, 'rb') as f:
+        return to_bytes(json.load(f))
+
+def write_json(path, value):
+    """
+    Write a manifest or state file. Its strings are the bytes output by ss.exe: they are saved as latin-1, to be
+    restored as is by read_json.
+    """
+
+    persistence.write_file(path, json.dumps(value, indent=1, sort_keys=True, encoding='latin-1'))
+
+def resolve_manifest(vss, project, label, entries=None):
+    """
+    Get the files under project at label, and their versions.
+
+    The versions are read from a single recursive history of project: the version of a file is the one of its newest
+    entry listed at or after the label entry. entries is that history, newest first, if it was already read (to resolve
+    several labels of the same project). The files missing from it (moved or renamed since, for example) are resolved
+    by a History command of their own, and get a None version if that fails too.
+
+    Returns a dict that maps the lowercase path of each file relative to project to a (path, version) tuple.
+    """
+
+    files = []
+
+    for subproject, _, names in parsers.parse_dir(vss.dir(project, recursive=True, version_label=label)):
+        files.extend(parsers.join(subproject, name) for name in names)
+
+    if entries is None:
+        entries = list(vss.iter_history(project, recursive=True))
+
+    keys = set(tree_index.normalize(fname) for fname in files)
+    versions = {}
+    labelled = False
+
+    for entry in entries:
+        labelled = labelled or (entry.label is not None and entry.label.lower() == label.lower())
+
+        if labelled and entry.path and entry.version is not None:
+            key = tree_index.normalize(entry.path)
+
+            if key in keys:
+                versions.setdefault(key, entry.version)
+
+    manifest = {}
+
+    for fname in files:
+        version = versions.get(tree_index.normalize(fname))
+
+        if version is None:
+            try:
+                version = version_cache.find_version(vss, fname, version_label=label)
+            except subprocess.CalledProcessError:
+                version = None
+
+        relative_path = incremental.get_relative_path(fname, project)
+        manifest[relative_path.lower()] = (relative_path, version)
+
+    return manifest
+
+def diff_manifests(old, new):
+    """
+    Compare two manifests (see resolve_manifest).
+
+    Returns an (added, deleted, modified) tuple of sorted lists: added and deleted hold (path, version) tuples, modified
+    holds (path, old_version, new_version) tuples. Files whose version is unknown in either manifest are listed as
+    modified.
+    """
+
+    added = sorted(new[key] for key in new if not key in old)
+    deleted = sorted(old[key] for key in old if not key in new)
+    modified = sorted(
+        (new[key][0], old[key][1], new[key][1]) for key in new
+        if key in old and (old[key][1] != new[key][1] or new[key][1] is None)
+    )
+
+    return added, deleted, modified
+
+class SnapshotStore(object):
+    """
+    A folder of label manifests: the files of a project at a label, and their versions.
+
+    A manifest is recorded once per label. Since a label does not move unless it is applied again, later comparisons
+    and materializations of the label do not run any command.
+    """
+
+    def __init__(self, path):
+        """
+        Create a store in the specified folder.
+        """
+
+        self.path = path
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def get_manifest_path(self, project, label):
+        """
+        Get the path of the manifest file of project at label.
+        """
+
+        key = '%s\n%s' % (tree_index.normalize(project), label.lower())
+
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest() + '.json')
+
+    def record(self, vss, project, label, entries=None):
+        """
+        Resolve and save the manifest of project at label (see resolve_manifest), replacing any previous one.
+
+        Returns the manifest.
+        """
+
+        manifest = resolve_manifest(vss, project, label, entries)
+        path = self.get_manifest_path(project, label)
+        data = {
+            'project': project,
+            'label': label,
+            'recorded_at': datetime.datetime.now().strftime(DATE_FORMAT),
+            'files': manifest,
+        }
+
+        write_json(path, data)
+
+        return manifest
+
+    def record_all(self, vss, project, labels):
+        """
+        Record the manifests of project at each of labels, reading the history of project once.
+        """
+
+        entries = list(vss.iter_history(project, recursive=True))
+
+        for label in labels:
+            self.record(vss, project, label, entries)
+
+    def get(self, project, label):
+        """
+        Get the recorded manifest of project at label, or None if it was not recorded.
+        """
+
+        path = self.get_manifest_path(project, label)
+
+        if not os.path.isfile(path):
+            return None
+
+        files = read_json(path)['files']
+
+        return dict((key, tuple(value)) for key, value in files.items())
+
+    def get_or_record(self, vss, project, label):
+        """
+        Get the manifest of project at label, recording it first if needed.
+        """
+
+        manifest = self.get(project, label)
+
+        if manifest is None:
+            manifest = self.record(vss, project, label)
+
+        return manifest
+
+    def labels(self, project):
+        """
+        Get the labels recorded for project, sorted.
+        """
+
+        labels = []
+
+        for name in os.listdir(self.path):
+            if not name.endswith('.json'):
+                continue
+
+            data = read_json(os.path.join(self.path, name))
+
+            if tree_index.normalize(data['project']) == tree_index.normalize(project):
+                labels.append(data['label'])
+
+        return sorted(labels)
+
+    def diff(self, project, old_label, new_label):
+        """
+        Compare the recorded manifests of project at old_label and new_label (see diff_manifests).
+
+        Raises KeyError if either manifest was not recorded.
+        """
+
+        manifests = []
+
+        for label in (old_label, new_label):
+            manifest = self.get(project, label)
+
+            if manifest is None:
+                raise KeyError('No manifest recorded for %s at label %s' % (project, label))
+
+            manifests.append(manifest)
+
+        return diff_manifests(*manifests)
+
+def load_state(path):
+    """
+    Load the snapshot state saved in a local folder.
+
+    Returns None if there is none.
+    """
+
+    if not os.path.isfile(path):
+        return None
+
+    return read_json(path)
+
+def save_state(path, state):
+    """
+    Save the snapshot state of a local folder.
+    """
+
+    write_json(path, state)
+
+def get_file_stamp(path):
+    """
+    Get the (size, modification time) of a local file, or None if it does not exist.
+    """
+
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+
+    return [info.st_size, int(info.st_mtime)]
+
+def materialize(vss, store, project, label, local_path, workers=DEFAULT_WORKERS):
+    """
+    Make local_path hold the files of project at label.
+
+    The manifest of the label is read from store (and recorded if needed), and compared with the snapshot that was
+    materialized in local_path before (as told by the state file saved there). Only the files whose version differs,
+    and the files changed or removed locally since, are fetched, with one Get command per folder run by a pool of
+    workers threads. The files that are not part of the label are removed.
+
+    Returns the standard output of the Get commands.
+    """
+
+    manifest = store.get_or_record(vss, project, label)
+    state_path = os.path.join(local_path, STATE_NAME)
+    state = load_state(state_path)
+
+    if state is None or tree_index.normalize(state['project']) != tree_index.normalize(project):
+        state = {'project': project, 'label': None, 'files': {}}
+
+    same_label = state['label'] is not None and state['label'].lower() == label.lower()
+    fetched = {}
+
+    for key, (relative_path, version) in manifest.items():
+        local_file = os.path.join(local_path, *relative_path.split('/'))
+        recorded = state['files'].get(key)
+
+        if recorded is not None and recorded[1] == version and (version is not None or same_label):
+            if recorded[2] == get_file_stamp(local_file):
+                continue
+
+        folder = os.path.dirname(local_file)
+        fetched.setdefault(folder, []).append(parsers.join(project, relative_path))
+
+    for key in state['files'].keys():
+        if not key in manifest:
+            incremental.remove(os.path.join(local_path, *state['files'][key][0].split('/')))
+            del state['files'][key]
+
+    def run_one((folder, files)):
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        return vss.get(files, get_folder=folder, version_label=label, **incremental.GET_OPTIONS)
+
+    pool = multiprocessing.pool.ThreadPool(workers)
+
+    try:
+        output = pool.map(run_one, sorted(fetched.items()))
+    finally:
+        pool.close()
+        pool.join()
+
+    for key, (relative_path, version) in manifest.items():
+        local_file = os.path.join(local_path, *relative_path.split('/'))
+        state['files'][key] = [relative_path, version, get_file_stamp(local_file)]
+
+    state['label'] = label
+
+    if not os.path.isdir(local_path):
+        os.makedirs(local_path)
+
+    save_state(state_path, state)
+
+    return ''.join(output)
@@ -0,0 +1,331 @@
+"""
+An index of the share and branch relationships between the files of VSS projects, to answer impact queries without
+calling the Links and Paths commands for each file.
+"""
+
+import parsers
+import persistence
+import tree_index
+
+import cPickle
+import multiprocessing.pool
+import os
+import subprocess
+import threading
+
+DEFAULT_WORKERS = 4
+
+# The commands that change the share and branch relationships of their items.
+TRACKED_COMMANDS = frozenset(['Branch', 'Delete', 'Destroy', 'Move', 'Pin', 'Purge', 'Recover', 'Rename', 'Share', 'Unpin'])
+
+def get_linked_path(item, linked):
+    """
+    Get the path of the file item in a project listed by Links: Links lists the projects sharing a file, or the paths
+    of the file in them.
+    """
+
+    name = item.rstrip('/').rsplit('/', 1)[-1]
+
+    if linked.rstrip('/').rsplit('/', 1)[-1].lower() == name.lower():
+        return linked.rstrip('/')
+
+    return parsers.join(linked, name)
+
+class LinkGraph(object):
+    """
+    Records which files are shared (the same file in several projects) and branched (a file copied from another one at
+    a given version) under some VSS projects.
+
+    The Links and Paths commands of all the files of a project are run in bulk, in as few invocations as the command
+    line allows and by a pool of workers threads. Then, the commands run through the VSS instance mark the items they
+    name as stale, and refresh runs Links and Paths for those items only.
+
+    If path is specified, the graph is also saved to and loaded from that file.
+    """
+
+    def __init__(self, vss, path=None, workers=DEFAULT_WORKERS):
+        """
+        Create a graph for the repository of the specified VSS instance.
+        """
+
+        self.vss = vss
+        self.path = path
+        self.workers = workers
+        self.__lock = threading.RLock()
+        self.__paths = {}
+        self.__groups = {}
+        self.__branch_parents = {}
+        self.__branch_children = {}
+        self.__stale = set()
+
+        if self.path and os.path.isfile(self.path):
+            self.load()
+
+        self.vss.listeners.append(self.on_command)
+
+    def detach(self):
+        """
+        Stop tracking the commands run through the VSS instance.
+        """
+
+        self.vss.listeners.remove(self.on_command)
+
+    def add_project(self, project, branches=True):
+        """
+        Collect the share relationships (and the branch relationships, if branches is True) of the files under project.
+        """
+
+        files = []
+
+        for subproject, _, names in parsers.parse_dir(self.vss.dir(project, recursive=True)):
+            files.extend(parsers.join(subproject, name) for name in names)
+
+        self.__collect(files, branches)
+
+        if self.path:
+            self.save()
+
+    def refresh(self, branches=True):
+        """
+        Collect the relationships of the stale items again.
+
+        Returns the number of refreshed files.
+        """
+
+        with self.__lock:
+            stale = set(self.__stale)
+            known = set(self.__paths)
+
+        files = []
+
+        for key in stale:
+            if key in known:
+                files.append(self.__paths[key])
+                continue
+
+            # Not a known file: a project shared or branched recursively, or a new file.
+            try:
+                tree = parsers.parse_dir(self.vss.dir(key, recursive=True))
+            except subprocess.CalledProcessError:
+                tree = []
+
+            if tree:
+                for subproject, _, names in tree:
+                    files.extend(parsers.join(subproject, name) for name in names)
+            else:
+                files.append(key)
+
+        self.__collect(files, branches)
+
+        with self.__lock:
+            self.__stale -= stale
+
+        if self.path:
+            self.save()
+
+        return len(files)
+
+    def get_shared_paths(self, path):
+        """
+        Get the paths of the file path in all the projects that share it (path included), sorted.
+        """
+
+        key = tree_index.normalize(path)
+
+        with self.__lock:
+            return sorted(self.__paths.get(other, other) for other in self.__groups.get(key, frozenset([key])))
+
+    def get_sharing_projects(self, path):
+        """
+        Get the projects that share the file path (its own project included), sorted.
+        """
+
+        return sorted(set(tree_index.get_parent(other) for other in self.get_shared_paths(path)))
+
+    def get_branches(self, path):
+        """
+        Get the file path was branched from (or None) and the files branched from it.
+
+        Returns a (parent, children) tuple.
+        """
+
+        key = tree_index.normalize(path)
+
+        with self.__lock:
+            parent = self.__branch_parents.get(key)
+            children = self.__branch_children.get(key, ())
+
+            return parent and self.__paths.get(parent, parent), sorted(self.__paths.get(child, child) for child in children)
+
+    def get_affected(self, path, branches=False):
+        """
+        Get the files that a change to the file path affects: the files sharing it, and the files sharing those, and so
+        on. If branches is True, the files branched from them (and their parents) are followed too.
+
+        Returns the sorted paths, path included.
+        """
+
+        keys = set([tree_index.normalize(path)])
+        pending = list(keys)
+
+        with self.__lock:
+            while pending:
+                key = pending.pop()
+                neighbors = set(self.__groups.get(key, ()))
+
+                if branches:
+                    neighbors.update(self.__branch_children.get(key, ()))
+
+                    if key in self.__branch_parents:
+                        neighbors.add(self.__branch_parents[key])
+
+                for other in neighbors - keys:
+                    keys.add(other)
+                    pending.append(other)
+
+            return sorted(self.__paths.get(key, key) for key in keys)
+
+    def get_affected_projects(self, path, branches=False):
+        """
+        Get the projects holding the files that a change to the file path affects (see get_affected), sorted.
+        """
+
+        return sorted(set(tree_index.get_parent(other) for other in self.get_affected(path, branches)))
+
+    def stale(self):
+        """
+        Get the items that refresh will collect again.
+        """
+
+        with self.__lock:
+            return set(self.__stale)
+
+    def on_command(self, command, arguments):
+        """
+        Mark the items named by the specified command as stale.
+        """
+
+        if not command in TRACKED_COMMANDS:
+            return
+
+        with self.__lock:
+            self.__stale.update(tree_index.normalize(argument) for argument in arguments if argument.startswith('$'))
+
+        if self.path:
+            self.save()
+
+    def load(self):
+        """
+        Load the graph from its file.
+        """
+
+        with open(self.path, 'rb') as f:
+            data = cPickle.load(f)
+
+        with self.__lock:
+            self.__paths, self.__groups, self.__branch_parents, self.__branch_children, self.__stale = data
+
+    def save(self):
+        """
+        Save the graph to its file.
+        """
+
+        with self.__lock:
+            data = cPickle.dumps((self.__paths, self.__groups, self.__branch_parents, self.__branch_children, self.__stale), cPickle.HIGHEST_PROTOCOL)
+
+        persistence.write_file(self.path, data)
+
+    def __run(self, command, files):
+        """
+        Run command (links or paths) for files, in batches run in parallel.
+
+        Files whose batch failed are run one by one, so that a missing file does not hide the others.
+
+        Returns the parsed output, as a list of parsers.TreeEntry instances.
+        """
+
+        result = self.vss.batch(command, files, workers=self.workers)
+        outputs = [output for _, output, error in result.batches if error is None]
+
+        def run_one(fname):
+            try:
+                return getattr(self.vss, command)(fname)
+            except subprocess.CalledProcessError:
+                return ''
+
+        if result.failed_items:
+            pool = multiprocessing.pool.ThreadPool(self.workers)
+
+            try:
+                outputs.extend(pool.map(run_one, result.failed_items))
+            finally:
+                pool.close()
+                pool.join()
+
+        return [entry for output in outputs for entry in parsers.parse_tree(output)]
+
+    def __collect(self, files, branches):
+        """
+        Collect the relationships of files, replacing the recorded ones.
+        """
+
+        if not files:
+            return
+
+        links = {}
+        item = None
+
+        for entry in self.__run('links', files):
+            if entry.depth == 0:
+                item = entry.path
+                links[tree_index.normalize(item)] = set([item])
+            elif entry.depth == 1 and item is not None:
+                links[tree_index.normalize(item)].add(get_linked_path(item, entry.path))
+
+        branch_entries = branches and self.__run('paths', files) or []
+
+        with self.__lock:
+            for fname in files:
+                key = tree_index.normalize(fname)
+                self.__paths.setdefault(key, fname)
+                self.__set_group(key, links.get(key, set([fname])))
+
+            for entry in branch_entries:
+                if entry.parent is None:
+                    continue
+
+                key, parent = tree_index.normalize(entry.path), tree_index.normalize(entry.parent)
+                self.__paths.setdefault(key, entry.path)
+                self.__paths.setdefault(parent, entry.parent)
+
+                previous = self.__branch_parents.get(key)
+
+                if previous is not None and previous != parent:
+                    self.__branch_children.get(previous, set()).discard(key)
+
+                self.__branch_parents[key] = parent
+                self.__branch_children.setdefault(parent, set()).add(key)
+
+    def __set_group(self, key, paths):
+        """
+        Record that the file key is shared as paths.
+
+        Must be called with the lock held.
+        """
+
+        group = frozenset(tree_index.normalize(path) for path in paths) | frozenset([key])
+
+        for path in paths:
+            self.__paths.setdefault(tree_index.normalize(path), path)
+
+        # The members that are no longer shared with key keep sharing among themselves.
+        remaining = self.__groups.get(key, frozenset()) - group
+
+        for other in remaining:
+            self.__groups[other] = remaining
+
+        for other in group:
+            for previous in self.__groups.get(other, frozenset()) - group:
+                self.__groups[previous] = self.__groups[previous] - group
+
+            self.__groups[other] = group
@@ -0,0 +1,438 @@
+"""
+Compare trees of files in process, instead of calling the VSS Diff command for each file.
+"""
+
+import incremental
+import journal
+import parsers
+
+import multiprocessing
+import multiprocessing.pool
+import os
+import re
+import tempfile
+
+IGNORE_MODES = ('case', 'eol', 'whitespace')
+
+DEFAULT_CONTEXT = 3
+
+WHITESPACE = re.compile(r'\s+')
+
+def get_ignore_modes(ignore):
+    """
+    Get the set of ignore modes from the value of an ignore option: one of IGNORE_MODES, a collection of them, or None.
+    """
+
+    if ignore is None:
+        return frozenset()
+
+    if isinstance(ignore, basestring):
+        ignore = [ignore]
+
+    modes = frozenset(ignore)
+
+    for mode in modes:
+        if not mode in IGNORE_MODES:
+            raise ValueError('Invalid option value for %s (%s)' % (repr('ignore'), repr(mode)))
+
+    return modes
+
+def normalize(line, modes):
+    """
+    Get the form of a line that is compared, given a set of ignore modes.
+    """
+
+    if 'eol' in modes:
+        line = line.rstrip('\r\n')
+
+    if 'whitespace' in modes:
+        line = WHITESPACE.sub('', line)
+
+    if 'case' in modes:
+        line = line.lower()
+
+    return line
+
+def get_matching_blocks(a, b):
+    """
+    Get the matching blocks of two sequences of hashable items, as found by the Myers O(ND) algorithm in linear space.
+
+    Returns a list of (i, j, n) triples meaning a[i:i + n] == b[j:j + n], ending with (len(a), len(b), 0), like
+    difflib.SequenceMatcher.get_matching_blocks.
+    """
+
+    blocks = []
+    stack = [(0, len(a), 0, len(b))]
+
+    # Sub-problems are processed in order: the blocks come out sorted.
+    while stack:
+        a_start, a_end, b_start, b_end = stack.pop()
+
+        prefix = 0
+
+        while a_start + prefix < a_end and b_start + prefix < b_end and a[a_start + prefix] == b[b_start + prefix]:
+            prefix += 1
+
+        suffix = 0
+
+        while a_end - suffix > a_start + prefix and b_end - suffix > b_start + prefix and a[a_end - suffix - 1] == b[b_end - suffix - 1]:
+            suffix += 1
+
+        suffix_block = suffix and (a_end - suffix, b_end - suffix, suffix)
+
+        if prefix:
+            blocks.append((a_start, b_start, prefix))
+
+        a_start += prefix
+        b_start += prefix
+        a_end -= suffix
+        b_end -= suffix
+
+        if a_start < a_end and b_start < b_end:
+            x, y, u, v = find_middle_snake(a, a_start, a_end, b, b_start, b_end)
+
+            if suffix_block:
+                stack.append((None, suffix_block))
+
+            stack.append((a_start + u, a_end, b_start + v, b_end))
+
+            if u > x:
+                stack.append((None, (a_start + x, b_start + y, u - x)))
+
+            stack.append((a_start, a_start + x, b_start, b_start + y))
+        elif suffix_block:
+            blocks.append(suffix_block)
+
+        while stack and stack[-1][0] is None:
+            blocks.append(stack.pop()[1])
+
+    merged = []
+
+    for block in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == block[0] and merged[-1][1] + merged[-1][2] == block[1]:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + block[2])
+        else:
+            merged.append(block)
+
+    return merged + [(len(a), len(b), 0)]
+
+def find_middle_snake(a, a_start, a_end, b, b_start, b_end):
+    """
+    Find the middle snake of the shortest edit script between a[a_start:a_end] and b[b_start:b_end], which must both be
+    non-empty and differ at both ends.
+
+    Returns the (x, y, u, v) bounds of the snake, relative to a_start and b_start: a[x:u] matches b[y:v].
+    """
+
+    n = a_end - a_start
+    m = b_end - b_start
+    delta = n - m
+    odd = delta % 2
+    offset = n + m + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+
+    for d in xrange((n + m + 1) / 2 + 1):
+        for k in xrange(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+
+            y = x - k
+            x0, y0 = x, y
+
+            while x < n and y < m and a[a_start + x] == b[b_start + y]:
+                x += 1
+                y += 1
+
+            forward[offset + k] = x
+
+            if odd and -(d - 1) <= delta - k <= d - 1 and x + backward[offset + delta - k] >= n:
+                return x0, y0, x, y
+
+        for k in xrange(-d, d + 1, 2):
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+
+            y = x - k
+            x0, y0 = x, y
+
+            while x < n and y < m and a[a_end - x - 1] == b[b_end - y - 1]:
+                x += 1
+                y += 1
+
+            backward[offset + k] = x
+
+            if not odd and -d <= delta - k <= d and x + forward[offset + delta - k] >= n:
+                return n - x, m - y, n - x0, m - y0
+
+    raise AssertionError('No middle snake found')
+
+def get_opcodes(a, b):
+    """
+    Get the operations that turn a into b, as (tag, i1, i2, j1, j2) tuples like difflib.SequenceMatcher.get_opcodes.
+    """
+
+    opcodes = []
+    i = j = 0
+
+    for block_i, block_j, size in get_matching_blocks(a, b):
+        tag = (i < block_i and j < block_j and 'replace') or (i < block_i and 'delete') or (j < block_j and 'insert')
+
+        if tag:
+            opcodes.append((tag, i, block_i, j, block_j))
+
+        if size:
+            opcodes.append(('equal', block_i, block_i + size, block_j, block_j + size))
+
+        i, j = block_i + size, block_j + size
+
+    return opcodes
+
+def get_hunks(opcodes, context=DEFAULT_CONTEXT):
+    """
+    Group opcodes into hunks with context lines, like difflib.SequenceMatcher.get_grouped_opcodes.
+    """
+
+    if not opcodes:
+        return []
+
+    opcodes = list(opcodes)
+
+    if opcodes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = opcodes[0]
+        opcodes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+
+    if opcodes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = opcodes[-1]
+        opcodes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    hunks = []
+    hunk = []
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal' and i2 - i1 > context * 2:
+            hunk.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            hunks.append(hunk)
+            hunk = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+
+        hunk.append((tag, i1, i2, j1, j2))
+
+    if hunk and not (len(hunk) == 1 and hunk[0][0] == 'equal'):
+        hunks.append(hunk)
+
+    return hunks
+
+def unified_diff(a, b, a_name, b_name, ignore=None, context=DEFAULT_CONTEXT):
+    """
+    Compare two lists of lines (line endings included), ignoring the differences of the specified ignore modes.
+
+    Returns the differences in the unified format, or an empty string if there are none.
+    """
+
+    modes = get_ignore_modes(ignore)
+    keys = {}
+    a_keys = [keys.setdefault(normalize(line, modes), len(keys)) for line in a]
+    b_keys = [keys.setdefault(normalize(line, modes), len(keys)) for line in b]
+    hunks = get_hunks(get_opcodes(a_keys, b_keys), context)
+
+    if not hunks:
+        return ''
+
+    output = ['--- %s\n' % a_name, '+++ %s\n' % b_name]
+
+    for hunk in hunks:
+        i1, i2, j1, j2 = hunk[0][1], hunk[-1][2], hunk[0][3], hunk[-1][4]
+        output.append('@@ -%d,%d +%d,%d @@\n' % (i1 + (i2 > i1), i2 - i1, j1 + (j2 > j1), j2 - j1))
+
+        for tag, i1, i2, j1, j2 in hunk:
+            if tag == 'equal':
+                output.extend(' ' + line for line in a[i1:i2])
+                continue
+
+            output.extend('-' + line for line in a[i1:i2])
+            output.extend('+' + line for line in b[j1:j2])
+
+    return ''.join(line.endswith('\n') and line or line + '\n\\ No newline at end of file\n' for line in output)
+
+class FolderSource(object):
+    """
+    The files of a local folder, to be compared with diff_trees.
+
+    The files that VSS and VSSPython write to working folders (see journal.IGNORED_NAMES), like the journal, the
+    manifest of incremental.sync or the snapshot state, are left out.
+    """
+
+    def __init__(self, path):
+        """
+        Create a source for the files under path.
+        """
+
+        self.path = path
+
+    def list(self):
+        """
+        Get the paths of the files, relative to the folder and with '/' separators.
+        """
+
+        paths = []
+
+        for folder, _, files in os.walk(self.path):
+            relative_path = os.path.relpath(folder, self.path).replace(os.sep, '/')
+
+            for fname in files:
+                path = relative_path != '.' and relative_path + '/' + fname or fname
+
+                if not journal.is_ignored(path):
+                    paths.append(path)
+
+        return paths
+
+    def get_reference(self, relative_path):
+        """
+        Get what a worker needs to read a file: its local path.
+        """
+
+        return ('path', os.path.join(self.path, *relative_path.split('/')))
+
+    def close(self):
+        """
+        Nothing to release.
+        """
+
+        pass
+
+class VersionSource(object):
+    """
+    The files of a VSS project at a given version (like a label), to be compared with diff_trees.
+
+    The files are fetched with a single recursive Get into a temporary folder, which close removes.
+    """
+
+    def __init__(self, vss, project, **version_options):
+        """
+        Create a source for the files of project at the version designated by version_options (one of version_number,
+        version_label or version_date).
+        """
+
+        self.vss = vss
+        self.project = project
+        self.version_options = version_options
+        self.__folder = None
+
+    def list(self):
+        """
+        Get the paths of the files, relative to the project.
+        """
+
+        root = self.project.rstrip('/') + '/'
+        paths = []
+
+        for project, _, files in parsers.parse_dir(self.vss.dir(self.project, recursive=True, **self.version_options)):
+            for fname in files:
+                paths.append(parsers.join(project, fname)[len(root):])
+
+        return paths
+
+    def get_reference(self, relative_path):
+        """
+        Get what a worker needs to read a file: its local path. The project is fetched the first time.
+        """
+
+        if self.__folder is None:
+            self.__folder = tempfile.mkdtemp(prefix='vsspython-')
+            options = dict(incremental.GET_OPTIONS, **self.version_options)
+            self.vss.get(self.project, recursive=True, get_folder=self.__folder, **options)
+
+        return ('path', os.path.join(self.__folder, *relative_path.split('/')))
+
+    def close(self):
+        """
+        Remove the fetched files, if any.
+        """
+
+        if self.__folder is not None:
+            incremental.remove(self.__folder)
+            self.__folder = None
+
+def read_reference(reference):
+    """
+    Get the content of a file from a reference returned by a source.
+    """
+
+    kind, value = reference
+
+    if kind == 'data':
+        return value
+
+    with open(value, 'rb') as f:
+        return f.read()
+
+def _diff_file(args):
+    """
+    Compare a single file.
+
+    Returns a (relative_path, status, diff) tuple, or None if the files do not differ.
+    """
+
+    relative_path, base_reference, target_reference, modes, context = args
+    base = base_reference and read_reference(base_reference)
+    target = target_reference and read_reference(target_reference)
+
+    if base == target:
+        return None
+
+    status = (base is None and 'added') or (target is None and 'deleted') or 'modified'
+    diff = unified_diff((base or '').splitlines(True), (target or '').splitlines(True), 'a/' + relative_path, 'b/' + relative_path, modes, context)
+
+    if status == 'modified' and not diff:
+        return None
+
+    return relative_path, status, diff
+
+def diff_trees(base, target, ignore=None, context=DEFAULT_CONTEXT, workers=None, processes=True):
+    """
+    Compare the files of two sources (FolderSource or VersionSource instances), like a local folder with its base
+    snapshot, or two labels of a project. Paths are compared case insensitively, like VSS does.
+
+    ignore takes the values of the ignore option of the Diff command that apply: 'case', 'eol' and 'whitespace'.
+
+    Files are compared by a pool of workers processes (or threads, if processes is False). The sources are closed once
+    the comparison completes.
+
+    Returns a list of (relative_path, status, diff) tuples sorted by path, where status is 'added', 'deleted' or
+    'modified' and diff is in the unified format.
+    """
+
+    modes = get_ignore_modes(ignore)
+
+    try:
+        base_paths = dict((path.lower(), path) for path in base.list())
+        target_paths = dict((path.lower(), path) for path in target.list())
+        args = [
+            (
+                target_paths.get(key) or base_paths[key],
+                key in base_paths and base.get_reference(base_paths[key]) or None,
+                key in target_paths and target.get_reference(target_paths[key]) or None,
+                modes,
+                context,
+            )
+            for key in sorted(set(base_paths) | set(target_paths))
+        ]
+
+        pool = (processes and multiprocessing.Pool or multiprocessing.pool.ThreadPool)(workers or multiprocessing.cpu_count())
+
+        try:
+            results = pool.map(_diff_file, args, chunksize=max(1, len(args) / (8 * (workers or multiprocessing.cpu_count()))))
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        base.close()
+        target.close()
+
+    return [result for result in results if result is not None]
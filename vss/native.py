@@ -0,0 +1,779 @@
+"""
+A read-only reader of the files of a Microsoft Visual SourceSafe database.
+
+The database is read directly from its data folder, without calling ss.exe:
+
+- every item (project or file) has a record file named after its physical name (like data/a/aaaaaaaa), holding a header
+  record and the list of its revisions;
+- every project also has an entries file (the record file name with a .a or .b extension) listing its children;
+- every file has a data file (also with a .a or .b extension) holding its latest content: previous contents are
+  rebuilt from the reverse deltas stored in the record file;
+- long item names are stored in data/names.dat.
+"""
+
+from vss import VSS
+
+import parsers
+
+import datetime
+import mmap
+import os
+import struct
+
+FILE_SIGNATURE = 'SourceSafe@Microsoft'
+FILE_HEADER_SIZE = 0x34
+RECORD_HEADER = struct.Struct('<i2sH')
+ROOT_PHYSICAL = 'AAAAAAAA'
+
+PROJECT_ITEM = 1
+FILE_ITEM = 2
+
+DELETED_ENTRY = 0x01
+
+LONG_NAME_KIND = 2
+
+DELTA_WRITE_LOG = 0
+DELTA_WRITE_SUFFIX = 1
+DELTA_STOP = 2
+
+# Revision actions.
+LABEL = 0
+CREATE_PROJECT = 1
+ADD_PROJECT = 2
+ADD_FILE = 3
+DESTROY_PROJECT = 4
+DESTROY_FILE = 5
+DELETE_PROJECT = 6
+DELETE_FILE = 7
+RECOVER_PROJECT = 8
+RECOVER_FILE = 9
+RENAME_PROJECT = 10
+RENAME_FILE = 11
+MOVE_FROM = 12
+MOVE_TO = 13
+SHARE_FILE = 14
+BRANCH_FILE = 15
+CREATE_FILE = 16
+EDIT_FILE = 17
+CREATE_BRANCH = 19
+ROLLBACK = 20
+
+class FormatError(Exception):
+    """
+    Raised when a database file is not in the expected format.
+    """
+
+class Reader(object):
+    """
+    Reads little-endian fields from a memory-mapped file.
+    """
+
+    def __init__(self, data, offset=0):
+        """
+        Create a reader of data, starting at the specified offset.
+        """
+
+        self.data = data
+        self.offset = offset
+
+    def read(self, size):
+        """
+        Read size raw bytes.
+        """
+
+        if self.offset + size > len(self.data):
+            raise FormatError('Unexpected end of data at offset %d' % self.offset)
+
+        result = self.data[self.offset:self.offset + size]
+        self.offset += size
+
+        return result
+
+    def skip(self, size):
+        """
+        Skip size bytes.
+        """
+
+        self.offset += size
+
+    def int16(self):
+        """
+        Read a signed 16 bits integer.
+        """
+
+        return struct.unpack('<h', self.read(2))[0]
+
+    def int32(self):
+        """
+        Read a signed 32 bits integer.
+        """
+
+        return struct.unpack('<i', self.read(4))[0]
+
+    def string(self, size):
+        """
+        Read a zero-terminated string stored in a size bytes field.
+        """
+
+        return self.read(size).split('\0', 1)[0]
+
+    def datetime(self):
+        """
+        Read a date stored as a number of seconds since the epoch.
+        """
+
+        return datetime.datetime.utcfromtimestamp(self.int32())
+
+    def name(self):
+        """
+        Read an item name: returns a (flags, short name, names.dat offset) tuple.
+        """
+
+        return self.int16(), self.string(34), self.int32()
+
+class RecordFile(object):
+    """
+    A memory-mapped database file made of records.
+    """
+
+    def __init__(self, path):
+        """
+        Open the specified file.
+        """
+
+        self.path = path
+
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self.data = size and mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) or ''
+
+    def close(self):
+        """
+        Close the file.
+        """
+
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def check_signature(self):
+        """
+        Check that the file starts with the SourceSafe file signature.
+        """
+
+        if Reader(self.data).string(0x20) != FILE_SIGNATURE:
+            raise FormatError('%s is not a SourceSafe file' % self.path)
+
+    def record(self, offset, signature=None):
+        """
+        Read the record at the specified offset.
+
+        Returns a (signature, reader, next record offset) tuple, where reader is positioned at the start of the record
+        data.
+        """
+
+        if offset + RECORD_HEADER.size > len(self.data):
+            raise FormatError('No record at offset %d of %s' % (offset, self.path))
+
+        length, record_signature, _ = RECORD_HEADER.unpack_from(self.data, offset)
+
+        if signature is not None and record_signature != signature:
+            raise FormatError('Expected a %s record at offset %d of %s, found %s' % (signature, offset, self.path, repr(record_signature)))
+
+        start = offset + RECORD_HEADER.size
+
+        return record_signature, Reader(self.data, start), start + length
+
+    def records(self, offset=FILE_HEADER_SIZE):
+        """
+        Iterate over the records of the file, starting at the specified offset.
+
+        Yields (signature, reader) tuples.
+        """
+
+        while offset + RECORD_HEADER.size <= len(self.data):
+            signature, reader, offset = self.record(offset)
+
+            yield signature, reader
+
+class Revision(object):
+    """
+    A revision of an item.
+    """
+
+    __slots__ = ('version', 'action', 'date', 'user', 'label', 'comment', 'name', 'old_name', 'physical', 'project', 'delta_offset')
+
+    def __init__(self, **kwargs):
+        """
+        Create a revision.
+        """
+
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+class Entry(object):
+    """
+    An entry of a project: a subproject or a file.
+    """
+
+    __slots__ = ('name', 'physical', 'is_project', 'deleted', 'pinned_version')
+
+    def __init__(self, name, physical, is_project, deleted, pinned_version):
+        """
+        Create an entry.
+        """
+
+        self.name = name
+        self.physical = physical
+        self.is_project = is_project
+        self.deleted = deleted
+        self.pinned_version = pinned_version
+
+class Item(object):
+    """
+    An item (a project or a file) of the database, read from its record file.
+    """
+
+    def __init__(self, database, physical):
+        """
+        Read the header of the item with the specified physical name.
+        """
+
+        self.database = database
+        self.physical = physical
+        self.file = RecordFile(database.get_physical_path(physical))
+        self.file.check_signature()
+
+        _, reader, _ = self.file.record(FILE_HEADER_SIZE, 'DH')
+        self.item_type = reader.int16()
+        self.revision_count = reader.int16()
+        self.name = database.get_name(reader.name())
+        self.first_revision = reader.int16()
+        self.data_extension = reader.string(2).lower()
+        self.first_revision_offset = reader.int32()
+        self.last_revision_offset = reader.int32()
+
+    @property
+    def is_project(self):
+        return self.item_type == PROJECT_ITEM
+
+    def close(self):
+        """
+        Close the record file of the item.
+        """
+
+        self.file.close()
+
+    def get_data_path(self):
+        """
+        Get the path of the entries file of a project, or of the data file of a file.
+        """
+
+        return self.database.get_physical_path(self.physical) + '.' + self.data_extension
+
+    def revisions(self):
+        """
+        Iterate over the revisions of the item, newest first.
+
+        Yields Revision instances.
+        """
+
+        offset = self.last_revision_offset
+
+        while offset > 0:
+            _, reader, _ = self.file.record(offset, 'EL')
+            offset = reader.int32()
+            revision = Revision(action=reader.int16(), version=reader.int16(), date=reader.datetime())
+            revision.user = reader.string(32)
+            revision.label = reader.string(32) or None
+            comment_offset = reader.int32()
+            label_comment_offset = reader.int32()
+            comment_length = reader.int16()
+            label_comment_length = reader.int16()
+
+            if revision.action == LABEL:
+                comment_offset, comment_length = label_comment_offset, label_comment_length
+
+            if comment_length > 0 and comment_offset > 0:
+                _, comment_reader, _ = self.file.record(comment_offset)
+                revision.comment = comment_reader.string(comment_length) or None
+
+            action = revision.action
+
+            if action in (LABEL, CREATE_PROJECT, ADD_PROJECT, ADD_FILE, DELETE_PROJECT, DELETE_FILE, RECOVER_PROJECT, RECOVER_FILE, CREATE_FILE):
+                revision.name = self.database.get_name(reader.name())
+                revision.physical = reader.string(10)
+            elif action in (DESTROY_PROJECT, DESTROY_FILE):
+                revision.name = self.database.get_name(reader.name())
+                reader.skip(2)
+                revision.physical = reader.string(10)
+            elif action in (RENAME_PROJECT, RENAME_FILE):
+                revision.name = self.database.get_name(reader.name())
+                revision.old_name = self.database.get_name(reader.name())
+                revision.physical = reader.string(10)
+            elif action in (MOVE_FROM, MOVE_TO):
+                revision.project = reader.string(260)
+                revision.name = self.database.get_name(reader.name())
+                revision.physical = reader.string(10)
+            elif action == SHARE_FILE:
+                revision.project = reader.string(260)
+                revision.name = self.database.get_name(reader.name())
+            elif action == BRANCH_FILE:
+                revision.name = self.database.get_name(reader.name())
+                revision.physical = reader.string(10)
+            elif action == EDIT_FILE:
+                revision.delta_offset = reader.int32()
+                reader.skip(4)
+                revision.project = reader.string(260)
+
+            yield revision
+
+    def entries(self):
+        """
+        Get the entries of a project.
+
+        Returns a list of Entry instances.
+        """
+
+        entries_file = RecordFile(self.get_data_path())
+
+        try:
+            result = []
+
+            for signature, reader in entries_file.records():
+                if signature != 'JP':
+                    continue
+
+                item_type = reader.int16()
+                flags = reader.int16()
+                name = self.database.get_name(reader.name())
+                pinned_version = reader.int16()
+                physical = reader.string(10)
+                result.append(Entry(name, physical, item_type == PROJECT_ITEM, bool(flags & DELETED_ENTRY), pinned_version))
+
+            return result
+        finally:
+            entries_file.close()
+
+    def content(self, version=None):
+        """
+        Get the content of a file at the specified version (the latest one if version is None).
+
+        Returns None if the version cannot be rebuilt from this file (for instance, if it predates a branch).
+        """
+
+        data_file = RecordFile(self.get_data_path())
+
+        try:
+            # The first delta reads the mapped file itself: only the ranges it copies are read.
+            content = data_file.data
+
+            if version is not None:
+                for revision in self.revisions():
+                    if revision.version <= version:
+                        break
+
+                    if revision.action == EDIT_FILE:
+                        content = self.apply_delta(revision.delta_offset, content)
+                    elif revision.action in (CREATE_FILE, BRANCH_FILE, CREATE_BRANCH):
+                        return None
+                else:
+                    return None
+
+            return content[:]
+        finally:
+            data_file.close()
+
+    def apply_delta(self, offset, content):
+        """
+        Rebuild the previous content of a file from its current content and the reverse delta at the specified offset.
+        """
+
+        _, reader, _ = self.file.record(offset, 'FD')
+        result = []
+
+        while True:
+            command = reader.int16()
+            reader.skip(2)
+            delta_offset = reader.int32()
+            length = reader.int32()
+
+            if command == DELTA_WRITE_LOG:
+                result.append(reader.read(length))
+            elif command == DELTA_WRITE_SUFFIX:
+                result.append(content[delta_offset:delta_offset + length])
+            elif command == DELTA_STOP:
+                break
+            else:
+                raise FormatError('Invalid delta command (%d) at offset %d of %s' % (command, offset, self.file.path))
+
+        return ''.join(result)
+
+class Database(object):
+    """
+    A read-only view of a VSS database on disk.
+    """
+
+    def __init__(self, repository_path):
+        """
+        Open the database of the specified repository (the folder that holds srcsafe.ini).
+        """
+
+        self.repository_path = repository_path
+        self.data_path = os.path.join(repository_path, 'data')
+        self.__names = None
+        self.__projects = {}
+
+        names_path = os.path.join(self.data_path, 'names.dat')
+
+        if os.path.isfile(names_path):
+            self.__names = RecordFile(names_path)
+
+    def close(self):
+        """
+        Close the database.
+        """
+
+        if self.__names is not None:
+            self.__names.close()
+
+    def get_physical_path(self, physical):
+        """
+        Get the path of the record file of the specified physical name.
+        """
+
+        physical = physical.lower()
+        path = os.path.join(self.data_path, physical[0], physical)
+
+        if not os.path.exists(path) and os.path.exists(path.upper()):
+            return os.path.join(self.data_path, physical[0].upper(), physical.upper())
+
+        return path
+
+    def get_name(self, name):
+        """
+        Get the long name of an item name read by Reader.name.
+        """
+
+        flags, short_name, offset = name
+
+        if offset <= 0 or self.__names is None:
+            return short_name
+
+        _, reader, end = self.__names.record(offset, 'SN')
+        count = reader.int16()
+        reader.skip(2)
+        base = reader.offset + count * 4
+
+        for _ in range(count):
+            kind = reader.int16()
+            name_offset = reader.int16()
+
+            if kind == LONG_NAME_KIND:
+                return Reader(self.__names.data, base + name_offset).string(end - base - name_offset)
+
+        return short_name
+
+    def item(self, physical):
+        """
+        Open the item with the specified physical name.
+        """
+
+        return Item(self, physical)
+
+    def get_entries(self, physical):
+        """
+        Get the entries of the project with the specified physical name that are not deleted, in a dict indexed by their
+        lowercase name. Returns None if the item is a file.
+
+        The entries of a project are read once, until its record file changes (every change of the project adds a
+        revision to it).
+        """
+
+        info = os.stat(self.get_physical_path(physical))
+        stamp = (info.st_size, info.st_mtime)
+        cached = self.__projects.get(physical)
+
+        if cached is None or cached[0] != stamp:
+            item = self.item(physical)
+
+            try:
+                entries = None
+
+                if item.is_project:
+                    entries = dict((entry.name.lower(), entry) for entry in item.entries() if not entry.deleted)
+            finally:
+                item.close()
+
+            cached = self.__projects[physical] = (stamp, entries)
+
+        return cached[1]
+
+    def find(self, path):
+        """
+        Find the item at the specified VSS path.
+
+        Returns an Item, or None if there is no such item.
+        """
+
+        components = [component for component in path.strip().lstrip('$').split('/') if component]
+        physical = ROOT_PHYSICAL
+
+        for component in components:
+            entries = self.get_entries(physical)
+            entry = entries is not None and entries.get(component.lower())
+
+            if not entry:
+                return None
+
+            physical = entry.physical
+
+        return self.item(physical)
+
+    def walk(self, project):
+        """
+        Walk the tree under the specified project.
+
+        Yields (project, subprojects, files) tuples, like parsers.parse_dir.
+        """
+
+        item = self.find(project)
+
+        if item is None:
+            return
+
+        item.close()
+        projects = [(project.rstrip('/') == '$' and '$/' or project.rstrip('/'), item.physical)]
+
+        while projects:
+            path, physical = projects.pop(0)
+            entries = self.get_entries(physical)
+
+            if entries is None:
+                continue
+
+            entries = sorted(entries.values(), key=lambda entry: entry.name.lower())
+            subprojects = [(parsers.join(path, entry.name), entry.physical) for entry in entries if entry.is_project]
+
+            yield path, [subproject for subproject, _ in subprojects], [entry.name for entry in entries if not entry.is_project]
+
+            projects[:0] = subprojects
+
+ACTION_TEMPLATES = {
+    LABEL: 'Labeled',
+    CREATE_PROJECT: 'Created',
+    ADD_PROJECT: '$%(name)s added',
+    ADD_FILE: '%(name)s added',
+    DESTROY_PROJECT: '$%(name)s destroyed',
+    DESTROY_FILE: '%(name)s destroyed',
+    DELETE_PROJECT: '$%(name)s deleted',
+    DELETE_FILE: '%(name)s deleted',
+    RECOVER_PROJECT: '$%(name)s recovered',
+    RECOVER_FILE: '%(name)s recovered',
+    RENAME_PROJECT: '$%(old_name)s renamed to $%(name)s',
+    RENAME_FILE: '%(old_name)s renamed to %(name)s',
+    MOVE_FROM: '$%(name)s moved from %(project)s',
+    MOVE_TO: '$%(name)s moved to %(project)s',
+    SHARE_FILE: '%(name)s shared',
+    BRANCH_FILE: '%(name)s branched',
+    CREATE_FILE: 'Created',
+    EDIT_FILE: 'Checked in %(project)s',
+    CREATE_BRANCH: 'Branched at version %(version)d',
+    ROLLBACK: 'Rolled back',
+}
+
+def format_revision(revision):
+    """
+    Format a revision the way the History command displays it.
+    """
+
+    lines = ['*****************  Version %d   *****************' % revision.version]
+
+    if revision.label:
+        lines.append('Label: "%s"' % revision.label)
+
+    date = revision.date
+    hour = date.hour % 12 or 12
+    lines.append('User: %-12s Date: %2d/%02d/%02d   Time: %2d:%02d%s' % (revision.user, date.month, date.day, date.year % 100, hour, date.minute, date.hour < 12 and 'a' or 'p'))
+    lines.append(ACTION_TEMPLATES.get(revision.action, 'Unknown action (%d)' % revision.action) % dict((name, getattr(revision, name) or '') for name in Revision.__slots__))
+
+    if revision.comment:
+        lines.append('%s: %s' % (revision.action == LABEL and 'Label comment' or 'Comment', revision.comment))
+
+    return '\n'.join(lines) + '\n\n'
+
+class NativeVSS(VSS):
+    """
+    A VSS class that reads the database files directly for the Dir, History, Properties, View and Get commands.
+
+    Commands (or options) that cannot be served from the database files are passed to ss.exe: this includes all the
+    commands that modify the database.
+    """
+
+    def __init__(self, repository_path=None, ss_path=None, **kwargs):
+        """
+        Create a NativeVSS instance attached to a specified repository_path repository.
+
+        Other keyword arguments are passed to the VSS constructor.
+        """
+
+        super(NativeVSS, self).__init__(repository_path, ss_path, **kwargs)
+
+        self.database = Database(repository_path)
+
+    def dir(self, path, **options):
+        """
+        Lists the specified project, like the VSS Dir command.
+
+        Returns the listing, in the format of ss.exe.
+        """
+
+        if [option for option in options if not option in ('recursive', 'output', 'ignore')]:
+            return super(NativeVSS, self).dir(path, **options)
+
+        lines = []
+        count = 0
+
+        for project, subprojects, files in self.database.walk(path):
+            lines.append('%s:' % project)
+            lines.extend('$' + subproject.rsplit('/', 1)[-1] for subproject in subprojects)
+            lines.extend(files)
+            lines.append('')
+            count += len(subprojects) + len(files)
+
+            if not options.get('recursive'):
+                break
+
+        if not lines:
+            return super(NativeVSS, self).dir(path, **options)
+
+        lines.append('%d item(s)' % count)
+
+        return '\n'.join(lines) + '\n'
+
+    def history(self, items, **options):
+        """
+        Lists the history of the specified item, like the VSS History command.
+
+        Returns the history, in the format of ss.exe.
+        """
+
+        if isinstance(items, list):
+            if len(items) != 1:
+                return super(NativeVSS, self).history(items, **options)
+
+            items = items[0]
+
+        if [option for option in options if not option in ('output', 'ignore')]:
+            return super(NativeVSS, self).history(items, **options)
+
+        item = self.database.find(items)
+
+        if item is None:
+            return super(NativeVSS, self).history(items, **options)
+
+        try:
+            return ''.join(format_revision(revision) for revision in item.revisions())
+        finally:
+            item.close()
+
+    def properties(self, items, **options):
+        """
+        Displays the properties of the specified item, like the VSS Properties command.
+
+        Returns the properties.
+        """
+
+        if isinstance(items, list):
+            if len(items) != 1:
+                return super(NativeVSS, self).properties(items, **options)
+
+            items = items[0]
+
+        if [option for option in options if not option in ('output', 'ignore')]:
+            return super(NativeVSS, self).properties(items, **options)
+
+        item = self.database.find(items)
+
+        if item is None:
+            return super(NativeVSS, self).properties(items, **options)
+
+        try:
+            lines = [
+                '%s:  %s' % (item.is_project and 'Project' or 'File', items),
+                '  Physical: %s' % item.physical,
+                '  Latest Version: %d' % item.revision_count,
+            ]
+
+            if not item.is_project:
+                lines.append('  Size: %d bytes' % os.path.getsize(item.get_data_path()))
+
+            return '\n'.join(lines) + '\n'
+        finally:
+            item.close()
+
+    def __get_content(self, fname, options):
+        """
+        Get the content of a file at the version given in options, or None if it cannot be read from the database.
+        """
+
+        if [option for option in options if not option in ('version_number', 'output', 'ignore', 'get_folder')]:
+            return None
+
+        item = self.database.find(fname)
+
+        if item is None:
+            return None
+
+        try:
+            if item.is_project:
+                return None
+
+            version = options.get('version_number')
+
+            return item.content(version is not None and int(version) or None)
+        finally:
+            item.close()
+
+    def view(self, fname, **options):
+        """
+        Displays the content of the specified file, like the VSS View command.
+
+        Returns the content of the file.
+        """
+
+        content = self.__get_content(fname, options)
+
+        if content is None:
+            return super(NativeVSS, self).view(fname, **options)
+
+        return content
+
+    def get(self, items, **options):
+        """
+        Gets a copy of a single file into get_folder, like the VSS Get command.
+
+        Other gets are passed to ss.exe.
+
+        Returns the standard output.
+        """
+
+        if isinstance(items, list) and len(items) == 1:
+            items = items[0]
+
+        content = not isinstance(items, list) and 'get_folder' in options and self.__get_content(items, options)
+
+        if content is None or content is False:
+            return super(NativeVSS, self).get(items, **options)
+
+        destination = os.path.join(options['get_folder'], items.rstrip('/').rsplit('/', 1)[-1])
+
+        if os.path.exists(destination):
+            os.chmod(destination, 0600)
+            os.remove(destination)
+
+        with open(destination, 'wb') as f:
+            f.write(content)
+
+        os.chmod(destination, 0444)
+
+        return ''
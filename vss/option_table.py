@@ -0,0 +1,304 @@
+"""
+The compiled table of the ss.exe command line options.
+"""
+
+import itertools
+import threading
+
+DEFAULT_CACHE_SIZE = 1024
+
+# Options that every command accepts.
+COMMON_SWITCHES = '?HIOQY'
+
+# The option name, the switch it belongs to, and either its command line template or a dict of its valid values.
+OPTIONS = [
+    ('number', '#', '-#{param}'),
+    ('help', '?', '-?'),
+    ('format', 'B', {
+        'binary': '-B',
+        'text': '-B-',
+    }),
+    ('base_version_number', 'B', '-B{param}'),
+    ('base_version_date', 'B', '-B{param}'),
+    ('base_version_label', 'B', '-Bl{param}'),
+    ('comment_text', 'C', '-C"{param}"'),
+    ('comment_no_text', 'C', '-C-'),
+    ('comment_file', 'C', '-C@{param}'),
+    ('comment_default', 'C', '-C?'),
+    ('case_sensitive', 'C', '-C'),
+    ('display', 'D', '-D'),
+    ('display_not_last', 'D', '-D-'),
+    ('display_standard_width', 'D', '-DS{param}'),
+    ('display_unix_width', 'D', '-DU{param}'),
+    ('display_visual_width', 'D', '-DV{param}'),
+    ('display_context', 'D', '-DX{param}'),
+    ('display_no_context', 'D', '-DX-'),
+    ('extended', 'E', '-E'),
+    ('files_display', 'F', {
+        True: '-F',
+        False: '-F-',
+    }),
+    ('get_local', 'G', {
+        True: '-G',
+        False: '-G-',
+    }),
+    ('get_file_compare', 'G', {
+        'content': '-GCC',
+        'datetime': '-GCD',
+        'checksum': '-GCK',
+    }),
+    ('get_force_dir', 'G', {
+        True: '-GF',
+        False: '-GF-',
+    }),
+    ('get_folder', 'G', '-GL{param}'),
+    ('get_eol', 'G', {
+        'lf': '-GN',
+        'cr': '-GR',
+        'crlf': '-GRN',
+    }),
+    ('get_datetime', 'G', {
+        'current': '-GTC',
+        'modified': '-GTM',
+        'checkin': '-GTU',
+    }),
+    ('get_dialog', 'G', '-GWA'),
+    ('get_merge_files', 'G', '-GWM'),
+    ('get_replace_files', 'G', '-GWR'),
+    ('get_skip_files', 'G', '-GWS'),
+    ('help_online', 'H', '-H'),
+    ('ignore', 'I', {
+        'selected': '-I',
+        'all': '-I-',
+        'yes': '-I-Y',
+        'no': '-I-N',
+        'case': '-IC',
+        'eol': '-IE',
+        'small': '-IS',
+        'whitespace': '-IW',
+    }),
+    ('keep_checked_out', 'K', {
+        True: '-K',
+        False: '-K-',
+    }),
+    ('label', 'L', '-L{param}'),
+    ('local', 'L', '-L'),
+    ('no_local', 'L', '-L-'),
+    ('exclusive_checkouts', 'M', {
+        True: '-M-',
+        False: '-M',
+    }),
+    ('file_name_mode', 'N', {
+        'default': '-N',
+        'long': '-NL',
+        'short': '-NS',
+    }),
+    ('output', 'O', {
+        'all': '-O',
+        'error': '-O-',
+        'disable': '-0&-',
+    }),
+    ('output_file', 'O', '-O@{param}'),
+    ('project', 'P', {
+        'current': '-P',
+    }),
+    ('project_name', 'P', '-P{param}'),
+    ('quiet', 'Q', '-Q'),
+    ('recursive', 'R', '-R'),
+    ('smart_mode', 'S', {
+        True: '-S',
+        False: '-S-',
+    }),
+    ('user', 'U', {
+        'current': '-U',
+    }),
+    ('user_name', 'U', '-U{param}'),
+    ('version_number', 'V', '-V{param}'),
+    ('version_date', 'V', '-Vd{param}'),
+    ('version_label', 'V', '-Vl{param}'),
+    ('working_copy', 'W', {
+        'read_write': '-W',
+        'read_only': '-W-',
+    }),
+    ('vss_user_name', 'Y', '-Y{param}'),
+]
+
+# The switches that each command accepts, besides the common ones.
+COMMANDS = {
+    'About': '',
+    'Add': 'BCDKNRW',
+    'Branch': 'CN',
+    'Checkin': 'CGKNPRW',
+    'Checkout': 'CGMNPRV',
+    'Cloak': '',
+    'Comment': 'CNV',
+    'Copy': 'N',
+    'CP': '',
+    'Create': 'CNS',
+    'Decloak': '',
+    'Delete': 'NS',
+    'Deploy': 'NRV',
+    'Destroy': 'N',
+    'Diff': 'BDNV',
+    'Dir': '#DEFNRV',
+    'Filetype': 'BN',
+    'FindinFiles': 'CENR',
+    'Get': 'GNRVW',
+    'Help': '',
+    'History': '#BDFLNRUV',
+    'Label': 'CLNV',
+    'Links': 'BN',
+    'Locate': '',
+    'Merge': 'CGNV',
+    'Move': 'N',
+    'Password': '',
+    'Paths': 'N',
+    'Physical': 'N',
+    'Pin': 'NV',
+    'Project': '',
+    'Properties': 'CNR',
+    'Purge': 'N',
+    'Recover': 'N',
+    'Rename': 'NS',
+    'Rollback': 'NV',
+    'Share': 'CEGNRV',
+    'Status': 'NPRU',
+    'Undocheckout': 'GNPR',
+    'Unpin': 'NV',
+    'View': 'NV',
+    'Whoami': '',
+    'Workfold': '',
+}
+
+class OptionTable(object):
+    """
+    Translates options to their VSS format.
+
+    The table is compiled once. Translated options are cached, as the same combinations are used over and over. When the
+    cache exceeds cache_size combinations, the least recently used quarter of them is evicted at once.
+    """
+
+    def __init__(self, options=OPTIONS, commands=COMMANDS, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Compile the specified options and commands tables.
+        """
+
+        self.cache_size = cache_size
+        self.__options = {}
+        self.__commands = {}
+        self.__cache = {}
+        self.__used = {}
+        self.__clock = itertools.count()
+        self.__lock = threading.Lock()
+
+        for name, switch, entry in options:
+            if isinstance(entry, dict):
+                self.__options[name] = (switch, None, dict(entry))
+            else:
+                self.__options[name] = (switch, entry, None)
+
+        for command, switches in commands.items():
+            switches = frozenset(COMMON_SWITCHES + switches)
+            self.__commands[command] = frozenset(name for name, (switch, _, _) in self.__options.items() if switch in switches)
+
+    def get_options(self, command):
+        """
+        Get the names of the options that apply to the specified command.
+        """
+
+        if not command in self.__commands:
+            raise ValueError('Invalid command name (%s)' % repr(command))
+
+        return self.__commands[command]
+
+    def translate(self, command, options):
+        """
+        Convert options to their VSS format, checking that they apply to the specified command.
+
+        If command is None, options are not checked against any command.
+
+        Returns a list of command line arguments.
+        """
+
+        if self.cache_size <= 0:
+            return self.__translate(command, options)
+
+        try:
+            key = (command, frozenset((name, type(value), value) for name, value in options.iteritems()))
+        except TypeError:
+            try:
+                key = (command, frozenset((name, type(value), isinstance(value, list) and tuple(value) or value) for name, value in options.iteritems()))
+            except TypeError:
+                return self.__translate(command, options)
+
+        result = self.__cache.get(key)
+
+        if result is None:
+            result = tuple(self.__translate(command, options))
+
+            with self.__lock:
+                self.__cache[key] = result
+                self.__used[key] = next(self.__clock)
+
+                if len(self.__cache) > self.cache_size:
+                    self.__evict()
+        else:
+            self.__used[key] = next(self.__clock)
+
+        return list(result)
+
+    def __evict(self):
+        """
+        Evict the least recently used combinations from the cache, down to three quarters of cache_size.
+
+        Must be called with the lock held.
+        """
+
+        count = len(self.__used) - self.cache_size * 3 / 4
+
+        for key in sorted(self.__used, key=self.__used.get)[:count]:
+            self.__cache.pop(key, None)
+            self.__used.pop(key, None)
+
+    def __translate(self, command, options):
+        """
+        Convert options to their VSS format, without caching.
+        """
+
+        result = []
+        applicable_options = None
+
+        if command is not None:
+            applicable_options = self.get_options(command)
+
+        for option, value in sorted(options.items()):
+
+            if not option in self.__options:
+                raise ValueError('Invalid option name (%s)' % repr(option))
+
+            if applicable_options is not None and not option in applicable_options:
+                raise ValueError('Option %s does not apply to the %s command' % (repr(option), command))
+
+            switch, template, values = self.__options[option]
+
+            if values is not None:
+                if not isinstance(value, list):
+                    value = [value]
+
+                for v in value:
+                    if not v in values:
+                        raise ValueError('Invalid option value for %s (%s)' % (repr(option), repr(v)))
+
+                    result.append(values[v])
+
+            elif isinstance(value, basestring):
+                result.append(template.replace('{param}', value))
+            elif isinstance(value, bool):
+                if value:
+                    result.append(template.replace('{param}', ''))
+            elif value is not None:
+                result.append(template.replace('{param}', str(value)))
+
+        return result
+
+option_table = OptionTable()
@@ -0,0 +1,162 @@
+"""
+Run recursive VSS commands in parallel over a project tree.
+"""
+
+from vss import VSS
+
+import parsers
+
+import os
+import subprocess
+import multiprocessing
+import multiprocessing.pool
+
+DEFAULT_UNIT_SIZE = 200
+
+class ParallelError(Exception):
+    """
+    Raised when some work units of a parallel command failed.
+    """
+
+    def __init__(self, errors, output):
+        """
+        Create the error from the errors of the failed units (a dict that maps VSS project paths to the
+        subprocess.CalledProcessError of the command or to the exception that prevented it from running) and the
+        aggregated output of all the units.
+        """
+
+        Exception.__init__(self, '%d work unit(s) failed: %s' % (len(errors), ', '.join(sorted(errors))))
+
+        self.errors = errors
+        self.output = output
+
+def get_tree(vss, project):
+    """
+    Discover the tree under the specified project with a single recursive Dir command.
+
+    Returns a dict that maps each project to a (subprojects, files) tuple.
+    """
+
+    return dict((path, (subprojects, files)) for path, subprojects, files in parsers.parse_dir(vss.dir(project, recursive=True)))
+
+def partition(tree, project, unit_size=DEFAULT_UNIT_SIZE):
+    """
+    Partition the specified project tree into work units of at most unit_size files each, where possible.
+
+    The tree is split top-down: a project whose whole subtree is too big is split into a non-recursive unit for its own
+    files and the units of its subprojects. A project without subprojects is a single unit, whatever its size, and
+    small sibling projects are not merged: units are not balanced. Instead, they are returned biggest first, so that a
+    pool taking them in order keeps its workers busy until the end (longest processing time first).
+
+    Returns a list of (project, recursive, size) tuples.
+    """
+
+    sizes = {}
+
+    def size(path):
+        if not path in sizes:
+            subprojects, files = tree.get(path, ([], []))
+            sizes[path] = len(files) + sum(size(subproject) for subproject in subprojects)
+
+        return sizes[path]
+
+    units = []
+    paths = [project]
+
+    while paths:
+        path = paths.pop()
+        subprojects, files = tree.get(path, ([], []))
+
+        if size(path) <= unit_size or not subprojects:
+            units.append((path, True, size(path)))
+        else:
+            if files:
+                units.append((path, False, len(files)))
+
+            paths.extend(subprojects)
+
+    return sorted(units, key=lambda unit: unit[2], reverse=True)
+
+def get_local_folder(project, root_project, local_path):
+    """
+    Get the local folder that matches project when root_project is mapped to local_path.
+    """
+
+    relative_path = project[len(root_project.rstrip('/')):].strip('/')
+
+    if not relative_path:
+        return local_path
+
+    return os.path.join(local_path, *relative_path.split('/'))
+
+def _run_unit(args):
+    """
+    Run a single work unit.
+
+    Returns a (project, argv, output, returncode, error) tuple: error is the exception that prevented the command from
+    running, if any. Failures are returned rather than raised, so that they do not abort the other units.
+    """
+
+    repository_path, ss_path, command, project, recursive, folder, options = args
+
+    try:
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                if not os.path.isdir(folder):
+                    raise
+
+        return project, None, getattr(VSS(repository_path, ss_path), command)(project, recursive=recursive, get_folder=folder, **options), 0, None
+    except subprocess.CalledProcessError, ex:
+        # CalledProcessError instances cannot be pickled back from worker processes.
+        return project, ex.cmd, ex.output, ex.returncode, None
+    except Exception, ex:
+        return project, None, None, None, ex
+
+def run(repository_path, vss_project_path, local_path, command, options, ss_path=None, workers=None, unit_size=DEFAULT_UNIT_SIZE, processes=False):
+    """
+    Run the specified VSS command (the name of a VSS method, like 'get') over a project tree, in parallel.
+
+    The tree is discovered with a single Dir command, partitioned into work units of about unit_size files and the units
+    are run by a pool of workers threads (or processes, if processes is True). Each unit writes into the matching
+    subfolder of local_path.
+
+    Returns the aggregated standard output. If some units failed (or could not run), a ParallelError is raised once all
+    the units completed.
+    """
+
+    vss = VSS(repository_path, ss_path)
+    units = partition(get_tree(vss, vss_project_path), vss_project_path, unit_size)
+    args = [
+        (repository_path, vss.ss_path, command, project, recursive, get_local_folder(project, vss_project_path, local_path), options)
+        for project, recursive, _ in units
+    ]
+
+    pool = (processes and multiprocessing.Pool or multiprocessing.pool.ThreadPool)(workers or multiprocessing.cpu_count())
+
+    try:
+        results = dict((result[0], result[1:]) for result in pool.imap_unordered(_run_unit, args))
+    finally:
+        pool.close()
+        pool.join()
+
+    output = []
+    errors = {}
+
+    for project in sorted(results):
+        cmd, unit_output, returncode, error = results[project]
+
+        output.append(unit_output or '')
+
+        if error is not None:
+            errors[project] = error
+        elif returncode:
+            errors[project] = subprocess.CalledProcessError(returncode, cmd, output=unit_output)
+
+    output = ''.join(output)
+
+    if errors:
+        raise ParallelError(errors, output)
+
+    return output
@@ -0,0 +1,85 @@
+"""
+A VSS class that returns parsed results instead of the raw output of the listing commands.
+"""
+
+from vss import VSS
+
+import parsers
+
+class ParsingVSS(VSS):
+    """
+    A VSS class whose Dir, Properties, Links, Paths and Status commands return parsed results (see parsers).
+
+    Within a streaming block, the output goes to the sink: these commands then raise a sinks.StreamingError.
+    """
+
+    def dir(self, path, **options):
+        """
+        Calls the VSS Dir command for the specified path.
+
+        Returns a parsers.DirListing.
+        """
+
+        return parsers.parse_dir_listing(super(ParsingVSS, self).dir(path, **options))
+
+    def iter_dir(self, path, **options):
+        """
+        Calls the VSS Dir command for the specified path in a background thread (see VSS.iter_output).
+
+        Yields parsers.DirEntry instances as the output comes, without holding the whole listing.
+        """
+
+        # The raw output is streamed: ParsingVSS.dir would parse it, which streaming forbids.
+        return parsers.iter_dir(self.iter_output(VSS.dir, path, **options))
+
+    def properties(self, items, **options):
+        """
+        Calls the VSS Properties command for the specified items.
+
+        Returns a list of parsers.Properties instances.
+        """
+
+        return parsers.parse_properties(super(ParsingVSS, self).properties(items, **options))
+
+    def links(self, items, **options):
+        """
+        Calls the VSS Links command for the specified items.
+
+        Returns a list of parsers.TreeEntry instances.
+        """
+
+        return parsers.parse_tree(super(ParsingVSS, self).links(items, **options))
+
+    def paths(self, files, **options):
+        """
+        Calls the VSS Paths command for the specified files.
+
+        Returns a list of parsers.TreeEntry instances.
+        """
+
+        return parsers.parse_tree(super(ParsingVSS, self).paths(files, **options))
+
+    def status(self, items=None, **options):
+        """
+        Calls the VSS Status command for the specified items.
+
+        Returns a list of parsers.StatusEntry instances. The files listed before any project header are in the project
+        given as items, or next to the file given as items: when several items (or none) are given, their project is not
+        known and they are left out.
+        """
+
+        output = super(ParsingVSS, self).status(items, **options)
+        item = isinstance(items, list) and len(items) == 1 and items[0] or items
+
+        if not isinstance(item, basestring) or not item.startswith('$'):
+            return parsers.parse_status(output)
+
+        project = item.rstrip('/') or '$'
+        entries = parsers.parse_status(output, project)
+        name = project.rsplit('/', 1)[-1].lower()
+
+        # A file lists itself only: its entry is then in its parent project.
+        if entries and not options.get('recursive') and [entry for entry in entries if entry.path.rsplit('/', 1)[-1].lower() != name] == []:
+            entries = parsers.parse_status(output, project.rsplit('/', 1)[0] or '$')
+
+        return entries
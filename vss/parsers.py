@@ -0,0 +1,599 @@
+"""
+Parsers for the output of the Microsoft Visual SourceSafe commands.
+"""
+
+import sinks
+
+import array
+import datetime
+import re
+
+HISTORY_SEPARATOR_RE = re.compile(r'^\*{5,}(?:\s+(.*?))?\s*\*{5,}$')
+HISTORY_VERSION_RE = re.compile(r'^Version\s+(\d+)$')
+HISTORY_USER_RE = re.compile(r'^User:\s*(.*?)\s+Date:\s*(\S+)\s+Time:\s*(\S+)$')
+HISTORY_PROJECT_ACTION_RE = re.compile(r'^(?:Checked in|Labeled|Branched at version \d+ in|Created) (\$/.*)$')
+HISTORY_ACTIONS_RE = [
+    (re.compile(r'^(\S.*?) renamed to (\S.*)$'), 'renamed'),
+    (re.compile(r'^(\S.*?) moved from (\$/.*)$'), 'moved_from'),
+    (re.compile(r'^(\S.*?) moved to (\$/.*)$'), 'moved_to'),
+    (re.compile(r'^(\S.*?) (added|deleted|destroyed|recovered|purged|shared|branched)$'), None),
+    (re.compile(r'^(Checked in) (\$/.*)$'), 'checked_in'),
+    (re.compile(r'^(Rolled back)(?: to version \d+)?$'), 'rolled_back'),
+    (re.compile(r'^(Created)$'), 'created'),
+    (re.compile(r'^(Branched) at version \d+'), 'branched'),
+    (re.compile(r'^(Labeled)'), 'labeled'),
+]
+DATE_RE = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{2,4})$')
+TIME_RE = re.compile(r'^(\d{1,2}):(\d{2})([ap])?$', re.IGNORECASE)
+TREE_LINE_RE = re.compile(r'^(\s*)(\$/\S.*?)(?:\s+\((.*)\))?$')
+PROPERTIES_HEADER_RE = re.compile(r'^(File|Project):\s+(\$/.*)$')
+PROPERTIES_FIELD_RE = re.compile(r'^\s*([A-Za-z][A-Za-z ]*?):\s*(.*?)$')
+PROPERTIES_SIZE_RE = re.compile(r'^(\d+)\s+bytes(?:\s+(\d+)\s+lines)?')
+PROPERTIES_DATE_RE = re.compile(r'^(\S+)\s+(\S+)')
+STATUS_LINE_RE = re.compile(r'^(\S.*?)\s+(\S+)\s+(?:(Exc|Mul)\s+)?(\d{1,2}/\d{1,2}/\d{2,4})\s+(\d{1,2}:\d{2}[ap]?)(?:\s+(.*))?$', re.IGNORECASE)
+
+class HistoryEntry(object):
+    """
+    An entry of the output of a History command.
+    """
+
+    __slots__ = ('version', 'user', 'date', 'action', 'path', 'comment', 'label')
+
+    def __init__(self, version=None, user=None, date=None, action=None, path=None, comment=None, label=None):
+        """
+        Create a history entry.
+        """
+
+        self.version = version
+        self.user = user
+        self.date = date
+        self.action = action
+        self.path = path
+        self.comment = comment
+        self.label = label
+
+    def __repr__(self):
+        return 'HistoryEntry(%s)' % ', '.join('%s=%s' % (name, repr(getattr(self, name))) for name in self.__slots__)
+
+class StatusEntry(object):
+    """
+    A checked out file, as listed by a Status command.
+    """
+
+    __slots__ = ('path', 'user', 'date', 'local_folder', 'exclusive')
+
+    def __init__(self, path=None, user=None, date=None, local_folder=None, exclusive=False):
+        """
+        Create a status entry.
+        """
+
+        self.path = path
+        self.user = user
+        self.date = date
+        self.local_folder = local_folder
+        self.exclusive = exclusive
+
+    def __repr__(self):
+        return 'StatusEntry(%s)' % ', '.join('%s=%s' % (name, repr(getattr(self, name))) for name in self.__slots__)
+
+def parse_dir(output):
+    """
+    Parse the output of a (possibly recursive) Dir command.
+
+    Returns a list of (project, subprojects, files) tuples, in the order the projects are listed. Subprojects are given by
+    their full VSS path.
+
+    output may also be a DirListing, as returned by parsed.ParsingVSS.
+    """
+
+    sinks.check_output(output)
+
+    if isinstance(output, DirListing):
+        return output.to_tree()
+
+    result = []
+    project = None
+
+    for line in output.splitlines():
+        line = line.rstrip()
+
+        if not line:
+            continue
+
+        if line.startswith('$/') and line.endswith(':'):
+            project = (line[:-1], [], [])
+            result.append(project)
+        elif project is None or line.startswith('No items found under') or line.endswith('item(s)'):
+            continue
+        elif line.startswith('$'):
+            project[1].append(join(project[0], line[1:]))
+        else:
+            project[2].append(line)
+
+    return result
+
+def parse_status(output, project=None):
+    """
+    Parse the output of a (possibly recursive) Status command.
+
+    project is the project of the files listed before any project header, if known. output may also be a list of
+    StatusEntry instances, as returned by parsed.ParsingVSS: it is returned as is.
+
+    Returns a list of StatusEntry instances, in the order they are listed.
+    """
+
+    sinks.check_output(output)
+
+    if isinstance(output, list):
+        return output
+
+    result = []
+    dates = {}
+
+    for line in output.splitlines():
+        line = line.rstrip()
+
+        if line.startswith('$/') and line.endswith(':'):
+            project = line[:-1]
+            continue
+
+        match = project is not None and STATUS_LINE_RE.match(line)
+
+        if match:
+            name, user, kind, date, time, local_folder = match.groups()
+
+            if not (date, time) in dates:
+                dates[(date, time)] = parse_datetime(date, time)
+
+            result.append(StatusEntry(join(project, name), user, dates[(date, time)], local_folder, (kind or '').lower() == 'exc'))
+
+    return result
+
+def join(project, name):
+    """
+    Join a VSS project path and an item name.
+    """
+
+    return project.rstrip('/') + '/' + name
+
+def parse_datetime(date, time):
+    """
+    Parse a date and a time as displayed by ss.exe (like '5/12/10' and '2:30p').
+
+    Returns a datetime, or None if the date or the time are not in a known format.
+    """
+
+    date_match = DATE_RE.match(date)
+    time_match = TIME_RE.match(time)
+
+    if not date_match or not time_match:
+        return None
+
+    month, day, year = [int(x) for x in date_match.groups()]
+    hour, minute = int(time_match.group(1)), int(time_match.group(2))
+
+    if year < 100:
+        year += year < 70 and 2000 or 1900
+
+    if time_match.group(3):
+        hour = hour % 12 + (time_match.group(3).lower() == 'p' and 12 or 0)
+
+    try:
+        return datetime.datetime(year, month, day, hour, minute)
+    except ValueError:
+        return None
+
+def iter_history(lines, path=None):
+    """
+    Parse the output of a History command, line by line.
+
+    path is the item the history was requested for: entries that do not name their item are given that path.
+
+    Yields HistoryEntry instances, in the order they are listed.
+    """
+
+    entry = None
+    name = None
+    comment = None
+    dates = {}
+
+    for line in lines:
+        line = line.rstrip()
+        match = line.startswith('*****') and HISTORY_SEPARATOR_RE.match(line)
+
+        if match:
+            if entry is not None:
+                if comment is not None:
+                    entry.comment = '\n'.join(comment).strip()
+
+                yield entry
+
+            entry = HistoryEntry(path=path)
+            name = None
+            comment = None
+            header = match.group(1) or ''
+            version_match = HISTORY_VERSION_RE.match(header)
+
+            if version_match:
+                entry.version = int(version_match.group(1))
+            elif header.startswith('$/'):
+                entry.path = header
+            elif header:
+                name = header
+                entry.path = path and join(path, name) or name
+
+            continue
+
+        if entry is None:
+            continue
+
+        if comment is not None:
+            if line:
+                # The lines are joined once the comment ends, so that long comments take linear time.
+                comment.append(line)
+                continue
+
+            entry.comment = '\n'.join(comment).strip()
+            comment = None
+
+        if not line:
+            continue
+
+        version_match = line.startswith('Version') and HISTORY_VERSION_RE.match(line)
+        user_match = not version_match and line.startswith('User:') and HISTORY_USER_RE.match(line)
+
+        if version_match:
+            entry.version = int(version_match.group(1))
+        elif user_match:
+            entry.user = user_match.group(1)
+            key = user_match.group(2, 3)
+
+            if not key in dates:
+                if len(dates) > 1024:
+                    dates.clear()
+
+                dates[key] = parse_datetime(*key)
+
+            entry.date = dates[key]
+        elif line.startswith('Label:'):
+            entry.label = line[len('Label:'):].strip().strip('"')
+        elif line.startswith('Comment:') or line.startswith('Label comment:'):
+            # A label comment is only kept if the entry has no comment of its own.
+            if line.startswith('Comment:') or entry.comment is None:
+                comment = [line.split(':', 1)[1].strip()]
+                entry.comment = comment[0]
+        elif entry.action is None:
+            entry.action = line
+            project_match = HISTORY_PROJECT_ACTION_RE.match(line)
+
+            if project_match and name:
+                entry.path = join(project_match.group(1), name)
+
+    if entry is not None:
+        if comment is not None:
+            entry.comment = '\n'.join(comment).strip()
+
+        yield entry
+
+def parse_action(action):
+    """
+    Parse the action line of a history entry.
+
+    Returns a (kind, name, argument) tuple, where kind is one of 'added', 'deleted', 'destroyed', 'recovered', 'purged',
+    'shared', 'branched', 'renamed', 'moved_from', 'moved_to', 'checked_in', 'rolled_back', 'created', 'labeled' or None if the action
+    is not known. name is the item the action is about, if the action names one: projects names start with '$'.
+    argument is the new name of a renamed item, the project a moved item came from (moved_from) or went to (moved_to),
+    or the project of a checkin.
+    """
+
+    for regex, kind in HISTORY_ACTIONS_RE:
+        match = regex.match(action or '')
+
+        if match:
+            if kind is None:
+                return match.group(2), match.group(1), None
+
+            if kind in ('renamed', 'moved_from', 'moved_to'):
+                return kind, match.group(1), match.group(2)
+
+            if kind == 'checked_in':
+                return kind, None, match.group(2)
+
+            return kind, None, None
+
+    return None, None, None
+
+class DirEntry(object):
+    """
+    An item listed by a Dir command.
+    """
+
+    __slots__ = ('project', 'name', 'is_project')
+
+    def __init__(self, project, name, is_project=False):
+        """
+        Create a Dir entry for the item name of project.
+        """
+
+        self.project = project
+        self.name = name
+        self.is_project = is_project
+
+    @property
+    def path(self):
+        """
+        The full VSS path of the item.
+        """
+
+        return join(self.project, self.name)
+
+    def __repr__(self):
+        return 'DirEntry(%s)' % ', '.join('%s=%s' % (name, repr(getattr(self, name))) for name in self.__slots__)
+
+class DirListing(object):
+    """
+    The items listed by a (possibly recursive) Dir command, stored in arrays rather than as one object per item.
+
+    Iterating over a listing yields DirEntry instances, created on demand.
+    """
+
+    def __init__(self, projects=None, names=None, parents=None, kinds=None):
+        """
+        Create a listing, empty or from parallel sequences: the names of the items (a list), the indexes of their
+        projects in projects (an 'i' array), and their kinds (a 'b' array: 1 for projects, 0 for files).
+        """
+
+        self.projects = projects or []
+        self.__names = names or []
+        self.__parents = parents or array.array('i')
+        self.__kinds = kinds or array.array('b')
+
+    def append(self, project_index, name, is_project):
+        """
+        Add an item of the project at project_index in projects.
+        """
+
+        self.__names.append(name)
+        self.__parents.append(project_index)
+        self.__kinds.append(is_project and 1 or 0)
+
+    def __len__(self):
+        return len(self.__names)
+
+    def __getitem__(self, index):
+        return DirEntry(self.projects[self.__parents[index]], self.__names[index], self.__kinds[index] == 1)
+
+    def __iter__(self):
+        projects = self.projects
+
+        for name, parent, kind in zip(self.__names, self.__parents, self.__kinds):
+            yield DirEntry(projects[parent], name, kind == 1)
+
+    def files(self):
+        """
+        Get the full VSS paths of the files.
+        """
+
+        projects = self.projects
+
+        return [join(projects[parent], name) for name, parent, kind in zip(self.__names, self.__parents, self.__kinds) if not kind]
+
+    def to_tree(self):
+        """
+        Get the listing in the form returned by parse_dir.
+        """
+
+        tree = [(project, [], []) for project in self.projects]
+
+        for name, parent, kind in zip(self.__names, self.__parents, self.__kinds):
+            if kind:
+                tree[parent][1].append(join(self.projects[parent], name))
+            else:
+                tree[parent][2].append(name)
+
+        return tree
+
+def parse_dir_listing(output):
+    """
+    Parse the output of a (possibly recursive) Dir command into a DirListing.
+    """
+
+    sinks.check_output(output)
+
+    projects = []
+    names = []
+    parents = array.array('i')
+    kinds = array.array('b')
+    project_index = -1
+
+    # The appends are bound once: this loop runs for every line of listings of thousands of items.
+    add_name, add_parent, add_kind = names.append, parents.append, kinds.append
+
+    for line in output.splitlines():
+        line = line.rstrip()
+
+        if not line:
+            continue
+
+        if line[0] == '$':
+            if line[-1] == ':' and line[1:2] == '/':
+                projects.append(line[:-1])
+                project_index += 1
+            elif project_index >= 0:
+                add_name(line[1:])
+                add_parent(project_index)
+                add_kind(1)
+        elif project_index >= 0 and not line.endswith('item(s)') and not line.startswith('No items found under'):
+            add_name(line)
+            add_parent(project_index)
+            add_kind(0)
+
+    return DirListing(projects, names, parents, kinds)
+
+def iter_dir(lines):
+    """
+    Parse the output of a (possibly recursive) Dir command, line by line, like the lines yielded by VSS.iter_output.
+
+    Yields DirEntry instances, in the order they are listed.
+    """
+
+    project = None
+
+    for line in lines:
+        line = line.rstrip()
+
+        if not line:
+            continue
+
+        if line[0] == '$':
+            if line[1:2] == '/' and line[-1] == ':':
+                project = line[:-1]
+            elif project is not None:
+                yield DirEntry(project, line[1:], True)
+        elif project is not None and not line.startswith('No items found under') and not line.endswith('item(s)'):
+            yield DirEntry(project, line, False)
+
+class Properties(object):
+    """
+    The properties of an item, as listed by a Properties command.
+
+    fields holds all the 'Name: value' lines, by name, as they are listed.
+    """
+
+    __slots__ = ('path', 'is_project', 'type', 'size', 'lines', 'version', 'date', 'comment', 'fields')
+
+    def __init__(self, path=None, is_project=False):
+        """
+        Create empty properties for the specified item.
+        """
+
+        self.path = path
+        self.is_project = is_project
+        self.type = None
+        self.size = None
+        self.lines = None
+        self.version = None
+        self.date = None
+        self.comment = None
+        self.fields = {}
+
+    def __repr__(self):
+        return 'Properties(%s)' % ', '.join('%s=%s' % (name, repr(getattr(self, name))) for name in self.__slots__ if name != 'fields')
+
+def parse_properties(output):
+    """
+    Parse the output of a Properties command, for one or several items.
+
+    The version and date are the ones of the latest version (the first column of the Latest section).
+
+    Returns a list of Properties instances, in the order they are listed.
+    """
+
+    sinks.check_output(output)
+
+    result = []
+    properties = None
+    comment = None
+
+    for line in output.splitlines():
+        line = line.rstrip()
+        header = PROPERTIES_HEADER_RE.match(line)
+
+        if header:
+            properties = Properties(header.group(2), header.group(1) == 'Project')
+            result.append(properties)
+            comment = None
+            continue
+
+        if properties is None:
+            continue
+
+        if comment is not None:
+            if line and not PROPERTIES_FIELD_RE.match(line):
+                comment.append(line.strip())
+                properties.comment = '\n'.join(comment)
+                continue
+
+            comment = None
+
+        field = PROPERTIES_FIELD_RE.match(line)
+
+        if not field:
+            continue
+
+        name, value = field.groups()
+
+        if name == 'Comment':
+            comment = value and [value] or []
+            properties.comment = value or None
+        elif name == 'Type':
+            properties.type = value
+        elif name == 'Size':
+            size = PROPERTIES_SIZE_RE.match(value)
+
+            if size:
+                properties.size = int(size.group(1))
+                properties.lines = size.group(2) and int(size.group(2))
+        elif name == 'Version' and properties.version is None:
+            version = value.split(None, 1)
+
+            if version and version[0].isdigit():
+                properties.version = int(version[0])
+        elif name == 'Date' and properties.date is None:
+            date = PROPERTIES_DATE_RE.match(value)
+            properties.date = date and parse_datetime(*date.groups())
+
+        properties.fields.setdefault(name, value)
+
+    return result
+
+class TreeEntry(object):
+    """
+    An item of the tree listed by a Links or Paths command.
+
+    depth is the indentation level of the item (0 for the item the command was run for), parent the path of the item it
+    is listed under, and note the parenthesized remark that follows it, if any.
+    """
+
+    __slots__ = ('path', 'depth', 'parent', 'note')
+
+    def __init__(self, path, depth=0, parent=None, note=None):
+        """
+        Create a tree entry.
+        """
+
+        self.path = path
+        self.depth = depth
+        self.parent = parent
+        self.note = note
+
+    def __repr__(self):
+        return 'TreeEntry(%s)' % ', '.join('%s=%s' % (name, repr(getattr(self, name))) for name in self.__slots__)
+
+def parse_tree(output):
+    """
+    Parse the output of a Links or Paths command: VSS paths indented under the item they are linked to.
+
+    Returns a list of TreeEntry instances, in the order they are listed.
+    """
+
+    sinks.check_output(output)
+
+    result = []
+    stack = []
+
+    for line in output.splitlines():
+        match = TREE_LINE_RE.match(line.rstrip())
+
+        if not match:
+            continue
+
+        indent, path, note = match.groups()
+
+        while stack and len(stack[-1][0]) >= len(indent):
+            stack.pop()
+
+        result.append(TreeEntry(path, len(stack), stack and stack[-1][1] or None, note))
+        stack.append((indent, path))
+
+    return result
@@ -0,0 +1,127 @@
+"""
+Save the files of the indexes, journals and manifests safely.
+"""
+
+import atexit
+import ctypes
+import os
+import sys
+import threading
+
+DEFAULT_SAVE_DELAY = 2
+
+# MoveFileEx flags, from <winbase.h>.
+MOVEFILE_REPLACE_EXISTING = 0x1
+MOVEFILE_WRITE_THROUGH = 0x8
+
+# Writers of the same file must not interleave in the temporary file.
+_write_lock = threading.Lock()
+
+def replace(source, destination):
+    """
+    Rename source to destination, replacing destination atomically if it exists.
+    """
+
+    if sys.platform == 'win32':
+        if not ctypes.windll.kernel32.MoveFileExW(unicode(source), unicode(destination), MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH):
+            raise ctypes.WinError()
+    else:
+        os.rename(source, destination)
+
+def write_file(path, data):
+    """
+    Write data to the file at path, atomically: the file holds either its previous content or data, even if the process
+    crashes while writing.
+
+    data is written to path + '.tmp' first, then that file replaces path.
+    """
+
+    temporary_path = path + '.tmp'
+
+    with _write_lock:
+        with open(temporary_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        replace(temporary_path, path)
+
+class DeferredSave(object):
+    """
+    Coalesces the saves of a file: request schedules a call to save in delay seconds, and the requests made until then
+    are served by that single call.
+
+    The pending save is run when flush is called, and when the interpreter exits. If delay is 0, request saves
+    immediately.
+    """
+
+    def __init__(self, save, delay=DEFAULT_SAVE_DELAY):
+        """
+        Create a deferred save that calls the save callable.
+        """
+
+        self.save = save
+        self.delay = delay
+        self.__lock = threading.Lock()
+        self.__timer = None
+
+    @property
+    def pending(self):
+        """
+        Check whether a save is scheduled.
+        """
+
+        return self.__timer is not None
+
+    def request(self):
+        """
+        Schedule a save, unless one is already scheduled.
+        """
+
+        if self.delay <= 0:
+            self.save()
+            return
+
+        with self.__lock:
+            if self.__timer is not None:
+                return
+
+            with _pending_lock:
+                _pending.add(self)
+
+            self.__timer = threading.Timer(self.delay, self.flush)
+            self.__timer.daemon = True
+            self.__timer.start()
+
+    def flush(self):
+        """
+        Run the scheduled save now, if any.
+        """
+
+        with self.__lock:
+            timer, self.__timer = self.__timer, None
+
+        if timer is None:
+            return
+
+        timer.cancel()
+
+        with _pending_lock:
+            _pending.discard(self)
+
+        self.save()
+
+_pending = set()
+_pending_lock = threading.Lock()
+
+@atexit.register
+def flush_all():
+    """
+    Run all the scheduled saves.
+    """
+
+    with _pending_lock:
+        pending = list(_pending)
+
+    for deferred_save in pending:
+        deferred_save.flush()
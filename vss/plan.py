@@ -0,0 +1,307 @@
+"""
+Record sequences of VSS commands and run them in as few ss.exe invocations as possible.
+"""
+
+import batching
+import option_table
+import sinks
+
+# The VSS methods that take a list of items, and the ss.exe commands they call.
+ITEM_COMMANDS = {
+    'add': 'Add',
+    'checkin': 'Checkin',
+    'checkout': 'Checkout',
+    'comment': 'Comment',
+    'delete': 'Delete',
+    'destroy': 'Destroy',
+    'diff': 'Diff',
+    'filetype': 'Filetype',
+    'get': 'Get',
+    'history': 'History',
+    'label': 'Label',
+    'links': 'Links',
+    'locate': 'Locate',
+    'merge': 'Merge',
+    'paths': 'Paths',
+    'pin': 'Pin',
+    'properties': 'Properties',
+    'purge': 'Purge',
+    'recover': 'Recover',
+    'status': 'Status',
+    'undo_checkout': 'Undocheckout',
+    'unpin': 'Unpin',
+}
+
+# The VSS methods of ITEM_COMMANDS whose items parameter is named files.
+FILE_COMMANDS = frozenset(['add', 'checkin', 'checkout', 'diff', 'merge', 'paths'])
+
+# The VSS methods that run a single ss.exe command: the only ones a plan records.
+COMMAND_METHODS = frozenset(ITEM_COMMANDS) | frozenset([
+    'about', 'branch', 'cloak', 'copy', 'create', 'decloak', 'deploy', 'dir', 'find_in_files', 'help', 'move',
+    'password', 'physical', 'project', 'rename', 'rollback', 'set_current_project', 'set_working_folder', 'share',
+    'view', 'whoami',
+])
+
+# The commands for which a recursive call on a project does everything a call on an item under it does.
+SUBSUMING_COMMANDS = frozenset(['checkin', 'checkout', 'get', 'status', 'undo_checkout'])
+
+def get_key(item):
+    """
+    Get the key of an item: VSS paths are case insensitive.
+    """
+
+    return item.rstrip('/').lower() or '$'
+
+def overlaps(a, b):
+    """
+    Check whether two items may designate the same files. Local paths (not starting with '$') may designate anything.
+    """
+
+    if not a.startswith('$') or not b.startswith('$'):
+        return True
+
+    return a == b or a.startswith(b + '/') or b.startswith(a + '/')
+
+def get_options_key(options, excluded=()):
+    """
+    Get a hashable form of options.
+    """
+
+    return tuple(sorted((name, repr(value)) for name, value in options.items() if not name in excluded))
+
+class Operation(object):
+    """
+    A VSS method call recorded by a Plan.
+    """
+
+    __slots__ = ('method', 'args', 'options')
+
+    def __init__(self, method, args, options):
+        """
+        Create an operation calling method with args and options.
+        """
+
+        self.method = method
+        self.args = args
+        self.options = options
+
+    def __repr__(self):
+        arguments = [repr(arg) for arg in self.args] + ['%s=%s' % (name, repr(value)) for name, value in sorted(self.options.items())]
+
+        return '%s(%s)' % (self.method, ', '.join(arguments))
+
+class Plan(object):
+    """
+    Records calls to the command methods of a VSS instance (COMMAND_METHODS) instead of running them, to run them later
+    in fewer invocations.
+
+    optimize merges the calls of the same command with the same options into multi-item calls, drops repeated calls
+    and the calls covered by a recursive call on a parent project (for SUBSUMING_COMMANDS), and drops the CP and
+    Workfold calls that change nothing. The relative order of calls on overlapping items is kept; calls with local
+    paths, and calls of other commands, are never reordered.
+
+    Used as a context manager, the plan is committed when the block exits without an error.
+    """
+
+    def __init__(self, vss):
+        """
+        Create an empty plan for the specified VSS instance.
+        """
+
+        self.vss = vss
+        self.operations = []
+
+    def __getattr__(self, name):
+        if not name in COMMAND_METHODS or not callable(getattr(self.vss, name, None)):
+            raise AttributeError(name)
+
+        def record(*args, **options):
+            parameter = name in FILE_COMMANDS and 'files' or 'items'
+
+            # The items of item commands are recorded as the single positional argument, as a list. Calls without
+            # items (like status()) are recorded as they are.
+            if name in ITEM_COMMANDS and args and args[0] is not None:
+                args = (isinstance(args[0], list) and list(args[0]) or [str(args[0])],) + args[1:]
+            elif name in ITEM_COMMANDS and not args and options.get(parameter) is not None:
+                items = options.pop(parameter)
+                args = (isinstance(items, list) and list(items) or [str(items)],)
+
+            self.operations.append(Operation(name, args, options))
+
+        return record
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+    def optimize(self):
+        """
+        Get the operations to run in place of the recorded ones.
+        """
+
+        steps = []
+        segment = []
+        current_project = None
+        working_folders = {}
+
+        for operation in self.operations:
+            if operation.method in ITEM_COMMANDS and len(operation.args) == 1:
+                segment.extend((operation.method, item, operation.options) for item in operation.args[0])
+                continue
+
+            steps.extend(self.__optimize_segment(segment))
+            segment = []
+
+            if operation.method == 'set_current_project' and not operation.options:
+                project = get_key(operation.args[0])
+
+                # CP calls with no command in between: only the last one matters.
+                if steps and steps[-1].method == 'set_current_project' and not steps[-1].options:
+                    steps.pop()
+                elif project == current_project:
+                    continue
+
+                current_project = project
+            elif operation.method == 'set_working_folder' and not operation.options:
+                project = len(operation.args) > 1 and operation.args[1] is not None and get_key(operation.args[1]) or current_project
+                folder = operation.args[0]
+
+                if project is not None and working_folders.get(project) == folder:
+                    continue
+
+                working_folders[project] = folder
+            else:
+                # Other commands may rename or move projects.
+                current_project = None
+                working_folders = {}
+
+            steps.append(operation)
+
+        return steps + self.__optimize_segment(segment)
+
+    def count_invocations(self, operations):
+        """
+        Count the ss.exe invocations that running the specified operations takes.
+        """
+
+        count = 0
+
+        for operation in operations:
+            if operation.method in ITEM_COMMANDS and len(operation.args) == 1:
+                base_size = batching.get_argv_size([self.vss.ss_path, ITEM_COMMANDS[operation.method]] + list(option_table.option_table.translate(ITEM_COMMANDS[operation.method], operation.options)))
+                count += len(batching.pack(operation.args[0], self.vss.max_argv_bytes, base_size))
+            else:
+                count += 1
+
+        return count
+
+    def explain(self):
+        """
+        Describe the optimized plan without running it: its operations and the invocations it saves.
+        """
+
+        steps = self.optimize()
+        before = self.count_invocations(self.operations)
+        after = self.count_invocations(steps)
+        lines = [repr(step) for step in steps]
+        lines.append('%d operations, %d invocations instead of %d (%d saved)' % (len(self.operations), after, before, before - after))
+
+        return '\n'.join(lines) + '\n'
+
+    def commit(self):
+        """
+        Run the optimized plan, and clear it.
+
+        Returns the standard output of all the invocations (sinks.STREAMED_OUTPUT within a streaming block).
+        """
+
+        steps = self.optimize()
+        self.operations = []
+        outputs = [getattr(self.vss, step.method)(*step.args, **step.options) for step in steps]
+
+        return sinks.join(output for output in outputs if output is not None)
+
+    def __optimize_segment(self, segment):
+        """
+        Optimize a sequence of single item calls: drop the covered ones, then merge the others.
+
+        segment is a list of (method, item, options) tuples. Returns a list of operations.
+        """
+
+        keys = [get_key(item) for _, item, _ in segment]
+        positions = {}
+        kept = []
+
+        for i, key in enumerate(keys):
+            positions.setdefault(key, []).append(i)
+
+        for i, key in enumerate(keys):
+            # Only calls on the item itself or on a parent project can cover it.
+            parts = key.split('/')
+            candidates = [j for n in xrange(1, len(parts) + 1) for j in positions.get('/'.join(parts[:n]), []) if j != i]
+
+            if not [j for j in candidates if self.__covers(segment, keys, j, i)]:
+                kept.append(i)
+
+        groups = []
+
+        for i in kept:
+            method, item, options = segment[i]
+            key = (method, get_options_key(options))
+
+            # Move the call back to the last call of the same kind, unless it would jump over a call on an overlapping item.
+            for group in reversed(groups):
+                if group[0] == key:
+                    if not keys[i] in group[3]:
+                        group[2].append(item)
+                        group[3].add(keys[i])
+
+                    break
+
+                if [other for other in group[3] if overlaps(other, keys[i])]:
+                    groups.append([key, (method, options), [item], set([keys[i]])])
+                    break
+            else:
+                groups.append([key, (method, options), [item], set([keys[i]])])
+
+        return [Operation(group[1][0], (group[2],), group[1][1]) for group in groups]
+
+    def __covers(self, segment, keys, j, i):
+        """
+        Check whether call j of segment does what call i does, so that call i can be dropped.
+        """
+
+        method, _, options = segment[i]
+        other_method, _, other_options = segment[j]
+
+        if method != other_method or get_options_key(options, ('recursive',)) != get_options_key(other_options, ('recursive',)):
+            return False
+
+        if not keys[i].startswith('$') or not keys[j].startswith('$'):
+            return False
+
+        if keys[i] == keys[j] and bool(options.get('recursive')) == bool(other_options.get('recursive')):
+            # Of identical calls, the first one is kept.
+            covers = j < i
+        elif keys[i] == keys[j] or keys[i].startswith(keys[j] + '/'):
+            # A recursive call on a parent project covers the call, unless a local folder is specified for the items
+            # deeper in the tree.
+            covers = method in SUBSUMING_COMMANDS and bool(other_options.get('recursive')) and (
+                not 'get_folder' in options or keys[i] == keys[j] or keys[i].rsplit('/', 1)[0] == keys[j]
+            )
+        else:
+            covers = False
+
+        if not covers:
+            return False
+
+        # The calls of other commands on overlapping items in between must not be reordered.
+        for k in xrange(min(i, j) + 1, max(i, j)):
+            if segment[k][0] != method or get_options_key(segment[k][2]) != get_options_key(options):
+                if overlaps(keys[k], keys[i]):
+                    return False
+
+        return True
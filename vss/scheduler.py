@@ -0,0 +1,323 @@
+"""
+Schedule VSS commands against shared repositories, retrying the ones that fail because of contention.
+"""
+
+from asynchronous import Future, DEFAULT_CONCURRENCY
+
+import instrumentation
+import timeouts
+
+import bisect
+import heapq
+import itertools
+import random
+import re
+import subprocess
+import threading
+import time
+
+HIGH_PRIORITY = 0
+NORMAL_PRIORITY = 10
+LOW_PRIORITY = 20
+
+DEFAULT_WORKERS = 16
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30
+
+# The messages of ss.exe, and of Windows, for errors caused by other clients holding the database or by the network
+# share: worth retrying later. They are matched against each line of the standard error.
+RETRYABLE_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE | re.MULTILINE) for pattern in (
+        r'^Database is locked\b',
+        r'^The SourceSafe database has been locked\b',
+        r'\bis being used by another process\b',
+        r'\bsharing violation\b',
+        r'^Access to file ".*" denied\b',
+        r'\bThe (specified )?network (name|path) (cannot be found|was not found|is no longer available)\b',
+    )
+]
+
+def classify(error):
+    """
+    Classify an error raised by a VSS command.
+
+    Returns 'retryable' for timeouts and the errors whose standard error matches RETRYABLE_PATTERNS, 'fatal' otherwise.
+    The standard output is not matched: it holds file names and contents.
+    """
+
+    if isinstance(error, timeouts.TimeoutExpired):
+        return 'retryable'
+
+    if isinstance(error, timeouts.Cancelled) or not isinstance(error, subprocess.CalledProcessError):
+        return 'fatal'
+
+    text = getattr(error, 'stderr', None) or ''
+
+    for pattern in RETRYABLE_PATTERNS:
+        if pattern.search(text):
+            return 'retryable'
+
+    return 'fatal'
+
+def get_backoff(attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+    """
+    Get the delay before the specified retry (1 for the first one), in seconds.
+
+    The delay is drawn uniformly under an exponentially growing bound, so that clients that failed together do not
+    retry together.
+    """
+
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+class Job(object):
+    """
+    A VSS command waiting in a Scheduler.
+    """
+
+    __slots__ = ('vss', 'command', 'args', 'options', 'priority', 'future', 'attempts', 'queued_at')
+
+    def __init__(self, vss, command, args, options, priority):
+        """
+        Create a job that calls the specified VSS method on vss.
+        """
+
+        self.vss = vss
+        self.command = command
+        self.args = args
+        self.options = options
+        self.priority = priority
+        self.future = Future()
+        self.attempts = 0
+        self.queued_at = time.time()
+
+class Scheduler(object):
+    """
+    Runs VSS commands with a pool of threads, by order of priority and within a concurrency limit per repository.
+
+    Commands that fail with a retryable error (see classify) are run again after a jittered exponential backoff, up to
+    max_attempts times. When that happens, the concurrency of the repository is halved; it then grows back by one
+    command for every few successes, up to the limit of the repository.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        """
+        Create a scheduler that runs at most workers commands at once, over all the repositories.
+        """
+
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.__condition = threading.Condition()
+        self.__sequence = itertools.count()
+        self.__limits = {}
+        self.__concurrency = {}
+        self.__ready = {}
+        self.__delayed = []
+        self.__running = {}
+        self.__threads = []
+        self.__stopped = False
+        self.__counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'retries': 0}
+        self.__wait_time = {'count': 0, 'total': 0.0, 'max': 0.0, 'histogram': [0] * (len(instrumentation.LATENCY_BUCKETS) + 1)}
+
+    def get_limit(self, repository_path):
+        """
+        Get the maximum number of commands run concurrently for the specified repository.
+        """
+
+        with self.__condition:
+            return self.__limits.get(repository_path, DEFAULT_CONCURRENCY)
+
+    def set_limit(self, repository_path, limit):
+        """
+        Set the maximum number of commands run concurrently for the specified repository.
+        """
+
+        if limit < 1:
+            raise ValueError('Invalid concurrency limit (%s)' % repr(limit))
+
+        with self.__condition:
+            self.__limits[repository_path] = limit
+            self.__concurrency[repository_path] = min(self.__concurrency.get(repository_path, limit), limit)
+            self.__condition.notify_all()
+
+    def submit(self, vss, command, args=(), options=None, priority=NORMAL_PRIORITY):
+        """
+        Queue the specified VSS command (the name of a VSS method, like 'get') to be called on vss with args and options.
+
+        Commands with lower priority values run first. Returns an asynchronous.Future.
+        """
+
+        job = Job(vss, command, tuple(args), options or {}, priority)
+
+        with self.__condition:
+            if self.__stopped:
+                raise RuntimeError('The scheduler was shut down')
+
+            self.__counters['submitted'] += 1
+            self.__push(job)
+
+            while len(self.__threads) < self.workers:
+                thread = threading.Thread(target=self.__work, name='VSSScheduler')
+                thread.daemon = True
+                thread.start()
+                self.__threads.append(thread)
+
+            self.__condition.notify()
+
+        return job.future
+
+    def shutdown(self, wait=True):
+        """
+        Stop the worker threads once the queued commands completed.
+        """
+
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify_all()
+            threads = list(self.__threads)
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def metrics(self):
+        """
+        Get the current state of the scheduler.
+
+        Returns a dict with the queue depth (ready and waiting for a retry) and the running commands of each repository,
+        its current concurrency, the submitted, completed, failed and retried command counters and the statistics of
+        the time commands waited in the queue before running (in seconds, with a histogram over
+        instrumentation.LATENCY_BUCKETS).
+        """
+
+        with self.__condition:
+            repositories = {}
+
+            for repository_path in set(self.__ready) | set(self.__running) | set(job.vss.repository_path for _, _, job in self.__delayed):
+                repositories[repository_path] = {
+                    'ready': len(self.__ready.get(repository_path, [])),
+                    'delayed': len([job for _, _, job in self.__delayed if job.vss.repository_path == repository_path]),
+                    'running': self.__running.get(repository_path, 0),
+                    'concurrency': int(self.__get_concurrency(repository_path)),
+                }
+
+            return dict(self.__counters,
+                queue_depth=sum(len(ready) for ready in self.__ready.values()) + len(self.__delayed),
+                repositories=repositories,
+                wait_time=dict(self.__wait_time, histogram=list(self.__wait_time['histogram'])),
+            )
+
+    def __get_concurrency(self, repository_path):
+        """
+        Get the current concurrency of a repository.
+
+        Must be called with the lock held.
+        """
+
+        return self.__concurrency.get(repository_path, self.__limits.get(repository_path, DEFAULT_CONCURRENCY))
+
+    def __push(self, job):
+        """
+        Queue a job that is ready to run.
+
+        Must be called with the lock held.
+        """
+
+        job.queued_at = time.time()
+        heapq.heappush(self.__ready.setdefault(job.vss.repository_path, []), (job.priority, next(self.__sequence), job))
+
+    def __pop(self):
+        """
+        Take the next job to run: the one with the lowest priority value among the repositories under their concurrency.
+
+        Returns None if there is none. Must be called with the lock held.
+        """
+
+        now = time.time()
+
+        while self.__delayed and self.__delayed[0][0] <= now:
+            self.__push(heapq.heappop(self.__delayed)[2])
+
+        candidates = [
+            (ready[0], repository_path) for repository_path, ready in self.__ready.items()
+            if ready and self.__running.get(repository_path, 0) < int(self.__get_concurrency(repository_path))
+        ]
+
+        if not candidates:
+            return None
+
+        _, repository_path = min(candidates)
+        job = heapq.heappop(self.__ready[repository_path])[2]
+        self.__running[repository_path] = self.__running.get(repository_path, 0) + 1
+
+        wait_time = now - job.queued_at
+        self.__wait_time['count'] += 1
+        self.__wait_time['total'] += wait_time
+        self.__wait_time['max'] = max(self.__wait_time['max'], wait_time)
+        self.__wait_time['histogram'][bisect.bisect_left(instrumentation.LATENCY_BUCKETS, wait_time)] += 1
+
+        return job
+
+    def __work(self):
+        """
+        Run jobs until the scheduler is shut down and its queue is empty.
+        """
+
+        while True:
+            with self.__condition:
+                job = self.__pop()
+
+                while job is None:
+                    if self.__stopped and not any(self.__ready.values()) and not self.__delayed:
+                        return
+
+                    if self.__delayed:
+                        self.__condition.wait(max(self.__delayed[0][0] - time.time(), 0))
+                    else:
+                        self.__condition.wait()
+
+                    job = self.__pop()
+
+            job.attempts += 1
+
+            try:
+                result = getattr(job.vss, job.command)(*job.args, **job.options)
+            except Exception, ex:
+                self.__finish(job, None, ex)
+            else:
+                self.__finish(job, result, None)
+
+    def __finish(self, job, result, error):
+        """
+        Complete a job, or queue it again if it failed with a retryable error.
+        """
+
+        repository_path = job.vss.repository_path
+        retry = error is not None and job.attempts < self.max_attempts and classify(error) == 'retryable'
+
+        with self.__condition:
+            self.__running[repository_path] -= 1
+            limit = self.__limits.get(repository_path, DEFAULT_CONCURRENCY)
+            concurrency = self.__get_concurrency(repository_path)
+
+            if error is None:
+                self.__counters['completed'] += 1
+                self.__concurrency[repository_path] = min(limit, concurrency + 1.0 / concurrency)
+            elif retry:
+                self.__counters['retries'] += 1
+                self.__concurrency[repository_path] = max(1, concurrency / 2)
+                heapq.heappush(self.__delayed, (time.time() + get_backoff(job.attempts, self.base_delay, self.max_delay), next(self.__sequence), job))
+            else:
+                self.__counters['failed'] += 1
+
+            self.__condition.notify_all()
+
+        if retry:
+            return
+
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
@@ -0,0 +1,252 @@
+"""
+Sinks that receive the standard output of ss.exe as it comes, instead of buffering it.
+"""
+
+import os
+import Queue
+import sys
+import threading
+
+CHUNK_SIZE = 64 * 1024
+
+# The number of trailing output bytes kept to report errors.
+TAIL_SIZE = 4096
+
+DEFAULT_QUEUE_SIZE = 1024
+
+class StreamedOutput(str):
+    """
+    The type of STREAMED_OUTPUT.
+    """
+
+# What the commands called within a streaming block return, since their output went to the sink: an empty string, that
+# the parsers refuse (see check_output).
+STREAMED_OUTPUT = StreamedOutput()
+
+class StreamingError(RuntimeError):
+    """
+    Raised when the output of a command called within a streaming block is parsed: it went to the sink.
+    """
+
+def check_output(output):
+    """
+    Raise a StreamingError if output was returned by a command called within a streaming block.
+    """
+
+    if isinstance(output, StreamedOutput):
+        raise StreamingError('The output of the command went to the sink of a streaming block, it cannot be parsed')
+
+def join(outputs):
+    """
+    Concatenate the outputs of several commands.
+
+    Returns STREAMED_OUTPUT if any of them was called within a streaming block.
+    """
+
+    outputs = list(outputs)
+
+    if [output for output in outputs if isinstance(output, StreamedOutput)]:
+        return STREAMED_OUTPUT
+
+    return ''.join(outputs)
+
+class CallbackSink(object):
+    """
+    A sink that calls a callable with each chunk of output.
+    """
+
+    def __init__(self, callback):
+        """
+        Create a sink that calls callback with each chunk.
+        """
+
+        self.callback = callback
+
+    def write(self, data):
+        """
+        Receive a chunk of output.
+        """
+
+        self.callback(data)
+
+    def flush(self):
+        """
+        Nothing to flush.
+        """
+
+        pass
+
+class LineSink(object):
+    """
+    A sink that calls a callable with each complete line of output (line ending included).
+    """
+
+    def __init__(self, callback):
+        """
+        Create a sink that calls callback with each line.
+        """
+
+        self.callback = callback
+        # The chunks of the current line: they are joined once the line ends, so that long lines take linear time.
+        self.__pending = []
+
+    def write(self, data):
+        """
+        Receive a chunk of output.
+        """
+
+        lines = data.split('\n')
+
+        if len(lines) == 1:
+            self.__pending.append(data)
+            return
+
+        self.__pending.append(lines[0])
+        lines[0] = ''.join(self.__pending)
+        self.__pending = [lines.pop()]
+
+        for line in lines:
+            self.callback(line + '\n')
+
+    def flush(self):
+        """
+        Pass the last line, if it has no line ending.
+        """
+
+        line = ''.join(self.__pending)
+        self.__pending = []
+
+        if line:
+            self.callback(line)
+
+class LineQueue(LineSink):
+    """
+    A sink that queues the lines of output to be iterated over from another thread.
+
+    The queue is bounded: the command is paused while the consumer lags behind. Once the producer is done, it must call
+    close, with the error it failed with, if any: the iteration then stops or raises that error.
+    """
+
+    __END = object()
+
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE):
+        """
+        Create a queue of at most maxsize lines.
+        """
+
+        LineSink.__init__(self, self.__put)
+
+        self.__queue = Queue.Queue(maxsize)
+        self.__abandoned = False
+
+    def close(self, error=None):
+        """
+        Mark the end of the output.
+        """
+
+        self.flush()
+        self.__put(error or self.__END)
+
+    def abandon(self):
+        """
+        Stop the iteration early: the remaining output is dropped.
+        """
+
+        self.__abandoned = True
+
+        while True:
+            try:
+                self.__queue.get_nowait()
+            except Queue.Empty:
+                break
+
+    def __iter__(self):
+        while True:
+            item = self.__queue.get()
+
+            if item is self.__END:
+                return
+            elif isinstance(item, Exception):
+                raise item
+
+            yield item
+
+    def __put(self, item):
+        if not self.__abandoned:
+            self.__queue.put(item)
+
+def get_sink(target):
+    """
+    Get a sink for the specified target: a file-like object or a sink (anything with a write method) is used as is, a
+    callable is wrapped in a CallbackSink.
+    """
+
+    if hasattr(target, 'write'):
+        return target
+
+    if callable(target):
+        return CallbackSink(target)
+
+    raise ValueError('Invalid sink (%s)' % repr(target))
+
+def pump(stream, sink, chunk_size=CHUNK_SIZE):
+    """
+    Copy stream to sink, chunk by chunk, as the data becomes available.
+
+    Returns a (tail, size) tuple: the last TAIL_SIZE bytes and the total size of the data.
+    """
+
+    fd = stream.fileno()
+    tail = ''
+    size = 0
+
+    while True:
+        data = os.read(fd, chunk_size)
+
+        if not data:
+            return tail, size
+
+        size += len(data)
+        tail = (tail + data)[-TAIL_SIZE:]
+        sink.write(data)
+
+class ErrorEcho(object):
+    """
+    Copies the standard error of ss.exe to sys.stderr as it comes, from a thread of its own, and keeps it to report
+    errors.
+    """
+
+    def __init__(self, stream):
+        """
+        Start copying stream.
+        """
+
+        self.__stream = stream
+        self.__chunks = []
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __run(self):
+        """
+        Copy the stream until its end.
+        """
+
+        try:
+            for line in iter(self.__stream.readline, ''):
+                self.__chunks.append(line)
+                sys.stderr.write(line)
+                sys.stderr.flush()
+        finally:
+            self.__stream.close()
+
+    def wait(self):
+        """
+        Wait for the end of the stream.
+
+        Returns the whole standard error.
+        """
+
+        self.__thread.join()
+
+        return ''.join(self.__chunks)
@@ -0,0 +1,403 @@
+"""
+A local trigram index of the files of VSS projects, to answer FindinFiles without scanning the database.
+"""
+
+from vss import VSS
+
+import incremental
+import parallel
+import persistence
+import tree_index
+
+import cPickle
+import datetime
+import fnmatch
+import os
+import re
+import threading
+
+# Bigger files are not indexed, nor searched.
+DEFAULT_MAX_FILE_SIZE = 4 * 1024 * 1024
+
+# The FindinFiles options that the index honours: the other ones are left to ss.exe.
+INDEXED_OPTIONS = frozenset(['case_sensitive', 'extended', 'recursive'])
+
+# The wildcards of extended FindinFiles patterns: '*', '?' and character sets like '[a-z]' or '[!0-9]'.
+WILDCARDS_RE = re.compile(r'[*?]|\[!?\]?[^\]]*\]')
+
+# Files with a NUL byte in their first BINARY_SNIFF_SIZE bytes are considered binary and never match.
+BINARY_SNIFF_SIZE = 8192
+
+def get_trigrams(text):
+    """
+    Get the set of the trigrams of a text, case insensitively.
+    """
+
+    text = text.lower()
+
+    return set(text[i:i + 3] for i in xrange(len(text) - 2))
+
+def get_required_literals(pattern, extended=False):
+    """
+    Get the literal strings that any text matching pattern contains.
+
+    pattern is a plain string, or a FindinFiles wildcard pattern if extended is True (see WILDCARDS_RE): the runs
+    between its wildcards are extracted. The result may be empty, which means that any text may match.
+    """
+
+    if not extended:
+        return [pattern]
+
+    return [literal for literal in WILDCARDS_RE.split(pattern) if literal]
+
+def get_matcher(pattern, extended=False, case_sensitive=False):
+    """
+    Get a function that checks whether a line matches pattern, with the semantics of FindinFiles: pattern is a plain
+    string, or a wildcard pattern if extended is True, found anywhere in the line, case insensitively unless
+    case_sensitive is True.
+    """
+
+    if extended:
+        regex = re.compile(fnmatch.translate('*' + pattern + '*'), not case_sensitive and re.IGNORECASE or 0)
+
+        return lambda line: regex.match(line) is not None
+
+    if case_sensitive:
+        return lambda line: pattern in line
+
+    pattern = pattern.lower()
+
+    return lambda line: pattern in line.lower()
+
+def is_in_scope(vss_path, items, recursive=False):
+    """
+    Check whether a file is searched by a FindinFiles command on items: the file itself, its project, or one of its
+    parent projects if recursive is True.
+    """
+
+    key = tree_index.normalize(vss_path)
+    parent = tree_index.normalize(tree_index.get_parent(vss_path))
+
+    return [item for item in items if item == key or item == parent or (recursive and key.startswith(item + '/'))] != []
+
+def is_binary(path):
+    """
+    Check whether a local file looks like a binary file.
+    """
+
+    with open(path, 'rb') as f:
+        return '\0' in f.read(BINARY_SNIFF_SIZE)
+
+class TextIndex(object):
+    """
+    Maps the trigrams of the files of some VSS projects to the files that contain them.
+
+    The content of the files is read from local copies of the projects (as made by functions.sync or functions.get):
+    queries first narrow the candidate files down with the index, then search their local copies.
+
+    Files bigger than max_file_size are skipped: they are listed by skipped_files, and never searched.
+
+    If path is specified, the index is also saved to and loaded from that file.
+    """
+
+    def __init__(self, path=None, max_file_size=DEFAULT_MAX_FILE_SIZE):
+        """
+        Create an empty index.
+        """
+
+        self.path = path
+        self.max_file_size = max_file_size
+        self.__lock = threading.RLock()
+        self.__projects = {}
+        self.__documents = {}
+        self.__ids = {}
+        self.__postings = {}
+        self.__skipped = {}
+        self.__next_id = 0
+
+        if self.path and os.path.isfile(self.path):
+            self.load()
+
+    def add_project(self, vss_project_path, local_path):
+        """
+        Index the files of the local copy of vss_project_path in local_path.
+
+        Later updates look for the changes made since the local copy was synchronized, as recorded by incremental.sync
+        (or since now, if it was not).
+        """
+
+        manifest = incremental.load_manifest(os.path.join(local_path, incremental.MANIFEST_NAME))
+
+        with self.__lock:
+            self.__projects[tree_index.normalize(vss_project_path)] = {
+                'project': vss_project_path,
+                'local_path': local_path,
+                'indexed_at': manifest is not None and manifest['synced_at'] or datetime.datetime.now().replace(microsecond=0),
+            }
+            self.__index_tree(vss_project_path, vss_project_path, local_path)
+
+    def get_project(self, path):
+        """
+        Get the indexed project that contains the specified VSS item, or None.
+        """
+
+        key = tree_index.normalize(path)
+
+        with self.__lock:
+            for project_key, project in self.__projects.items():
+                if key == project_key or key.startswith(project_key + '/'):
+                    return project
+
+    def update(self, vss, fetch=False):
+        """
+        Update the index with the changes made to the indexed projects since they were last indexed, as told by their
+        history.
+
+        If fetch is True, the local copies are brought up to date first with incremental.sync. Otherwise, they must be
+        up to date already.
+        """
+
+        with self.__lock:
+            projects = self.__projects.values()
+
+        for project in projects:
+            if fetch:
+                incremental.sync(vss, project['project'], project['local_path'])
+
+            changes = incremental.get_changes(vss, project['project'], project['indexed_at'])
+            seen = set()
+
+            with self.__lock:
+                for change, path, is_project, _ in changes:
+                    if tree_index.normalize(path) in seen:
+                        continue
+
+                    seen.add(tree_index.normalize(path))
+                    self.remove(path, is_project)
+
+                    if change == 'get':
+                        local_path = parallel.get_local_folder(path, project['project'], project['local_path'])
+
+                        if is_project:
+                            self.__index_tree(path, project['project'], project['local_path'])
+                        elif os.path.isfile(local_path):
+                            self.__index_file(path, local_path)
+
+                # The dates of the history, rather than the local clock, tell what was indexed (see incremental.sync).
+                dates = [entry.date for _, _, _, entry in changes if entry.date is not None]
+                project['indexed_at'] = max([project['indexed_at']] + dates)
+
+    def remove(self, path, is_project=False):
+        """
+        Remove a file, or all the files of a project, from the index.
+        """
+
+        key = tree_index.normalize(path)
+
+        with self.__lock:
+            keys = is_project and [k for k in self.__ids if k.startswith(key + '/')] or [key]
+
+            for k in keys:
+                self.__skipped.pop(k, None)
+                doc_id = self.__ids.pop(k, None)
+
+                if doc_id is None:
+                    continue
+
+                _, _, trigrams = self.__documents.pop(doc_id)
+
+                for trigram in trigrams:
+                    postings = self.__postings[trigram]
+                    postings.discard(doc_id)
+
+                    if not postings:
+                        del self.__postings[trigram]
+
+    def get_candidates(self, pattern, extended=False):
+        """
+        Get the (vss_path, local_path) tuples of the files that may match pattern, sorted by VSS path.
+        """
+
+        trigrams = set()
+
+        for literal in get_required_literals(pattern, extended):
+            trigrams |= get_trigrams(literal)
+
+        with self.__lock:
+            if trigrams:
+                postings = sorted((self.__postings.get(trigram, set()) for trigram in trigrams), key=len)
+                doc_ids = set(postings[0]).intersection(*postings[1:])
+            else:
+                doc_ids = self.__documents.keys()
+
+            return sorted(self.__documents[doc_id][:2] for doc_id in doc_ids)
+
+    def skipped_files(self):
+        """
+        Get the (vss_path, local_path) tuples of the files that were too big to be indexed, sorted by VSS path.
+        """
+
+        with self.__lock:
+            return sorted(self.__skipped.values())
+
+    def find(self, pattern, items, extended=False, recursive=False, case_sensitive=False):
+        """
+        Search the indexed files of items (VSS files or projects, including their subprojects if recursive is True) for
+        pattern, with the semantics of FindinFiles (see get_matcher).
+
+        Returns a list of (vss_path, line_number, line) tuples.
+        """
+
+        matches = get_matcher(pattern, extended, case_sensitive)
+        keys = [tree_index.normalize(item) for item in items]
+        result = []
+
+        for vss_path, local_path in self.get_candidates(pattern, extended):
+            if not is_in_scope(vss_path, keys, recursive):
+                continue
+
+            if not os.path.isfile(local_path) or is_binary(local_path):
+                continue
+
+            with open(local_path, 'rb') as f:
+                for line_number, line in enumerate(f, 1):
+                    line = line.rstrip('\r\n')
+
+                    if matches(line):
+                        result.append((vss_path, line_number, line))
+
+        return result
+
+    def load(self):
+        """
+        Load the index from its file.
+        """
+
+        with open(self.path, 'rb') as f:
+            data = cPickle.load(f)
+
+        with self.__lock:
+            self.__projects, self.__documents, self.__ids, self.__postings, self.__next_id = data[:5]
+            self.__skipped = len(data) > 5 and data[5] or {}
+
+            # Indexes saved before the files over the size limit were skipped hold them without trigrams.
+            for doc_id, (vss_path, local_path, trigrams) in self.__documents.items():
+                if trigrams is None:
+                    del self.__documents[doc_id]
+                    self.__skipped[self.__ids.pop(tree_index.normalize(vss_path))] = (vss_path, local_path)
+
+    def save(self):
+        """
+        Save the index to its file.
+        """
+
+        with self.__lock:
+            data = cPickle.dumps((self.__projects, self.__documents, self.__ids, self.__postings, self.__next_id, self.__skipped), cPickle.HIGHEST_PROTOCOL)
+
+        persistence.write_file(self.path, data)
+
+    def __index_tree(self, vss_project_path, root_project, root_local_path):
+        """
+        Index the files of the local copy of a project.
+
+        Must be called with the lock held.
+        """
+
+        local_path = parallel.get_local_folder(vss_project_path, root_project, root_local_path)
+
+        for folder, folders, files in os.walk(local_path):
+            relative_path = os.path.relpath(folder, root_local_path)
+            project = root_project.rstrip('/')
+
+            if relative_path != '.':
+                project += '/' + relative_path.replace(os.sep, '/')
+
+            for fname in files:
+                if fname == incremental.MANIFEST_NAME:
+                    continue
+
+                self.__index_file(project + '/' + fname, os.path.join(folder, fname))
+
+    def __index_file(self, vss_path, local_path):
+        """
+        Index a single file.
+
+        Must be called with the lock held.
+        """
+
+        self.remove(vss_path)
+
+        if os.path.getsize(local_path) > self.max_file_size:
+            self.__skipped[tree_index.normalize(vss_path)] = (vss_path, local_path)
+            return
+
+        doc_id = self.__next_id
+        self.__next_id += 1
+
+        with open(local_path, 'rb') as f:
+            trigrams = frozenset(get_trigrams(f.read()))
+
+        for trigram in trigrams:
+            self.__postings.setdefault(trigram, set()).add(doc_id)
+
+        self.__ids[tree_index.normalize(vss_path)] = doc_id
+        self.__documents[doc_id] = (vss_path, local_path, trigrams)
+
+class IndexedVSS(VSS):
+    """
+    A VSS class whose FindinFiles command searches the files of indexed projects with a TextIndex, falling back to
+    ss.exe for the other files and the options the index does not honour.
+    """
+
+    def __init__(self, repository_path=None, ss_path=None, text_index=None, **kwargs):
+        """
+        Create an IndexedVSS instance attached to a specified repository_path repository.
+
+        Other keyword arguments are passed to the VSS constructor.
+        """
+
+        super(IndexedVSS, self).__init__(repository_path, ss_path, **kwargs)
+
+        self.text_index = text_index
+
+    def find_in_files(self, pattern, items=None, **options):
+        """
+        Calls the VSS FindinFiles command for the specified pattern and items, or answers it from the index.
+
+        The index answers when the items are part of indexed projects, the options are among INDEXED_OPTIONS, and no
+        file searched was skipped by the index (see TextIndex.skipped_files). Answers from the index are the VSS paths of
+        the matching files, one per line, and are returned rather than streamed.
+
+        Returns the standard output.
+        """
+
+        if items is not None and not isinstance(items, list):
+            items = [str(items)]
+
+        if not self.__is_indexed(items, options):
+            return super(IndexedVSS, self).find_in_files(pattern, items, **options)
+
+        matches = self.text_index.find(pattern, items, options.get('extended', False), options.get('recursive', False), options.get('case_sensitive', False))
+        paths = []
+
+        for vss_path, _, _ in matches:
+            if not vss_path in paths:
+                paths.append(vss_path)
+
+        return ''.join(vss_path + '\n' for vss_path in paths)
+
+    def __is_indexed(self, items, options):
+        """
+        Check whether the index can answer a FindinFiles command on items with options.
+        """
+
+        # Without items, FindinFiles searches the current project, which is not known.
+        if self.text_index is None or not items or [option for option in options if not option in INDEXED_OPTIONS]:
+            return False
+
+        if [item for item in items if self.text_index.get_project(item) is None]:
+            return False
+
+        keys = [tree_index.normalize(item) for item in items]
+
+        return not [vss_path for vss_path, _ in self.text_index.skipped_files() if is_in_scope(vss_path, keys, options.get('recursive', False))]
@@ -0,0 +1,220 @@
+"""
+Timeouts and cancellation of ss.exe invocations.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+class TimeoutExpired(subprocess.CalledProcessError):
+    """
+    Raised when an ss.exe invocation did not complete in time. The process tree was killed.
+
+    output holds what the command printed before it was killed.
+    """
+
+    def __init__(self, returncode, cmd, timeout, output=None):
+        super(TimeoutExpired, self).__init__(returncode, cmd, output=output)
+
+        self.timeout = timeout
+
+    def __str__(self):
+        return "Command '%s' timed out after %s seconds" % (self.cmd, self.timeout)
+
+class Cancelled(subprocess.CalledProcessError):
+    """
+    Raised when an ss.exe invocation was cancelled. The process tree was killed.
+
+    output holds what the command printed before it was killed.
+    """
+
+    def __str__(self):
+        return "Command '%s' was cancelled" % (self.cmd,)
+
+class CancellationToken(object):
+    """
+    A flag that cancels the ss.exe invocations it is attached to, from any thread.
+    """
+
+    def __init__(self):
+        """
+        Create a token that is not cancelled.
+        """
+
+        self.__lock = threading.Lock()
+        self.__cancelled = False
+        self.__callbacks = []
+
+    @property
+    def cancelled(self):
+        """
+        Check whether the token was cancelled.
+        """
+
+        return self.__cancelled
+
+    def cancel(self):
+        """
+        Cancel the invocations attached to the token, and the ones that will be.
+        """
+
+        with self.__lock:
+            self.__cancelled = True
+            callbacks, self.__callbacks = self.__callbacks, []
+
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        """
+        Register a callback to be called without arguments once the token is cancelled.
+
+        If the token is already cancelled, the callback is called immediately.
+        """
+
+        with self.__lock:
+            if not self.__cancelled:
+                self.__callbacks.append(callback)
+                return
+
+        callback()
+
+    def remove_callback(self, callback):
+        """
+        Unregister a callback.
+        """
+
+        with self.__lock:
+            if callback in self.__callbacks:
+                self.__callbacks.remove(callback)
+
+def get_popen_options(invocation):
+    """
+    Get the extra subprocess.Popen arguments needed to kill the process tree of the specified invocation.
+
+    On POSIX systems, supervised invocations run in their own session so that their whole process group can be killed.
+    """
+
+    if sys.platform != 'win32' and (invocation.timeout is not None or invocation.cancellation is not None):
+        return {'preexec_fn': os.setsid}
+
+    return {}
+
+def kill_tree(process):
+    """
+    Kill a process and its children.
+
+    The process is not polled, so that this can be called while another thread waits for it.
+    """
+
+    if sys.platform == 'win32':
+        with open(os.devnull, 'wb') as devnull:
+            subprocess.call(['taskkill', '/F', '/T', '/PID', str(process.pid)], stdout=devnull, stderr=devnull)
+    else:
+        try:
+            # Only supervised processes lead their own process group (see get_popen_options).
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except OSError:
+            pass
+
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+def get_error(reason, invocation, output=None):
+    """
+    Get the exception to raise for an invocation interrupted for the specified reason ('timeout' or 'cancelled').
+    """
+
+    if reason == 'timeout':
+        return TimeoutExpired(invocation.returncode, invocation.argv, invocation.timeout, output=output)
+
+    return Cancelled(invocation.returncode, invocation.argv, output=output)
+
+class Watchdog(object):
+    """
+    Kills the process tree of an invocation once its timeout expires or its cancellation token is cancelled.
+    """
+
+    def __init__(self, process, invocation):
+        """
+        Start watching process, run for the specified instrumentation.Invocation.
+
+        Nothing is started if the invocation has neither a timeout nor a cancellation token.
+        """
+
+        self.process = process
+        self.invocation = invocation
+        self.reason = None
+        self.__finished = False
+        self.__event = threading.Event()
+        self.__thread = None
+
+        if invocation.timeout is not None or invocation.cancellation is not None:
+            self.__thread = threading.Thread(target=self.__run, name='VSSWatchdog')
+            self.__thread.daemon = True
+            self.__thread.start()
+
+            if invocation.cancellation is not None:
+                invocation.cancellation.add_callback(self.__event.set)
+
+    def stop(self):
+        """
+        Stop watching, once the process completed.
+        """
+
+        if self.__thread is None:
+            return
+
+        self.__finished = True
+        self.__event.set()
+        self.__thread.join()
+
+        if self.invocation.cancellation is not None:
+            self.invocation.cancellation.remove_callback(self.__event.set)
+
+    def get_error(self, output=None):
+        """
+        Get the exception to raise if the process was killed, or None.
+
+        Must be called once the process was waited for: a process that exited on its own just as its timeout expired (or
+        its token was cancelled) completed, and is not reported as killed.
+        """
+
+        if self.reason is None:
+            return None
+
+        if sys.platform != 'win32' and self.process.returncode != -signal.SIGKILL:
+            return None
+
+        return get_error(self.reason, self.invocation, output)
+
+    def __run(self):
+        """
+        Wait for the timeout or the cancellation and kill the process tree.
+        """
+
+        if self.invocation.timeout is None:
+            self.__event.wait()
+        else:
+            self.__event.wait(max(self.invocation.timeout, 0))
+
+        if self.__finished or self.__exited():
+            return
+
+        self.reason = self.invocation.cancellation is not None and self.invocation.cancellation.cancelled and 'cancelled' or 'timeout'
+        kill_tree(self.process)
+
+    def __exited(self):
+        """
+        Check whether the process already exited.
+
+        Only Windows can tell without reaping the process, which another thread may be waiting for: elsewhere, get_error
+        tells from the exit status whether the process was killed.
+        """
+
+        return sys.platform == 'win32' and self.process.poll() is not None
@@ -0,0 +1,221 @@
+"""
+An index of VSS project trees, to avoid calling the Dir command over and over.
+"""
+
+import parsers
+import persistence
+
+import collections
+import cPickle
+import os
+import subprocess
+import threading
+import time
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_PROJECTS = 10000
+
+# The commands that change the tree of a project.
+MUTATING_COMMANDS = frozenset(['Add', 'Branch', 'Checkin', 'Create', 'Delete', 'Destroy', 'Move', 'Purge', 'Recover', 'Rename', 'Share'])
+
+def normalize(path):
+    """
+    Get the key of a VSS path: VSS paths are case insensitive.
+    """
+
+    return path.rstrip('/').lower() or '$'
+
+def get_parent(path):
+    """
+    Get the parent project of a VSS path.
+    """
+
+    return path.rstrip('/').rsplit('/', 1)[0] or '$'
+
+class TreeIndex(object):
+    """
+    Caches the content of the projects of a VSS repository.
+
+    Projects are listed with a recursive Dir command the first time they are looked up, then served from memory until
+    they expire (after ttl seconds), get evicted (when more than max_projects are cached, least recently used first), or
+    are modified by a command run through the VSS instance. The projects listed by a Dir command are never evicted by the
+    same command: a listing bigger than max_projects is kept whole until the next one.
+
+    If path is specified, the index is also saved to and loaded from that file. Saves are deferred by save_delay
+    seconds, so that the changes made in the meantime are saved at once (see persistence.DeferredSave); detach and
+    save write the index immediately.
+    """
+
+    def __init__(self, vss, ttl=DEFAULT_TTL, max_projects=DEFAULT_MAX_PROJECTS, path=None, save_delay=persistence.DEFAULT_SAVE_DELAY):
+        """
+        Create an index for the repository of the specified VSS instance.
+        """
+
+        self.vss = vss
+        self.ttl = ttl
+        self.max_projects = max_projects
+        self.path = path
+        self.__lock = threading.RLock()
+        self.__entries = collections.OrderedDict()
+        self.__deferred_save = persistence.DeferredSave(self.save, save_delay)
+
+        if self.path and os.path.isfile(self.path):
+            self.load()
+
+        self.vss.listeners.append(self.on_command)
+
+    def detach(self):
+        """
+        Stop tracking the commands run through the VSS instance, and save the pending changes.
+        """
+
+        self.vss.listeners.remove(self.on_command)
+        self.__deferred_save.flush()
+
+    def children(self, project):
+        """
+        Get the content of the specified project.
+
+        Returns a (subprojects, files) tuple. Subprojects are given by their full VSS path.
+        """
+
+        key = (self.vss.repository_path, normalize(project))
+
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+
+            if entry is not None and entry[0] + self.ttl >= time.time():
+                self.__entries[key] = entry
+
+                return entry[1], entry[2]
+
+        self.populate(project)
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+
+        if entry is None:
+            return [], []
+
+        return entry[1], entry[2]
+
+    def exists(self, path):
+        """
+        Check whether the specified project or file exists.
+        """
+
+        if normalize(path) == '$':
+            return True
+
+        subprojects, files = self.children(get_parent(path))
+        name = normalize(path).rsplit('/', 1)[-1]
+
+        return name in [normalize(subproject).rsplit('/', 1)[-1] for subproject in subprojects] or name in [f.lower() for f in files]
+
+    def walk(self, project):
+        """
+        Walk the tree under the specified project, like os.walk.
+
+        Yields (project, subprojects, files) tuples.
+        """
+
+        projects = [project]
+
+        while projects:
+            project = projects.pop(0)
+            subprojects, files = self.children(project)
+
+            yield project, subprojects, files
+
+            projects.extend(subprojects)
+
+    def populate(self, project):
+        """
+        List the tree under the specified project with a single recursive Dir command and add it to the index.
+        """
+
+        try:
+            tree = parsers.parse_dir(self.vss.dir(project, recursive=True))
+        except subprocess.CalledProcessError:
+            tree = []
+
+        now = time.time()
+        inserted = set([(self.vss.repository_path, normalize(project))])
+
+        with self.__lock:
+            # A project that cannot be listed is recorded as empty, so that it is not listed again until it expires.
+            self.__entries.pop((self.vss.repository_path, normalize(project)), None)
+            self.__entries[(self.vss.repository_path, normalize(project))] = (now, [], [])
+
+            for path, subprojects, files in tree:
+                key = (self.vss.repository_path, normalize(path))
+                inserted.add(key)
+                self.__entries.pop(key, None)
+                self.__entries[key] = (now, subprojects, files)
+
+            # The inserted entries are the most recent ones: the eviction stops at the first of them.
+            while len(self.__entries) > self.max_projects and not next(iter(self.__entries)) in inserted:
+                self.__entries.popitem(last=False)
+
+        if self.path:
+            self.__deferred_save.request()
+
+    def invalidate(self, path=None, recursive=True):
+        """
+        Remove the specified project (and its subprojects, if recursive is True) from the index.
+
+        If path is None, the whole repository is removed from the index.
+        """
+
+        with self.__lock:
+            for key in self.__entries.keys():
+                if key[0] != self.vss.repository_path:
+                    continue
+
+                if path is None or key[1] == normalize(path) or (recursive and key[1].startswith(normalize(path) + '/')):
+                    del self.__entries[key]
+
+        if self.path:
+            self.__deferred_save.request()
+
+    def on_command(self, command, arguments):
+        """
+        Invalidate the projects modified by the specified command.
+
+        Local files are added to the current project, which is not known: commands that do not name a VSS path
+        invalidate the whole repository.
+        """
+
+        if not command in MUTATING_COMMANDS:
+            return
+
+        paths = [argument for argument in arguments if argument.startswith('$')]
+
+        if not paths or len(paths) < len([argument for argument in arguments if not argument.startswith('-')]):
+            self.invalidate()
+            return
+
+        for path in paths:
+            self.invalidate(path)
+            self.invalidate(get_parent(path), recursive=False)
+
+    def load(self):
+        """
+        Load the index from its file.
+        """
+
+        with open(self.path, 'rb') as f:
+            entries = cPickle.load(f)
+
+        with self.__lock:
+            self.__entries = entries
+
+    def save(self):
+        """
+        Save the index to its file.
+        """
+
+        with self.__lock:
+            data = cPickle.dumps(self.__entries, cPickle.HIGHEST_PROTOCOL)
+
+        persistence.write_file(self.path, data)
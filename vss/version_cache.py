@@ -0,0 +1,404 @@
+"""
+A content-addressed cache of the versions of VSS files.
+"""
+
+from vss import VSS
+
+import persistence
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import threading
+import time
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+INDEX_NAME = 'index.json'
+
+VERSION_OPTIONS = ('version_number', 'version_label', 'version_date')
+
+def find_version(vss, item, **options):
+    """
+    Get the version number of item designated by the version_label or version_date options, from its history.
+
+    The history of a label starts with the label record, which has no version of its own: the first entry that has one
+    is taken, and the rest of the history is not read. Returns None if no entry has a version.
+    """
+
+    for entry in vss.iter_history(item, **options):
+        if entry.version is not None:
+            return entry.version
+
+    return None
+
+def remove_file(path):
+    """
+    Remove a file of the cache, or a file materialized from it.
+
+    Windows does not remove read-only files, so they are made writable first there. Elsewhere their mode is left alone:
+    it is shared with their hard links, in the cache or in a working folder.
+    """
+
+    if sys.platform == 'win32':
+        os.chmod(path, stat.S_IWRITE)
+
+    os.remove(path)
+
+class VersionCache(object):
+    """
+    Stores the content of file versions on disk, indexed by repository, item and version.
+
+    Contents are stored once per distinct content (identical versions share their storage) and the least recently used
+    contents are evicted once the cache grows over max_size bytes.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE, save_delay=persistence.DEFAULT_SAVE_DELAY):
+        """
+        Create or open the cache stored in the specified folder.
+
+        The index is saved save_delay seconds after it changes (see persistence.DeferredSave), or by flush.
+        """
+
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.RLock()
+        self.__entries = {}
+        self.__resolutions = {}
+        self.__blobs = {}
+        self.__keys = {}
+        self.__size = 0
+        self.__deferred_save = persistence.DeferredSave(self.__save, save_delay)
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        index_path = os.path.join(self.path, INDEX_NAME)
+
+        if os.path.isfile(index_path):
+            with open(index_path, 'rb') as f:
+                index = json.load(f)
+
+            # The keys are the bytes output by ss.exe: they are saved as latin-1 to be restored as is.
+            self.__entries = dict((key.encode('latin-1'), digest) for key, digest in index['entries'].items())
+            self.__resolutions = dict((key.encode('latin-1'), version) for key, version in index['resolutions'].items())
+            self.__blobs = index['blobs']
+
+        for key, digest in self.__entries.items():
+            self.__keys.setdefault(digest, set()).add(key)
+
+        self.__size = sum(size for size, _ in self.__blobs.values())
+
+    @staticmethod
+    def get_key(*parts):
+        """
+        Get the index key of the specified parts (like a repository, an item and a version).
+
+        Item paths are the bytes output by ss.exe: they are lowercased as such (ASCII letters only), not decoded.
+        """
+
+        return '|'.join((isinstance(part, basestring) and part or str(part)).lower() for part in parts)
+
+    def get_blob_path(self, digest):
+        """
+        Get the path of the stored content with the specified digest.
+        """
+
+        return os.path.join(self.path, digest[:2], digest[2:])
+
+    @property
+    def size(self):
+        """
+        The total size of the stored contents, in bytes.
+        """
+
+        with self.__lock:
+            return self.__size
+
+    def resolve(self, key):
+        """
+        Get the version number recorded for the specified version label or date key, or None.
+        """
+
+        with self.__lock:
+            return self.__resolutions.get(key)
+
+    def set_resolution(self, key, version):
+        """
+        Record the version number that a version label or date key resolves to.
+        """
+
+        with self.__lock:
+            self.__resolutions[key] = version
+            self.__deferred_save.request()
+
+    def forget_resolutions(self):
+        """
+        Forget all the recorded version resolutions, for instance after labels were moved.
+        """
+
+        with self.__lock:
+            self.__resolutions.clear()
+            self.__deferred_save.request()
+
+    def lookup(self, key):
+        """
+        Get the path of the content stored for the specified key.
+
+        Returns None if there is none. Hits and misses are counted.
+        """
+
+        with self.__lock:
+            digest = self.__entries.get(key)
+
+            if digest is None or not os.path.isfile(self.get_blob_path(digest)):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.__blobs[digest][1] = time.time()
+
+            return self.get_blob_path(digest)
+
+    def store(self, key, data):
+        """
+        Store the specified content for the specified key.
+
+        Returns the path of the stored content.
+        """
+
+        digest = hashlib.sha1(data).hexdigest()
+        blob_path = self.get_blob_path(digest)
+
+        with self.__lock:
+            if not os.path.isfile(blob_path):
+                if not os.path.isdir(os.path.dirname(blob_path)):
+                    os.makedirs(os.path.dirname(blob_path))
+
+                with open(blob_path + '.tmp', 'wb') as f:
+                    f.write(data)
+
+                os.chmod(blob_path + '.tmp', stat.S_IREAD)
+                os.rename(blob_path + '.tmp', blob_path)
+
+            previous_digest = self.__entries.get(key)
+
+            if previous_digest is not None and previous_digest != digest:
+                self.__keys[previous_digest].discard(key)
+
+            if not digest in self.__blobs:
+                self.__size += len(data)
+
+            self.__entries[key] = digest
+            self.__keys.setdefault(digest, set()).add(key)
+            self.__blobs[digest] = [len(data), time.time()]
+            self.__evict()
+            self.__deferred_save.request()
+
+        return blob_path
+
+    def read(self, key):
+        """
+        Get the content stored for the specified key, or None.
+        """
+
+        blob_path = self.lookup(key)
+
+        if blob_path is None:
+            return None
+
+        with open(blob_path, 'rb') as f:
+            return f.read()
+
+    def materialize(self, key, destination, link=True):
+        """
+        Write the content stored for the specified key to destination: as a hard link if link is True and the file system
+        supports it, as a copy otherwise.
+
+        Returns False if there is no content stored for the key.
+
+        Hard links share their content, and their mode, with the cache: they are read-only and must not be modified in
+        place. Windows does not support them here, so the content is always copied there.
+        """
+
+        blob_path = self.lookup(key)
+
+        if blob_path is None:
+            return False
+
+        if os.path.exists(destination):
+            remove_file(destination)
+
+        if link and hasattr(os, 'link'):
+            try:
+                os.link(blob_path, destination)
+                return True
+            except OSError:
+                pass
+
+        shutil.copyfile(blob_path, destination)
+        os.chmod(destination, stat.S_IREAD)
+
+        return True
+
+    def __evict(self):
+        """
+        Remove the least recently used contents until the cache fits in max_size.
+
+        Must be called with the lock held.
+        """
+
+        if self.__size <= self.max_size:
+            return
+
+        for digest, (blob_size, _) in sorted(self.__blobs.items(), key=lambda blob: blob[1][1]):
+            if self.__size <= self.max_size:
+                break
+
+            blob_path = self.get_blob_path(digest)
+
+            if os.path.isfile(blob_path):
+                remove_file(blob_path)
+
+            del self.__blobs[digest]
+            self.__size -= blob_size
+
+            for key in self.__keys.pop(digest, ()):
+                del self.__entries[key]
+
+    def flush(self):
+        """
+        Save the index now if a save is pending.
+        """
+
+        self.__deferred_save.flush()
+
+    def __save(self):
+        """
+        Save the index of the cache.
+        """
+
+        with self.__lock:
+            data = json.dumps({'entries': self.__entries, 'resolutions': self.__resolutions, 'blobs': self.__blobs}, encoding='latin-1')
+
+        persistence.write_file(os.path.join(self.path, INDEX_NAME), data)
+
+class CachingVSS(VSS):
+    """
+    A VSS class that serves the Get and View commands of specific file versions from a VersionCache.
+    """
+
+    def __init__(self, repository_path=None, ss_path=None, version_cache=None, **kwargs):
+        """
+        Create a CachingVSS instance attached to a specified repository_path repository.
+
+        Other keyword arguments are passed to the VSS constructor.
+        """
+
+        super(CachingVSS, self).__init__(repository_path, ss_path, **kwargs)
+
+        self.version_cache = version_cache
+
+    def resolve_version(self, item, **options):
+        """
+        Get the version number of item designated by one of the version_number, version_label or version_date options.
+
+        Label and date resolutions are recorded in the cache. Returns None if the version cannot be resolved.
+        """
+
+        if 'version_number' in options:
+            return int(options['version_number'])
+
+        name = [option for option in VERSION_OPTIONS if option in options][0]
+        key = VersionCache.get_key(self.repository_path, item, name, options[name])
+        version = self.version_cache.resolve(key)
+
+        if version is None:
+            version = find_version(self, item, **{name: options[name]})
+
+            if version is not None:
+                self.version_cache.set_resolution(key, version)
+
+        return version
+
+    def __get_cache_key(self, kind, items, options, excluded_options=()):
+        """
+        Get the cache key of a command, or None if the command cannot be served from the cache.
+        """
+
+        if isinstance(items, list):
+            if len(items) != 1:
+                return None
+
+            items = items[0]
+
+        if self.version_cache is None or options.get('recursive'):
+            return None
+
+        if len([option for option in VERSION_OPTIONS if option in options]) != 1:
+            return None
+
+        if [option for option in options if not option in VERSION_OPTIONS + excluded_options]:
+            return None
+
+        version = self.resolve_version(items, **options)
+
+        if version is None:
+            return None
+
+        return VersionCache.get_key(self.repository_path, items, kind, version)
+
+    def get(self, items, **options):
+        """
+        Calls the VSS Get command for the specified items.
+
+        A single file get into get_folder at a specific version is served from the cache when possible.
+
+        Returns the standard output.
+        """
+
+        key = 'get_folder' in options and self.__get_cache_key('get', items, options, ('get_folder', 'output', 'ignore'))
+
+        if not key:
+            return super(CachingVSS, self).get(items, **options)
+
+        item = isinstance(items, list) and items[0] or items
+        destination = os.path.join(options['get_folder'], item.rstrip('/').rsplit('/', 1)[-1])
+
+        if self.version_cache.materialize(key, destination):
+            return ''
+
+        output = super(CachingVSS, self).get(items, **options)
+
+        if os.path.isfile(destination):
+            with open(destination, 'rb') as f:
+                self.version_cache.store(key, f.read())
+
+        return output
+
+    def view(self, fname, **options):
+        """
+        Calls the VSS View command for the specified file.
+
+        Views of a specific version are served from the cache when possible.
+
+        Returns the standard output.
+        """
+
+        key = self.__get_cache_key('view', fname, options)
+
+        if not key:
+            return super(CachingVSS, self).view(fname, **options)
+
+        output = self.version_cache.read(key)
+
+        if output is None:
+            output = super(CachingVSS, self).view(fname, **options)
+            self.version_cache.store(key, output)
+
+        return output
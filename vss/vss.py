@@ -3,28 +3,139 @@ A Microsoft Visual SourceSafe class.
 """
 
 import tools
+import batching
+import option_table
+import parsers
+import instrumentation
+import timeouts
+import sinks
+import plan as plan_module
 
 import os
+import sys
+import time
+import threading
+import contextlib
 import subprocess
+import multiprocessing.pool
 
 class VSS(object):
     """
     A VSS class that handles all low-level operations on a VSS repository.
     """
 
-    def __init__(self, repository_path=None, ss_path=None):
+    def __init__(self, repository_path=None, ss_path=None, max_argv_bytes=batching.DEFAULT_MAX_ARGV_BYTES, timeout=None, cancellation=None):
         """
         Create a VSS instance attached to a specified repository_path repository.
+
+        Commands on lists of items are split in several invocations so that each command line fits in max_argv_bytes.
+
+        If timeout is specified, each ss.exe invocation that runs for longer than timeout seconds is killed (with its
+        children) and a timeouts.TimeoutExpired error is raised. If cancellation (a timeouts.CancellationToken) is
+        specified, cancelling it kills the running invocations and raises timeouts.Cancelled errors. See limits to
+        restrict a single call.
+
+        Callables appended to listeners are called with the command name and its arguments (options included) each time a
+        command is run successfully.
+
+        Callables appended to hooks are called with an instrumentation.Invocation each time ss.exe completes, successfully
+        or not. instrumentation.trace prints the command lines before ss.exe starts when the VSS_PYTHON_TRACE environment
+        variable is set.
         """
 
         self.repository_path = repository_path
         self.ss_path = ss_path or tools.get_ss_path()
+        self.max_argv_bytes = max_argv_bytes
+        self.timeout = timeout
+        self.cancellation = cancellation
+        self.listeners = []
+        self.hooks = []
+        self.__local = threading.local()
 
-    def __execute(self, argv):
+    @contextlib.contextmanager
+    def limits(self, timeout=None, cancellation=None):
         """
-        Calls ss.exe with the specified arguments.
+        Limit the commands called in the current thread within the with block.
 
-        Returns the standard output of the specified command.
+        timeout is a deadline, in seconds, for all the invocations of ss.exe of the block: a command split in several
+        invocations must complete as a whole in time. cancellation (a timeouts.CancellationToken) replaces the one of the
+        instance.
+        """
+
+        previous = getattr(self.__local, 'limits', None)
+        self.__local.limits = (timeout is not None and time.time() + timeout or None, cancellation)
+
+        try:
+            yield
+        finally:
+            self.__local.limits = previous
+
+    @contextlib.contextmanager
+    def streaming(self, sink):
+        """
+        Write the standard output of the commands called in the current thread within the with block to sink as it
+        comes, instead of buffering it: the commands then return sinks.STREAMED_OUTPUT, an empty string that the parsers
+        refuse with a sinks.StreamingError (rather than parse an empty output).
+
+        sink is a file-like object, a sinks.LineSink or a callable called with each chunk of output. See iter_output to
+        iterate over the output lines of a command as it runs.
+
+        Errors raised by failed commands only hold the end of their output.
+        """
+
+        sink = sinks.get_sink(sink)
+        previous = getattr(self.__local, 'sink', None)
+        self.__local.sink = sink
+
+        try:
+            yield
+        finally:
+            self.__local.sink = previous
+            sink.flush()
+
+    def iter_output(self, command, *args, **options):
+        """
+        Calls the specified VSS command (the name of a VSS method, like 'get', or an unbound method, like VSS.get, to
+        bypass the override of a subclass) in a background thread.
+
+        Yields the lines of its standard output as they come. Errors are raised once the output is exhausted. If the
+        iteration is stopped early, the command is cancelled.
+        """
+
+        lines = sinks.LineQueue()
+        cancellation = timeouts.CancellationToken()
+
+        def run():
+            try:
+                with self.limits(cancellation=cancellation):
+                    with self.streaming(lines):
+                        if isinstance(command, basestring):
+                            getattr(self, command)(*args, **options)
+                        else:
+                            command(self, *args, **options)
+            except Exception, ex:
+                lines.close(ex)
+            else:
+                lines.close()
+
+        thread = threading.Thread(target=run, name='VSSOutput')
+        thread.daemon = True
+        thread.start()
+
+        try:
+            for line in lines:
+                yield line
+        finally:
+            if thread.is_alive():
+                cancellation.cancel()
+                lines.abandon()
+                thread.join()
+
+    def __prepare(self, argv):
+        """
+        Prepare the invocation of ss.exe with the specified arguments.
+
+        Returns an instrumentation.Invocation.
         """
 
         env = os.environ.copy()
@@ -32,166 +143,254 @@ class VSS(object):
         if self.repository_path:
             env['SSDIR'] = self.repository_path
 
-        if env.get('VSS_PYTHON_TRACE', None):
-
-            if env.get('VSS_PYTHON_TRACE', None) == 'all':
-                print 'Environment:'
-
-                for key, value in env.items():
-                    print '%s: %s' % (key, value)
-
-            print ' '.join([self.ss_path] + argv)
-
-        return subprocess.check_output([self.ss_path] + argv, env=env)
-
-    def __to_options_list(self, options):
-        """
-        Convert options to their VSS format.
-        """
-
-        result = []
-
-        options_map = {
-            'number': '-#{param}',
-            'help': '-?',
-            'format': {
-                'binary': '-B',
-                'text': '-B-',
-            },
-            'base_version_number': '-B{param}',
-            'base_version_date': '-B{param}',
-            'base_version_label': '-Bl{param}',
-            'comment_text': '-C"{param}"',
-            'comment_no_text': '-C-',
-            'comment_file': '-C@{param}',
-            'comment_default': '-C?',
-            'display': '-D',
-            'display_not_last': '-D-',
-            'display_standard_width': '-DS{param}',
-            'display_unix_width': '-DU{param}',
-            'display_visual_width': '-DV{param}',
-            'display_context': '-DX{param}',
-            'display_no_context': '-DX-',
-            'extended': '-E',
-            'files_display': {
-                True: '-F',
-                False: '-F-',
-            },
-            'get_local': {
-                True: '-G',
-                False: '-G-',
-            },
-            'get_file_compare': {
-                'content': '-GCC',
-                'datetime': '-GCD',
-                'checksum': '-GCK',
-            },
-            'get_force_dir': {
-                True: '-GF',
-                False: '-GF-',
-            },
-            'get_folder': '-GL{param}',
-            'get_eol': {
-                'lf': '-GN',
-                'cr': '-GR',
-                'crlf': '-GRN',
-            },
-            'get_datetime': {
-                'current': '-GTC',
-                'modified': '-GTM',
-                'checkin': '-GTU',
-            },
-            'get_dialog': '-GWA',
-            'get_merge_files': '-GWM',
-            'get_replace_files': '-GWR',
-            'get_skip_files': '-GWS',
-            'help_online': '-H',
-            'ignore': {
-                'selected': '-I',
-                'all': '-I-',
-                'yes': '-I-Y',
-                'no': '-I-N',
-                'case': '-IC',
-                'eol': '-IE',
-                'small': '-IS',
-                'whitespace': '-IW',
-            },
-            'keep_checked_out': {
-                True: '-K',
-                False: '-K-',
-            },
-            'label': '-L{param}',
-            'local': '-L',
-            'no_local': '-L-',
-            'exclusive_checkouts': {
-                True: '-M-',
-                False: '-M',
-            },
-            'file_name_mode': {
-                'default': '-N',
-                'long': '-NL',
-                'short': '-NS',
-            },
-            'output': {
-                'all': '-O',
-                'error': '-O-',
-                'disable': '-0&-',
-            },
-            'output_file': '-O@{param}',
-            'project': {
-                'current': '-P',
-            },
-            'project_name': '-P{param}',
-            'quiet': '-Q',
-            'recursive': '-R',
-            'smart_mode': {
-                True: '-S',
-                False: '-S-',
-            },
-            'user': {
-                'current': '-U',
-            },
-            'user_name': '-U{param}',
-            'version_number': '-V{param}',
-            'version_date': '-Vd{param}',
-            'version_label': '-Vl{param}',
-            'working_copy': {
-                'read_write': '-W',
-                'read_only': '-W-',
-            },
-            'vss_user_name': '-Y{param}',
-        }
-
-        for option, value in options.items():
-
-            if not option in options_map:
-                raise ValueError('Invalid option name (%s)' % repr(option))
-
-            map_entry = options_map[option]
-
-            if isinstance(map_entry, dict):
-
-                def handle_value(v):
-                    if not v in map_entry:
-                        raise ValueError('Invalid option value for %s (%s)' % (repr(option), repr(v)))
-
-                    result.append(map_entry[v])
-
-                if isinstance(value, list):
-                    for v in value:
-                        handle_value(v)
-                else:
-                    handle_value(value)
-
-            elif isinstance(map_entry, str):
-
-                if isinstance(value, str):
-                    result.append(map_entry.replace('{param}', value or ''))
-                elif value:
-                    result.append(map_entry)
+        timeout = self.timeout
+        cancellation = self.cancellation
+        limits = getattr(self.__local, 'limits', None)
+
+        if limits is not None:
+            deadline, cancellation = limits[0], limits[1] or cancellation
+
+            if deadline is not None:
+                remaining = deadline - time.time()
+
+                if timeout is None or remaining < timeout:
+                    timeout = remaining
+
+        invocation = instrumentation.Invocation([self.ss_path] + argv, env, timeout, cancellation)
+        instrumentation.trace(invocation)
+
+        return invocation
+
+    def __execute(self, argv):
+        """
+        Calls ss.exe with the specified arguments.
+
+        Returns the standard output of the specified command.
+        """
+
+        return self._call(self.__prepare(argv))
+
+    def __stream(self, argv):
+        """
+        Calls ss.exe with the specified arguments, reading its output as it comes.
+
+        Yields the lines of the standard output of the specified command. If the iteration is stopped early, ss.exe is
+        killed and the invocation is reported to the hooks as cancelled.
+        """
+
+        invocation = self.__prepare(argv)
+
+        try:
+            process = subprocess.Popen(invocation.argv, env=invocation.environment, stdout=subprocess.PIPE, **timeouts.get_popen_options(invocation))
+        except OSError, ex:
+            invocation.error = ex
+            self._notify(invocation)
+            raise
+
+        invocation.spawn_latency = time.time() - invocation.started_at
+        watchdog = timeouts.Watchdog(process, invocation)
+        stdout_bytes = 0
+        exhausted = False
+
+        try:
+            for line in iter(process.stdout.readline, ''):
+                stdout_bytes += len(line)
+
+                yield line
+
+            exhausted = True
+        finally:
+            abandoned = not exhausted and process.poll() is None
+
+            if abandoned:
+                timeouts.kill_tree(process)
+
+            process.stdout.close()
+            invocation.finish(process.wait(), stdout_bytes)
+            watchdog.stop()
+            invocation.error = watchdog.get_error() or (abandoned and timeouts.Cancelled(process.returncode, invocation.argv) or None)
+            self._notify(invocation)
+
+        if invocation.error is not None:
+            raise invocation.error
+
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, invocation.argv)
+
+    def __execute_items(self, command, items, options, arguments=[]):
+        """
+        Calls ss.exe with the specified command for a list of items.
+
+        The items are split in as many invocations as needed for each command line to fit in max_argv_bytes.
+
+        Returns the standard output of all the invocations.
+        """
+
+        options_list = self.__to_options_list(command, options)
+        batches = batching.pack(items, self.max_argv_bytes, batching.get_argv_size([self.ss_path, command] + arguments + options_list))
+
+        if len(batches) < 2:
+            return self.__execute([command] + arguments + items + options_list)
+
+        return self._gather([self.__execute([command] + arguments + batch + options_list) for batch in batches])
+
+    def _gather(self, outputs):
+        """
+        Merge the outputs of several invocations of ss.exe, as returned by _call.
+        """
+
+        return sinks.join(outputs)
+
+    def _call(self, invocation):
+        """
+        Run the specified ss.exe invocation.
+
+        Returns the standard output of the command. The standard error is written to sys.stderr as it comes, and kept in
+        the stderr attribute of the CalledProcessError raised if it failed.
+
+        If the invocation times out or is cancelled, its process tree is killed and a timeouts.TimeoutExpired or
+        timeouts.Cancelled error holding the partial output is raised.
+
+        Within a streaming block, the standard output is written to the sink as it comes instead.
+
+        Subclasses may override this method to change the way ss.exe is run: every VSS command goes through it. They must
+        call _notify once the invocation completes.
+        """
+
+        sink = getattr(self.__local, 'sink', None)
+
+        try:
+            process = subprocess.Popen(invocation.argv, env=invocation.environment, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **timeouts.get_popen_options(invocation))
+        except OSError, ex:
+            invocation.error = ex
+            self._notify(invocation)
+            raise
+
+        invocation.spawn_latency = time.time() - invocation.started_at
+        watchdog = timeouts.Watchdog(process, invocation)
+        echo = sinks.ErrorEcho(process.stderr)
+
+        if sink is None:
+            output = process.stdout.read()
+            stdout_bytes = len(output)
+        else:
+            try:
+                output, stdout_bytes = sinks.pump(process.stdout, sink)
+            except Exception:
+                exc_info = sys.exc_info()
+                timeouts.kill_tree(process)
+                process.stdout.close()
+                process.wait()
+                echo.wait()
+                watchdog.stop()
+                invocation.finish(process.returncode)
+                invocation.error = exc_info[1]
+                self._notify(invocation)
+                raise exc_info[0], exc_info[1], exc_info[2]
+
+        process.stdout.close()
+        process.wait()
+        errors = echo.wait()
+        watchdog.stop()
+        invocation.finish(process.returncode, stdout_bytes, len(errors))
+        invocation.error = watchdog.get_error(output)
+        self._notify(invocation)
+
+        if invocation.error is not None:
+            raise invocation.error
+
+        if process.returncode:
+            error = subprocess.CalledProcessError(process.returncode, invocation.argv, output=output)
+            error.stderr = errors
+            raise error
+
+        if sink is not None:
+            return sinks.STREAMED_OUTPUT
+
+        return output
+
+    def _notify(self, invocation):
+        """
+        Report a completed invocation to the hooks and, if it succeeded, to the listeners.
+        """
+
+        for hook in self.hooks:
+            hook(invocation)
+
+        if invocation.succeeded:
+            for listener in self.listeners:
+                listener(invocation.command, invocation.argv[2:])
+
+    def __to_options_list(self, command, options):
+        """
+        Convert options to their VSS format, checking that they apply to the specified command.
+        """
+
+        return option_table.option_table.translate(command, options)
+
+    def plan(self):
+        """
+        Create a plan.Plan that records calls to the methods of this instance, to run them in fewer invocations.
+
+        Used as a context manager, the plan runs when the block exits:
+
+            with vss.plan() as plan:
+                plan.checkout('$/Project/a.txt')
+                plan.checkout('$/Project/b.txt')
+        """
+
+        return plan_module.Plan(self)
+
+    def batch(self, command, items, workers=None, **options):
+        """
+        Calls the specified VSS command (the name of a VSS method, like 'checkin') for a list of items, in as few
+        invocations as the max_argv_bytes limit allows.
+
+        If workers is specified, that many invocations run at the same time.
+
+        Returns a batching.BatchResult that holds the output or the error of each invocation.
+        """
+
+        if not isinstance(items, list):
+            items = [str(items)]
+
+        method = getattr(self, command)
+        result = batching.BatchResult()
+
+        def run(batch):
+            try:
+                return batch, method(batch, **options), None
+            except subprocess.CalledProcessError, ex:
+                return batch, None, ex
+
+        batches = self._get_batches(command, items, options)
+
+        if workers:
+            pool = multiprocessing.pool.ThreadPool(workers)
+
+            try:
+                outcomes = pool.map(run, batches)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            outcomes = map(run, batches)
+
+        for batch, output, error in outcomes:
+            result.add(batch, output, error)
 
         return result
 
+    def _get_batches(self, command, items, options):
+        """
+        Split items into the batches that batch runs the specified VSS command (the name of a VSS method) for.
+        """
+
+        ss_command = plan_module.ITEM_COMMANDS.get(command, command)
+        base_size = batching.get_argv_size([self.ss_path, ss_command] + self.__to_options_list(ss_command, options))
+
+        return batching.pack(items, self.max_argv_bytes, base_size)
+
     def about(self):
         """
         Calls the VSS About command.
@@ -211,7 +410,7 @@ class VSS(object):
         if not isinstance(files, list):
             files = [str(files)]
 
-        return self.__execute(['Add'] + files + self.__to_options_list(options))
+        return self.__execute_items('Add', files, options)
 
     def branch(self, fname, **options):
         """
@@ -220,7 +419,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Branch'] + [fname] + self.__to_options_list(options))
+        return self.__execute(['Branch'] + [fname] + self.__to_options_list('Branch', options))
 
     def checkin(self, files, **options):
         """
@@ -232,7 +431,7 @@ class VSS(object):
         if not isinstance(files, list):
             files = [str(files)]
 
-        return self.__execute(['Checkin'] + files + self.__to_options_list(options))
+        return self.__execute_items('Checkin', files, options)
 
     def checkout(self, files, **options):
         """
@@ -244,7 +443,7 @@ class VSS(object):
         if not isinstance(files, list):
             files = [str(files)]
 
-        return self.__execute(['Checkout'] + files + self.__to_options_list(options))
+        return self.__execute_items('Checkout', files, options)
 
     def cloak(self, path, **options):
         """
@@ -253,7 +452,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Cloak'] + [path] + self.__to_options_list(options))
+        return self.__execute(['Cloak'] + [path] + self.__to_options_list('Cloak', options))
 
     def comment(self, items, **options):
         """
@@ -265,7 +464,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Comment'] + items + self.__to_options_list(options))
+        return self.__execute_items('Comment', items, options)
 
     def copy(self, item, **options):
         """
@@ -274,7 +473,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Copy'] + [item] + self.__to_options_list(options))
+        return self.__execute(['Copy'] + [item] + self.__to_options_list('Copy', options))
 
     def set_current_project(self, project, **options):
         """
@@ -283,7 +482,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['CP'] + [project] + self.__to_options_list(options))
+        return self.__execute(['CP'] + [project] + self.__to_options_list('CP', options))
 
     def create(self, project, **options):
         """
@@ -292,7 +491,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Create'] + [project] + self.__to_options_list(options))
+        return self.__execute(['Create'] + [project] + self.__to_options_list('Create', options))
 
     def decloak(self, path, **options):
         """
@@ -301,7 +500,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Decloak'] + [path] + self.__to_options_list(options))
+        return self.__execute(['Decloak'] + [path] + self.__to_options_list('Decloak', options))
 
     def delete(self, items, **options):
         """
@@ -313,7 +512,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Delete'] + items + self.__to_options_list(options))
+        return self.__execute_items('Delete', items, options)
 
     def deploy(self, path, **options):
         """
@@ -322,7 +521,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Deploy'] + [path] + self.__to_options_list(options))
+        return self.__execute(['Deploy'] + [path] + self.__to_options_list('Deploy', options))
 
     def destroy(self, items, **options):
         """
@@ -334,7 +533,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Destroy'] + items + self.__to_options_list(options))
+        return self.__execute_items('Destroy', items, options)
 
     def diff(self, files, **options):
         """
@@ -346,7 +545,7 @@ class VSS(object):
         if not isinstance(files, list):
             files = [str(files)]
 
-        return self.__execute(['Diff'] + items + self.__to_options_list(options))
+        return self.__execute_items('Diff', files, options)
 
     def dir(self, path, **options):
         """
@@ -355,7 +554,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Dir'] + [path] + self.__to_options_list(options))
+        return self.__execute(['Dir'] + [path] + self.__to_options_list('Dir', options))
 
     def filetype(self, items, **options):
         """
@@ -367,7 +566,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Filetype'] + items + self.__to_options_list(options))
+        return self.__execute_items('Filetype', items, options)
 
     def find_in_files(self, pattern, items=None, **options):
         """
@@ -381,7 +580,7 @@ class VSS(object):
         elif not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['FindinFiles', pattern] + items + self.__to_options_list(options))
+        return self.__execute_items('FindinFiles', items, options, [pattern])
 
     def get(self, items, **options):
         """
@@ -393,7 +592,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Get'] + items + self.__to_options_list(options))
+        return self.__execute_items('Get', items, options)
 
     def help(self, command=None, **options):
         """
@@ -402,7 +601,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Help'] + ((not command is None) and [command] or []) + self.__to_options_list(options))
+        return self.__execute(['Help'] + ((not command is None) and [command] or []) + self.__to_options_list('Help', options))
 
     def history(self, items, **options):
         """
@@ -414,7 +613,33 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['History'] + items + self.__to_options_list(options))
+        return self.__execute_items('History', items, options)
+
+    def iter_history(self, items, until_date=None, until_label=None, **options):
+        """
+        Calls the VSS History command for the specified items and parses its output as it comes.
+
+        Yields parsers.HistoryEntry instances, newest first. The iteration stops before the first entry older than
+        until_date (a datetime) and after the entry of the until_label label: ss.exe is then killed instead of listing
+        the rest of the history.
+        """
+
+        if not isinstance(items, list):
+            items = [str(items)]
+
+        lines = self.__stream(['History'] + items + self.__to_options_list('History', options))
+
+        try:
+            for entry in parsers.iter_history(lines, len(items) == 1 and items[0] or None):
+                if until_date is not None and entry.date is not None and entry.date < until_date:
+                    return
+
+                yield entry
+
+                if until_label is not None and entry.label == until_label:
+                    return
+        finally:
+            lines.close()
 
     def label(self, items, **options):
         """
@@ -426,7 +651,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Label'] + items + self.__to_options_list(options))
+        return self.__execute_items('Label', items, options)
 
     def links(self, items, **options):
         """
@@ -438,7 +663,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Links'] + items + self.__to_options_list(options))
+        return self.__execute_items('Links', items, options)
 
     def locate(self, items, **options):
         """
@@ -450,7 +675,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Locate'] + items + self.__to_options_list(options))
+        return self.__execute_items('Locate', items, options)
 
     def merge(self, files, **options):
         """
@@ -462,7 +687,7 @@ class VSS(object):
         if not isinstance(files, list):
             files = [str(files)]
 
-        return self.__execute(['Merge'] + files + self.__to_options_list(options))
+        return self.__execute_items('Merge', files, options)
 
     def move(self, subproject, new_parent_project, **options):
         """
@@ -471,7 +696,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Move', subproject, new_parent_project] + self.__to_options_list(options))
+        return self.__execute(['Move', subproject, new_parent_project] + self.__to_options_list('Move', options))
 
     def password(self, **options):
         """
@@ -480,7 +705,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Password'] + self.__to_options_list(options))
+        return self.__execute(['Password'] + self.__to_options_list('Password', options))
 
     def paths(self, files, **options):
         """
@@ -492,7 +717,7 @@ class VSS(object):
         if not isinstance(files, list):
             files = [str(files)]
 
-        return self.__execute(['Paths'] + files + self.__to_options_list(options))
+        return self.__execute_items('Paths', files, options)
 
     def physical(self, **options):
         """
@@ -501,7 +726,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Physical'] + self.__to_options_list(options))
+        return self.__execute(['Physical'] + self.__to_options_list('Physical', options))
 
     def pin(self, items, **options):
         """
@@ -513,7 +738,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Pin'] + items + self.__to_options_list(options))
+        return self.__execute_items('Pin', items, options)
 
     def project(self, **options):
         """
@@ -522,7 +747,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Project'] + self.__to_options_list(options))
+        return self.__execute(['Project'] + self.__to_options_list('Project', options))
 
     def properties(self, items, **options):
         """
@@ -534,7 +759,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Properties'] + items + self.__to_options_list(options))
+        return self.__execute_items('Properties', items, options)
 
     def purge(self, items, **options):
         """
@@ -546,7 +771,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Purge'] + items + self.__to_options_list(options))
+        return self.__execute_items('Purge', items, options)
 
     def recover(self, items, **options):
         """
@@ -558,7 +783,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Recover'] + items + self.__to_options_list(options))
+        return self.__execute_items('Recover', items, options)
 
     def rename(self, item, new_name, **options):
         """
@@ -567,7 +792,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Recover', item, new_name] + self.__to_options_list(options))
+        return self.__execute(['Rename', item, new_name] + self.__to_options_list('Rename', options))
 
     def rollback(self, fname, **options):
         """
@@ -576,7 +801,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Rollback', fname] + self.__to_options_list(options))
+        return self.__execute(['Rollback', fname] + self.__to_options_list('Rollback', options))
 
     def share(self, item, **options):
         """
@@ -585,7 +810,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Share', item] + self.__to_options_list(options))
+        return self.__execute(['Share', item] + self.__to_options_list('Share', options))
 
     def status(self, items=None, **options):
         """
@@ -599,7 +824,7 @@ class VSS(object):
         elif not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Status'] + items + self.__to_options_list(options))
+        return self.__execute_items('Status', items, options)
 
     def undo_checkout(self, items, **options):
         """
@@ -611,7 +836,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Undocheckout'] + items + self.__to_options_list(options))
+        return self.__execute_items('Undocheckout', items, options)
 
     def unpin(self, items, **options):
         """
@@ -623,7 +848,7 @@ class VSS(object):
         if not isinstance(items, list):
             items = [str(items)]
 
-        return self.__execute(['Unpin'] + items + self.__to_options_list(options))
+        return self.__execute_items('Unpin', items, options)
 
     def view(self, fname, **options):
         """
@@ -632,7 +857,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['View', fname] + self.__to_options_list(options))
+        return self.__execute(['View', fname] + self.__to_options_list('View', options))
 
     def whoami(self, **options):
         """
@@ -641,7 +866,7 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Whoami'] + self.__to_options_list(options))
+        return self.__execute(['Whoami'] + self.__to_options_list('Whoami', options))
 
     def set_working_folder(self, folder, project=None, **options):
         """
@@ -650,5 +875,5 @@ class VSS(object):
         Returns the standard output.
         """
 
-        return self.__execute(['Workfold'] + ((not project is None) and [project] or []) + [folder] + self.__to_options_list(options))
+        return self.__execute(['Workfold'] + ((not project is None) and [project] or []) + [folder] + self.__to_options_list('Workfold', options))
 